@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import json
 import logging
 import pytz
+import re
 import threading
+import unicodedata
 from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
 from markupsafe import Markup
@@ -20,6 +23,11 @@ from odoo.tools.misc import get_lang
 
 from . import crm_stage
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 _logger = logging.getLogger(__name__)
 
 
@@ -83,6 +91,39 @@ PARTNER_ADDRESS_FIELDS_TO_SYNC = [
 # computation time, number of transaction and transaction time.
 PLS_COMPUTE_BATCH_STEP = 50000  # odoo.models.PREFETCH_MAX = 1000 but larger cluster can speed up global computation
 PLS_UPDATE_BATCH_STEP = 5000
+# Tag frequencies based on fewer closed leads are ignored (too small subset to be meaningful)
+PLS_TAG_MIN_COUNT = 50
+# Start date and fields the frequency table was built with (see _rebuild_pls_frequency_table)
+PLS_FREQUENCY_CHECKPOINT_PARAM = 'crm.pls_frequency_checkpoint'
+# Days between two full rebuilds of the frequency table, repairing the drift live increments
+# cannot follow (closed leads whose PLS fields or team are edited, deleted or merged leads)
+PLS_FREQUENCY_FULL_REBUILD_DAYS = 7
+
+# Duplicate detection index: blocking keys of each lead, leads sharing a key
+# being potential duplicates (see _get_dedupe_keys)
+DEDUPE_KEY_TABLE = 'crm_lead_dedupe_key'
+DEDUPE_KEY_TYPES = ('email', 'email_domain', 'phone', 'commercial_partner', 'name')
+DEDUPE_UPDATE_BATCH_STEP = 5000
+# Lead fields whose update changes its blocking keys
+DEDUPE_KEY_TRIGGER_FIELDS = {
+    'email_from', 'email_normalized', 'phone', 'mobile', 'phone_sanitized', 'country_id',
+    'partner_id', 'partner_name', 'contact_name',
+}
+# Minimum trigram similarity of names for leads to be duplicates by name
+DEDUPE_NAME_SIMILARITY = 0.6
+
+
+def get_name_trigrams(name):
+    """ Trigrams of a name, computed as pg_trgm does: on each lowercase and
+    unaccented word, padded with two spaces before and one space after. """
+    if not name:
+        return set()
+    name = ''.join(char for char in unicodedata.normalize('NFKD', name.lower()) if not unicodedata.combining(char))
+    trigrams = set()
+    for word in re.findall(r'\w+', name):
+        word = f'  {word} '
+        trigrams.update(word[index:index + 3] for index in range(len(word) - 2))
+    return trigrams
 
 
 class Lead(models.Model):
@@ -552,51 +593,47 @@ class Lead(models.Model):
           * email domain exact match;
           * phone_sanitized exact match;
           * same commercial entity;
+
+        Candidates of all leads are fetched at once with equality lookups in
+        the duplicate detection index (see ``_dedupe_index_lookup``). Keys are
+        taken from the current values of the leads, so that unsaved changes
+        are taken into account.
         """
         SEARCH_RESULT_LIMIT = 21
 
-        def return_if_relevant(model_name, domain):
-            """ Returns the recordset obtained by performing a search on the provided
-            model with the provided domain if the cardinality of that recordset is
-            below a given threshold (i.e: `SEARCH_RESULT_LIMIT`). Otherwise, returns
-            an empty recordset of the provided model as it indicates search term
-            was not relevant.
-            Note: The function will use the administrator privileges to guarantee
-            that a maximum amount of leads will be included in the search results
-            and transcend multi-company record rules. It also includes archived
-            records. Idea is that counter indicates duplicates are present and
-            the lead could be escalated to managers.
-            """
-            model = self.env[model_name].sudo().with_context(active_test=False)
-            res = model.search(domain, limit=SEARCH_RESULT_LIMIT)
-            return res if len(res) < SEARCH_RESULT_LIMIT else model
+        lead_keys = [lead._get_dedupe_keys(key_types=('email_domain', 'phone', 'commercial_partner')) for lead in self]
+        # Email domain and phone keys shared by too many leads are not relevant:
+        # fetch one more lead than the limit, the lead itself may be part of them.
+        # Leads are fetched regardless of the multi-company record rules, and
+        # archived ones are included. Idea is that counter indicates duplicates
+        # are present and the lead could be escalated to managers.
+        limited_matches = self._dedupe_index_lookup([
+            (key_type, key)
+            for keys in lead_keys for key_type in ('email_domain', 'phone') for key in keys[key_type]
+        ], limit=SEARCH_RESULT_LIMIT + 1)
+        # "same commercial entity" duplicates are restricted to the accessible leads
+        commercial_matches = self._dedupe_index_lookup([
+            ('commercial_partner', key) for keys in lead_keys for key in keys['commercial_partner']
+        ])
+        accessible_ids = set(self.with_context(active_test=False)._search([
+            ('id', 'in', list({lead_id for lead_ids in commercial_matches.values() for lead_id in lead_ids})),
+        ])) if commercial_matches else set()
 
-        for lead in self:
+        for lead, keys in zip(self, lead_keys):
             lead_id = lead._origin.id if isinstance(lead.id, models.NewId) else lead.id
-            common_lead_domain = [
-                ('id', '!=', lead_id)
-            ]
-
-            duplicate_lead_ids = self.env['crm.lead']
-
-            # check the "company" email domain duplicates
-            if lead.email_domain_criterion:
-                duplicate_lead_ids |= return_if_relevant('crm.lead', common_lead_domain + [
-                    ('email_domain_criterion', '=', lead.email_domain_criterion)
-                ])
-            # check for "same commercial entity" duplicates
-            if lead.partner_id and lead.partner_id.commercial_partner_id:
-                duplicate_lead_ids |= lead.with_context(active_test=False).search(common_lead_domain + [
-                    ("partner_id", "child_of", lead.partner_id.commercial_partner_id.ids)
-                ])
-            # check the phone number duplicates, based on phone_sanitized. Only
-            # exact matches are found, and the single one stored in phone_sanitized
-            # in case phone and mobile are both set.
-            if lead.phone_sanitized:
-                duplicate_lead_ids |= return_if_relevant('crm.lead', common_lead_domain + [
-                    ('phone_sanitized', '=', lead.phone_sanitized)
-                ])
-
+            duplicate_ids = set()
+            for key_type in ('email_domain', 'phone'):
+                for key in keys[key_type]:
+                    matching_ids = set(limited_matches.get((key_type, key), [])) - {lead_id}
+                    if len(matching_ids) < SEARCH_RESULT_LIMIT:
+                        duplicate_ids |= matching_ids
+            for key in keys['commercial_partner']:
+                duplicate_ids.update(
+                    match_id for match_id in commercial_matches.get(('commercial_partner', key), [])
+                    if match_id != lead_id and match_id in accessible_ids
+                )
+
+            duplicate_lead_ids = self.env['crm.lead'].browse(sorted(duplicate_ids))
             lead.duplicate_lead_ids = duplicate_lead_ids + lead
             lead.duplicate_lead_count = len(duplicate_lead_ids)
 
@@ -728,6 +765,29 @@ class Lead(models.Model):
         tools.create_index(self._cr, 'crm_lead_create_date_team_id_idx',
                            self._table, ['create_date', 'team_id'])
 
+    def init(self):
+        super().init()
+        # Duplicate detection index, maintained by create / write: a plain
+        # table as it is only read and written through SQL
+        if tools.sql.table_exists(self._cr, DEDUPE_KEY_TABLE):
+            return
+        self._cr.execute(SQL(
+            """
+            CREATE TABLE %(table)s (
+                lead_id int4 NOT NULL REFERENCES crm_lead (id) ON DELETE CASCADE,
+                key_type varchar NOT NULL,
+                key varchar NOT NULL,
+                key_count int4 NOT NULL DEFAULT 1
+            );
+            CREATE INDEX %(lookup_index)s ON %(table)s (key_type, key);
+            CREATE INDEX %(lead_index)s ON %(table)s (lead_id);
+            """,
+            table=SQL.identifier(DEDUPE_KEY_TABLE),
+            lookup_index=SQL.identifier(f'{DEDUPE_KEY_TABLE}_key_type_key_idx'),
+            lead_index=SQL.identifier(f'{DEDUPE_KEY_TABLE}_lead_id_idx'),
+        ))
+        self._dedupe_index_rebuild()
+
     @api.model_create_multi
     def create(self, vals_list):
         for vals in vals_list:
@@ -739,6 +799,7 @@ class Lead(models.Model):
             if any(field in ['active', 'stage_id'] for field in values):
                 lead._handle_won_lost(values)
 
+        leads._dedupe_index_update()
         return leads
 
     def write(self, vals):
@@ -779,16 +840,19 @@ class Lead(models.Model):
             self._handle_won_lost(vals)
 
         if not stage_is_won:
-            return super(Lead, self).write(vals)
-
-        # stage change between two won stages: does not change the date_closed
-        leads_already_won = self.filtered(lambda lead: lead.stage_id.is_won)
-        remaining = self - leads_already_won
-        if remaining:
-            result = super(Lead, remaining).write(vals)
-        if leads_already_won:
-            vals.pop('date_closed', False)
-            result = super(Lead, leads_already_won).write(vals)
+            result = super(Lead, self).write(vals)
+        else:
+            # stage change between two won stages: does not change the date_closed
+            leads_already_won = self.filtered(lambda lead: lead.stage_id.is_won)
+            remaining = self - leads_already_won
+            if remaining:
+                result = super(Lead, remaining).write(vals)
+            if leads_already_won:
+                vals.pop('date_closed', False)
+                result = super(Lead, leads_already_won).write(vals)
+
+        if not DEDUPE_KEY_TRIGGER_FIELDS.isdisjoint(vals):
+            self._dedupe_index_update()
         return result
 
     @api.model
@@ -1386,49 +1450,87 @@ class Lead(models.Model):
         if max_length and len(self.ids) > max_length and not self.env.is_superuser():
             raise UserError(_("To prevent data loss, Leads and Opportunities can only be merged by groups of %(max_length)s.", max_length=max_length))
 
-        opportunities = self._sort_by_confidence_level(reverse=True)
-
-        # get SORTED recordset of head and tail, and complete list
-        opportunities_head = opportunities[0]
-        opportunities_tail = opportunities[1:]
-
-        # merge all the sorted opportunity. This means the value of
-        # the first (head opp) will be a priority.
-        merged_data = opportunities._merge_data(self._merge_get_fields())
-
-        # force value for saleperson and Sales Team
-        if user_id:
-            merged_data['user_id'] = user_id
-        if team_id:
-            merged_data['team_id'] = team_id
-
-        merged_followers = opportunities_head._merge_followers(opportunities_tail)
+        return self._merge_opportunity_batch([self], user_id=user_id, team_id=team_id, auto_unlink=auto_unlink)
 
+    @api.model
+    def _merge_opportunity_batch(self, groups, user_id=False, team_id=False, auto_unlink=True):
+        """ Merge many groups of leads at once. Each group is merged as
+        ``_merge_opportunity`` does (without limit on its length): into its
+        most important lead (based on its confidence level), updated with
+        values from the other ones.
+
+        Values of the leads of all groups are fetched at once to compute the
+        merged values of each group, and dependences (followers, messages,
+        activities, attachments, calendar events) of all groups are moved with
+        a few grouped queries. A merge summary is logged on each resulting lead.
+
+        :param groups: list of crm.lead recordsets to merge, each of at least
+          two leads; a lead can be part of one group only;
+        :param user_id, team_id, auto_unlink: see ``merge_opportunity``;
+
+        :return crm.lead: leads resulting of the merge of each group, in the
+          order of groups
+        """
+        if any(len(group.ids) <= 1 for group in groups):
+            raise UserError(_('Select at least two Leads/Opportunities from the list to merge them.'))
+        all_lead_ids = [lead_id for group in groups for lead_id in group.ids]
+        if len(set(all_lead_ids)) != len(all_lead_ids):
+            raise UserError(_('A Lead/Opportunity can only be merged in one group at a time.'))
+
+        # fetch values of all leads at once, merged values are then computed from the cache
+        merge_fnames = [fname for fname in self._merge_get_fields() if fname in self._fields]
+        all_leads = self.browse(all_lead_ids)
+        all_leads.fetch(merge_fnames + ['active', 'probability'])
+        all_leads.stage_id.fetch(['sequence'])
+
+        merge_groups, merged_data_list, team_stage_ids = [], [], {}
+        for group in groups:
+            opportunities = group.with_prefetch(all_leads._prefetch_ids)._sort_by_confidence_level(reverse=True)
+
+            # merge all the sorted opportunity. This means the value of
+            # the first (head opp) will be a priority.
+            merged_data = opportunities._merge_data(merge_fnames)
+
+            # force value for saleperson and Sales Team
+            if user_id:
+                merged_data['user_id'] = user_id
+            if team_id:
+                merged_data['team_id'] = team_id
+
+            # check if the stage is in the stages of the Sales Team. If not, assign the stage with the lowest sequence
+            if merged_data.get('team_id'):
+                if merged_data['team_id'] not in team_stage_ids:
+                    team_stage_ids[merged_data['team_id']] = self.env['crm.stage'].search(
+                        ['|', ('team_id', '=', merged_data['team_id']), ('team_id', '=', False)], order='sequence, id').ids
+                stage_ids = team_stage_ids[merged_data['team_id']]
+                if merged_data.get('stage_id') not in stage_ids:
+                    merged_data['stage_id'] = stage_ids[0] if stage_ids else False
+
+            merge_groups.append((opportunities[0], opportunities[1:]))
+            merged_data_list.append(merged_data)
+
+        merged_followers = self._merge_followers_batch(merge_groups)
         # log merge message
-        opportunities_head._merge_log_summary(merged_followers, opportunities_tail)
-        # merge other data (mail.message, attachments, ...) from tail into head
-        opportunities_head._merge_dependences(opportunities_tail)
-
-        # check if the stage is in the stages of the Sales Team. If not, assign the stage with the lowest sequence
-        if merged_data.get('team_id'):
-            team_stage_ids = self.env['crm.stage'].search(['|', ('team_id', '=', merged_data['team_id']), ('team_id', '=', False)], order='sequence, id')
-            if merged_data.get('stage_id') not in team_stage_ids.ids:
-                merged_data['stage_id'] = team_stage_ids[0].id if team_stage_ids else False
+        for opportunities_head, opportunities_tail in merge_groups:
+            opportunities_head._merge_log_summary(merged_followers.get(opportunities_head.id, {}), opportunities_tail)
+        # merge other data (mail.message, attachments, ...) from tails into heads
+        self._merge_dependences_batch(merge_groups)
 
         # write merged data into first opportunity; remove some keys if already
         # set on opp to avoid useless recomputes
-        if 'user_id' in merged_data and opportunities_head.user_id.id == merged_data['user_id']:
-            merged_data.pop('user_id')
-        if 'team_id' in merged_data and opportunities_head.team_id.id == merged_data['team_id']:
-            merged_data.pop('team_id')
-        opportunities_head.write(merged_data)
+        for (opportunities_head, _opportunities_tail), merged_data in zip(merge_groups, merged_data_list):
+            if 'user_id' in merged_data and opportunities_head.user_id.id == merged_data['user_id']:
+                merged_data.pop('user_id')
+            if 'team_id' in merged_data and opportunities_head.team_id.id == merged_data['team_id']:
+                merged_data.pop('team_id')
+            opportunities_head.write(merged_data)
 
         # delete tail opportunities
         # we use the SUPERUSER to avoid access rights issues because as the user had the rights to see the records it should be safe to do so
         if auto_unlink:
-            opportunities_tail.sudo().unlink()
+            self.browse([tail_id for _head, tail in merge_groups for tail_id in tail.ids]).sudo().unlink()
 
-        return opportunities_head
+        return self.browse([head.id for head, _tail in merge_groups])
 
     def _merge_get_fields_address(self):
         """The address fields are propagated as a whole.
@@ -1471,9 +1573,18 @@ class Lead(models.Model):
           merge;
         """
         self.ensure_one()
-        self._merge_dependences_history(opportunities)
-        self._merge_dependences_attachments(opportunities)
-        self._merge_dependences_calendar_events(opportunities)
+        self._merge_dependences_batch([(self, opportunities)])
+
+    @api.model
+    def _merge_dependences_batch(self, merge_groups):
+        """ Merge dependences of many merge groups at once, see ``_merge_dependences``.
+
+        :param merge_groups: list of (master lead, recordset of opportunities to
+          transfer) couples;
+        """
+        self._merge_dependences_history_batch(merge_groups)
+        self._merge_dependences_attachments_batch(merge_groups)
+        self._merge_dependences_calendar_events_batch(merge_groups)
 
     def _merge_dependences_history(self, opportunities):
         """ Move history from the given opportunities to the current one. `self`
@@ -1486,22 +1597,69 @@ class Lead(models.Model):
         :param opportunities: see ``_merge_dependences``
         """
         self.ensure_one()
+        return self._merge_dependences_history_batch([(self, opportunities)])
+
+    @api.model
+    def _merge_dependences_history_batch(self, merge_groups):
+        """ Move history of many merge groups, see ``_merge_dependences_history``.
+        Messages and activities of all groups are moved with one query each.
+
+        :param merge_groups: see ``_merge_dependences_batch``
+        """
+        subject_marker = '%(source_subject)s'
+        tail_ids, head_ids, subject_formats, empty_subjects = [], [], [], []
         # sudo usage: because we want to go through all messages, whatever the real ACLs
         # current user has on them
-        for opportunity_su in opportunities.sudo():
-            for message_su in opportunity_su.message_ids:
-                if message_su.subject:
-                    subject = _("From %(source_name)s: %(source_subject)s", source_name=opportunity_su.name, source_subject=message_su.subject)
-                else:
-                    subject = _("From %(source_name)s", source_name=opportunity_su.name)
-                message_su.write({
-                    'res_id': self.id,
-                    'subject': subject,
-                })
-        opportunities.activity_ids.write({
-            'res_id': self.id,
-        })
+        for opportunities_head, opportunities_tail in merge_groups:
+            for opportunity_su in opportunities_tail.sudo():
+                tail_ids.append(opportunity_su.id)
+                head_ids.append(opportunities_head.id)
+                subject_formats.append(_("From %(source_name)s: %(source_subject)s", source_name=opportunity_su.name, source_subject=subject_marker))
+                empty_subjects.append(_("From %(source_name)s", source_name=opportunity_su.name))
+        if not tail_ids:
+            return True
 
+        self.env['mail.message'].flush_model()
+        self.env['mail.activity'].flush_model()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE mail_message AS message
+               SET res_id = merge.head_id,
+                   subject = CASE WHEN COALESCE(message.subject, '') = '' THEN merge.empty_subject
+                                  ELSE replace(merge.subject_format, %(subject_marker)s, message.subject) END,
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%(tail_ids)s::int4[], %(head_ids)s::int4[], %(subject_formats)s::varchar[], %(empty_subjects)s::varchar[])
+                   AS merge (tail_id, head_id, subject_format, empty_subject)
+             WHERE message.model = 'crm.lead'
+               AND message.res_id = merge.tail_id
+               AND message.message_type != 'user_notification'
+            """,
+            subject_marker=subject_marker, uid=self.env.uid, tail_ids=tail_ids, head_ids=head_ids,
+            subject_formats=subject_formats, empty_subjects=empty_subjects,
+        ))
+        self.env.cr.execute(SQL(
+            """
+            UPDATE mail_activity AS activity
+               SET res_id = merge.head_id,
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%(tail_ids)s::int4[], %(head_ids)s::int4[]) AS merge (tail_id, head_id)
+             WHERE activity.res_model = 'crm.lead'
+               AND activity.res_id = merge.tail_id
+               AND activity.active
+         RETURNING activity.id
+            """,
+            uid=self.env.uid, tail_ids=tail_ids, head_ids=head_ids,
+        ))
+        activity_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env['mail.message'].invalidate_model(['res_id', 'subject', 'write_uid', 'write_date'])
+        self.env['mail.activity'].invalidate_model(['res_id', 'write_uid', 'write_date'])
+        self.invalidate_model(['message_ids', 'activity_ids'])
+        # recompute the stored fields depending on the moved res_id (e.g. res_name)
+        activities_su = self.env['mail.activity'].sudo().browse(activity_ids)
+        activities_su.modified(['res_id'])
+        activities_su.flush_recordset()
         return True
 
     def _merge_dependences_attachments(self, opportunities):
@@ -1511,22 +1669,43 @@ class Lead(models.Model):
         :param opportunities: see ``_merge_dependences``
         """
         self.ensure_one()
+        return self._merge_dependences_attachments_batch([(self, opportunities)])
 
-        all_attachments = self.env['ir.attachment'].search([
-            ('res_model', '=', self._name),
-            ('res_id', 'in', opportunities.ids)
-        ])
+    @api.model
+    def _merge_dependences_attachments_batch(self, merge_groups):
+        """ Move attachments of many merge groups with one query, see
+        ``_merge_dependences_attachments``.
 
-        for opportunity in opportunities:
-            attachments = all_attachments.filtered(lambda attach: attach.res_id == opportunity.id)
-            for attachment in attachments:
-                attachment.write({
-                    'res_id': self.id,
-                    'name': _("%(attach_name)s (from %(lead_name)s)",
-                              attach_name=attachment.name,
-                              lead_name=opportunity.name[:20]
-                             )
-                })
+        :param merge_groups: see ``_merge_dependences_batch``
+        """
+        name_marker = '%(attach_name)s'
+        tail_ids, head_ids, name_formats = [], [], []
+        for opportunities_head, opportunities_tail in merge_groups:
+            for opportunity in opportunities_tail:
+                tail_ids.append(opportunity.id)
+                head_ids.append(opportunities_head.id)
+                name_formats.append(_("%(attach_name)s (from %(lead_name)s)", attach_name=name_marker, lead_name=opportunity.name[:20]))
+        if not tail_ids:
+            return True
+
+        self.env['ir.attachment'].flush_model()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE ir_attachment AS attachment
+               SET res_id = merge.head_id,
+                   name = replace(merge.name_format, %(name_marker)s, attachment.name),
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%(tail_ids)s::int4[], %(head_ids)s::int4[], %(name_formats)s::varchar[])
+                   AS merge (tail_id, head_id, name_format)
+             WHERE attachment.res_model = %(model)s
+               AND attachment.res_id = merge.tail_id
+               AND attachment.res_field IS NULL
+            """,
+            name_marker=name_marker, uid=self.env.uid, tail_ids=tail_ids, head_ids=head_ids,
+            name_formats=name_formats, model=self._name,
+        ))
+        self.env['ir.attachment'].invalidate_model(['res_id', 'name', 'write_uid', 'write_date'])
         return True
 
     def _merge_dependences_calendar_events(self, opportunities):
@@ -1535,11 +1714,38 @@ class Lead(models.Model):
         :param opportunities: see ``merge_dependences``
         """
         self.ensure_one()
-        meetings = self.env['calendar.event'].search([('opportunity_id', 'in', opportunities.ids)])
-        return meetings.write({
-            'res_id': self.id,
-            'opportunity_id': self.id,
-        })
+        return self._merge_dependences_calendar_events_batch([(self, opportunities)])
+
+    @api.model
+    def _merge_dependences_calendar_events_batch(self, merge_groups):
+        """ Move calendar events of many merge groups with one query, see
+        ``_merge_dependences_calendar_events``.
+
+        :param merge_groups: see ``_merge_dependences_batch``
+        """
+        tail_ids, head_ids = [], []
+        for opportunities_head, opportunities_tail in merge_groups:
+            tail_ids += opportunities_tail.ids
+            head_ids += [opportunities_head.id] * len(opportunities_tail)
+        if not tail_ids:
+            return True
+
+        self.env['calendar.event'].flush_model()
+        self.env.cr.execute(SQL(
+            """
+            UPDATE calendar_event AS event
+               SET res_id = merge.head_id,
+                   opportunity_id = merge.head_id,
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%(tail_ids)s::int4[], %(head_ids)s::int4[]) AS merge (tail_id, head_id)
+             WHERE event.opportunity_id = merge.tail_id
+               AND event.active
+            """,
+            uid=self.env.uid, tail_ids=tail_ids, head_ids=head_ids,
+        ))
+        self.env['calendar.event'].invalidate_model(['res_id', 'opportunity_id', 'write_uid', 'write_date'])
+        return True
 
     def _merge_followers(self, opportunities):
         """Add the followers into the destination lead if they post a message in the last 30 days.
@@ -1549,16 +1755,34 @@ class Lead(models.Model):
             the destination lead grouped by source lead ID.
         """
         self.ensure_one()
+        return self._merge_followers_batch([(self, opportunities)]).get(self.id, {})
+
+    @api.model
+    def _merge_followers_batch(self, merge_groups):
+        """ Move the active followers of many merge groups, see ``_merge_followers``.
+
+        :param merge_groups: see ``_merge_dependences_batch``
+        :return: {destination lead ID: {old_lead_id: Record<mail.followers>}}
+        """
+        tail_ids, head_ids = [], []
+        for opportunities_head, opportunities_tail in merge_groups:
+            tail_ids += opportunities_tail.ids
+            head_ids += [opportunities_head.id] * len(opportunities_tail)
+        if not tail_ids:
+            return {}
 
         self.env['mail.message'].flush_model()
         self.env['mail.followers'].flush_model()
 
         # Get the active followers (followers whose partner post a message on the
-        # leads in the last 30 days) which should be moved on the destination lead
-        self.env.cr.execute(
+        # leads in the last 30 days) which should be moved on the destination leads
+        self.env.cr.execute(SQL(
             '''
-            SELECT MAX(mf.id) AS id
-              FROM mail_followers AS mf
+            SELECT merge.head_id, MAX(mf.id) AS id
+              FROM unnest(%(tail_ids)s::int4[], %(head_ids)s::int4[]) AS merge (tail_id, head_id)
+              JOIN mail_followers AS mf
+                ON mf.res_model = 'crm.lead'
+               AND mf.res_id = merge.tail_id
               JOIN mail_message AS mm
                 ON mm.author_id = mf.partner_id
                AND mm.res_id = mf.res_id
@@ -1568,21 +1792,38 @@ class Lead(models.Model):
                       following the destination lead */
          LEFT JOIN mail_followers AS destf
                 ON destf.res_model = 'crm.lead'
-               AND destf.res_id = %(lead_id)s
+               AND destf.res_id = merge.head_id
                AND destf.partner_id = mf.partner_id
                    /* Select only once each partner
                       to not create duplicated followers */
-             WHERE mf.res_model = 'crm.lead'
-               AND mf.res_id IN %(lead_ids)s
-               AND destf IS NULL
-          GROUP BY mf.partner_id
+             WHERE destf IS NULL
+          GROUP BY merge.head_id, mf.partner_id
             ''',
-            {'lead_ids': tuple(opportunities.ids), 'lead_id': self.id},
-        )
-        followers_to_update = [r[0] for r in self.env.cr.fetchall()]
-        followers_to_update = self.env['mail.followers'].browse(followers_to_update).sudo()
-        followers_by_old_lead = dict(groupby(followers_to_update, lambda f: f.res_id))
-        followers_to_update.write({'res_id': self.id})
+            tail_ids=tail_ids, head_ids=head_ids,
+        ))
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return {}
+        followers_to_update = self.env['mail.followers'].browse([follower_id for _head_id, follower_id in rows]).sudo()
+        followers_per_head = defaultdict(lambda: self.env['mail.followers'].sudo())
+        for (head_id, _follower_id), follower in zip(rows, followers_to_update):
+            followers_per_head[head_id] += follower
+        followers_by_old_lead = {
+            head_id: dict(groupby(followers, lambda f: f.res_id))
+            for head_id, followers in followers_per_head.items()
+        }
+        self.env.cr.execute(SQL(
+            """
+            UPDATE mail_followers AS follower
+               SET res_id = moved.head_id
+              FROM unnest(%(follower_ids)s::int4[], %(head_ids)s::int4[]) AS moved (follower_id, head_id)
+             WHERE follower.id = moved.follower_id
+            """,
+            follower_ids=[follower_id for _head_id, follower_id in rows],
+            head_ids=[head_id for head_id, _follower_id in rows],
+        ))
+        followers_to_update.invalidate_recordset(['res_id'])
+        self.invalidate_model(['message_follower_ids', 'message_partner_ids', 'message_is_follower'])
         return followers_by_old_lead
 
     def _merge_log_summary(self, merged_followers, opportunities_tail):
@@ -1697,6 +1938,35 @@ class Lead(models.Model):
 
         return True
 
+    def _convert_opportunity_batch(self, user_id):
+        """ Convert leads into opportunities keeping their customer and assign
+        them to a salesperson, as ``convert_opportunity`` called on each lead
+        with its own partner, but with one write per target stage instead of
+        one per lead. Used by the automatic assignment.
+
+        :param int user_id: salesperson to assign
+        """
+        convert_ids_per_stage, stage_per_team = defaultdict(list), {}
+        for lead in self:
+            if not lead.active or lead.probability == 100:
+                continue
+            stage_id = False
+            if not lead.stage_id:
+                if lead.team_id not in stage_per_team:
+                    stage_per_team[lead.team_id] = lead._stage_find(team_id=lead.team_id.id).id
+                stage_id = stage_per_team[lead.team_id]
+            convert_ids_per_stage[stage_id].append(lead.id)
+
+        now = self.env.cr.now()
+        converted_ids = set()
+        for stage_id, lead_ids in convert_ids_per_stage.items():
+            upd_values = {'type': 'opportunity', 'date_conversion': now, 'user_id': user_id}
+            if stage_id:
+                upd_values['stage_id'] = stage_id
+            self.browse(lead_ids).write(upd_values)
+            converted_ids.update(lead_ids)
+        self.filtered(lambda lead: lead.id not in converted_ids).write({'user_id': user_id})
+
     def _handle_partner_assignment(self, force_partner_id=False, create_missing=True):
         """ Update customer (partner_id) of leads. Purpose is to set the same
         partner on most leads; either through a newly created partner either
@@ -1757,8 +2027,11 @@ class Lead(models.Model):
             return self.env['crm.lead']
 
         domain = []
-        for normalized_email in [tools.email_normalize(email) for email in tools.email_split(email)]:
-            domain.append(('email_normalized', '=', normalized_email))
+        normalized_emails = [tools.email_normalize(email) for email in tools.email_split(email)]
+        if normalized_emails:
+            # emails are looked up in the duplicate detection index
+            email_matches = self._dedupe_index_lookup([('email', normalized_email) for normalized_email in normalized_emails if normalized_email])
+            domain.append(('id', 'in', [lead_id for lead_ids in email_matches.values() for lead_id in lead_ids]))
         if partner:
             domain.append(('partner_id', '=', partner.id))
 
@@ -1766,13 +2039,59 @@ class Lead(models.Model):
             return self.env['crm.lead']
 
         domain = ['|'] * (len(domain) - 1) + domain
-        if include_lost:
-            domain += ['|', ('type', '=', 'opportunity'), ('active', '=', True)]
-        else:
-            domain += ['&', ('active', '=', True), '|', ('stage_id', '=', False), ('stage_id.is_won', '=', False)]
+        domain += self._get_lead_duplicates_domain(include_lost=include_lost)
 
         return self.with_context(active_test=False).search(domain)
 
+    @api.model
+    def _get_lead_duplicates_domain(self, include_lost=False):
+        """ Domain of the leads that can be duplicates, see ``_get_lead_duplicates``. """
+        if include_lost:
+            return ['|', ('type', '=', 'opportunity'), ('active', '=', True)]
+        return ['&', ('active', '=', True), '|', ('stage_id', '=', False), ('stage_id.is_won', '=', False)]
+
+    def _get_lead_duplicates_batch(self, criteria=('email',), include_lost=False):
+        """ Batch version of ``_get_lead_duplicates``: search for the leads that
+        seem duplicated of each lead of self, with a few equality lookups in
+        the duplicate detection index (see ``_get_dedupe_keys``).
+
+        :param criteria: blocking keys duplicates share with the lead, among
+          ``DEDUPE_KEY_TYPES``. By default, the emails of the lead, as
+          ``_get_lead_duplicates(email=lead.email_from)`` does. Duplicates by
+          'name' have names with a trigram similarity of at least
+          ``DEDUPE_NAME_SIMILARITY``;
+        :param boolean include_lost: see ``_get_lead_duplicates``;
+
+        :return dict: {lead: duplicate leads} for each lead of self, the lead
+          itself being part of its duplicates when it matches include_lost;
+        """
+        key_types = [key_type for key_type in criteria if key_type != 'name']
+        lead_keys = [lead._get_dedupe_keys(key_types=key_types) for lead in self]
+        matches = self._dedupe_index_lookup([
+            (key_type, key) for keys in lead_keys for key_type, type_keys in keys.items() for key in type_keys
+        ])
+        duplicate_ids = [
+            {lead_id for key_type, type_keys in keys.items() for key in type_keys for lead_id in matches.get((key_type, key), [])}
+            for keys in lead_keys
+        ]
+        if 'name' in criteria:
+            for index, lead_id in self._dedupe_index_lookup_names():
+                duplicate_ids[index].add(lead_id)
+
+        # filter all duplicates at once, keeping the order of a search
+        Lead = self.env['crm.lead'].with_context(active_test=False)
+        valid_positions = {lead_id: position for position, lead_id in enumerate(Lead._search(
+            [('id', 'in', list(set().union(*duplicate_ids)))] + self._get_lead_duplicates_domain(include_lost=include_lost),
+            order=self._order,
+        ))} if any(duplicate_ids) else {}
+        return {
+            lead: Lead.browse(sorted(
+                (lead_id for lead_id in lead_duplicate_ids if lead_id in valid_positions),
+                key=valid_positions.get,
+            ))
+            for lead, lead_duplicate_ids in zip(self, duplicate_ids)
+        }
+
     def _sort_by_confidence_level(self, reverse=False):
         """ Sorting the leads/opps according to the confidence level to it
         being won. It is sorted following this incremental heuristics :
@@ -1797,6 +2116,135 @@ class Lead(models.Model):
 
         return self.sorted(key=opps_key, reverse=reverse)
 
+    # DUPLICATE DETECTION INDEX
+    # --------------------------------------------------
+
+    def _get_dedupe_keys(self, key_types=DEDUPE_KEY_TYPES):
+        """ Blocking keys of the lead, computed from its current values. Leads
+        sharing a key are potential duplicates:
+
+          * email: normalized emails of email_from;
+          * email_domain: email_domain_criterion;
+          * phone: phone_sanitized;
+          * commercial_partner: ID of the commercial entity of the customer;
+          * name: trigrams of the company name, or of the contact name;
+
+        :param key_types: types of the keys to compute, among ``DEDUPE_KEY_TYPES``;
+        :return dict: {key type: set of keys}
+        """
+        self.ensure_one()
+        keys = {}
+        for key_type in key_types:
+            if key_type == 'email':
+                type_keys = {tools.email_normalize(email) for email in tools.email_split(self.email_from)} | {self.email_normalized}
+            elif key_type == 'email_domain':
+                type_keys = {self.email_domain_criterion}
+            elif key_type == 'phone':
+                type_keys = {self.phone_sanitized}
+            elif key_type == 'commercial_partner':
+                type_keys = {str(self.partner_id.commercial_partner_id._origin.id or '')}
+            else:
+                type_keys = get_name_trigrams(self.partner_name or self.contact_name)
+            keys[key_type] = {key for key in type_keys if key}
+        return keys
+
+    def _dedupe_index_update(self):
+        """ Replace the blocking keys of the leads of self in the duplicate
+        detection index by their current ones. """
+        leads = self.sudo().with_context(active_test=False).exists()
+        if not leads:
+            return
+        rows = [
+            (lead.id, key_type, key, len(type_keys))
+            for lead in leads for key_type, type_keys in lead._get_dedupe_keys().items() for key in type_keys
+        ]
+        self._cr.execute(SQL(
+            "DELETE FROM %s WHERE lead_id = ANY(%s)", SQL.identifier(DEDUPE_KEY_TABLE), leads.ids,
+        ))
+        for batch in tools.split_every(DEDUPE_UPDATE_BATCH_STEP, rows):
+            self._cr.execute(SQL(
+                "INSERT INTO %s (lead_id, key_type, key, key_count) VALUES %s",
+                SQL.identifier(DEDUPE_KEY_TABLE),
+                SQL(", ").join(SQL("(%s, %s, %s, %s)", *row) for row in batch),
+            ))
+
+    @api.model
+    def _dedupe_index_rebuild(self):
+        """ Rebuild the duplicate detection index from all the leads. """
+        self._cr.execute(SQL("TRUNCATE TABLE %s", SQL.identifier(DEDUPE_KEY_TABLE)))
+        Lead = self.env['crm.lead'].with_context(active_test=False)
+        lead_ids = Lead.search([]).ids
+        for batch_ids in tools.split_every(models.PREFETCH_MAX, lead_ids):
+            Lead.browse(batch_ids)._dedupe_index_update()
+            Lead.invalidate_model()
+        _logger.info('Duplicate detection index built for %s leads', len(lead_ids))
+
+    @api.model
+    def _dedupe_index_lookup(self, keys, limit=None):
+        """ Find the leads having some blocking keys, with one query.
+
+        :param keys: iterable of (key type, key) couples;
+        :param int limit: maximum number of leads fetched per key;
+        :return dict: {(key type, key): list of lead IDs} for the keys
+          matching at least one lead;
+        """
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        self._cr.execute(SQL(
+            """
+            SELECT keys.key_type, keys.key, matches.lead_ids
+              FROM unnest(%(key_types)s::varchar[], %(keys)s::varchar[]) AS keys (key_type, key)
+        CROSS JOIN LATERAL (
+                       SELECT array_agg(lead_id) AS lead_ids
+                         FROM (
+                                SELECT dedupe.lead_id
+                                  FROM %(table)s dedupe
+                                 WHERE dedupe.key_type = keys.key_type AND dedupe.key = keys.key
+                                 LIMIT %(limit)s
+                              ) AS matching
+                   ) AS matches
+             WHERE matches.lead_ids IS NOT NULL
+            """,
+            key_types=[key_type for key_type, _key in keys],
+            keys=[key for _key_type, key in keys],
+            table=SQL.identifier(DEDUPE_KEY_TABLE),
+            limit=limit,
+        ))
+        return {(key_type, key): lead_ids for key_type, key, lead_ids in self._cr.fetchall()}
+
+    def _dedupe_index_lookup_names(self):
+        """ Find the leads whose name is similar to the name of the leads of
+        self: a trigram similarity (shared trigrams / trigrams of both names)
+        of at least ``DEDUPE_NAME_SIMILARITY``, computed from the counts of
+        trigrams the names share in the index.
+
+        :return list: (index of the lead in self, similar lead ID) couples
+        """
+        indexes, keys, key_counts = [], [], []
+        for index, lead in enumerate(self):
+            trigrams = lead._get_dedupe_keys(key_types=['name'])['name']
+            indexes += [index] * len(trigrams)
+            keys += trigrams
+            key_counts += [len(trigrams)] * len(trigrams)
+        if not keys:
+            return []
+        self._cr.execute(SQL(
+            """
+            SELECT trigrams.lead_index, dedupe.lead_id
+              FROM unnest(%(indexes)s::int4[], %(keys)s::varchar[], %(key_counts)s::int4[]) AS trigrams (lead_index, key, key_count)
+              JOIN %(table)s dedupe ON dedupe.key_type = 'name' AND dedupe.key = trigrams.key
+          GROUP BY trigrams.lead_index, trigrams.key_count, dedupe.lead_id, dedupe.key_count
+            HAVING count(*) >= %(similarity)s * (trigrams.key_count + dedupe.key_count - count(*))
+            """,
+            indexes=indexes,
+            keys=keys,
+            key_counts=key_counts,
+            table=SQL.identifier(DEDUPE_KEY_TABLE),
+            similarity=DEDUPE_NAME_SIMILARITY,
+        ))
+        return self._cr.fetchall()
+
     # CUSTOMER TOOLS
     # --------------------------------------------------
 
@@ -2092,10 +2540,12 @@ class Lead(models.Model):
     #       Done right BEFORE writing the lead as won or lost.
     #       We consider a lead that will be marked as won or lost.
     #       Used each time a lead is won or lost, to ensure frequency table is always up to date
-    #   - One shot Rebuild: empty the frequency table and rebuild it from scratch, based on every already won/lost leads
-    #       Done during cron process.
-    #       We consider all the leads that have been already won or lost.
-    #       Used in one shot, when modifying the criteria to take into account (fields or reference date)
+    #   - Delta Sync: apply to the frequency table the changes of criteria (fields or reference date) since its
+    #       last sync, recorded in a checkpoint: only the added fields and the leads between the old and new
+    #       reference dates are processed. Done during cron process.
+    #       Without checkpoint (or when forced), the table is emptied and rebuilt from scratch, based on every
+    #       already won/lost leads.
+    # Both apply won / lost deltas to the table with batched SQL upserts on (variable, value, team_id).
 
     # ---------------------------------
     # PLS: Probability Computation
@@ -2176,7 +2626,7 @@ class Lead(models.Model):
 
             # To avoid that a tag take too much importance if its subset is too small,
             # we ignore the tag frequencies if we have less than 50 won or lost for this tag.
-            if field == 'tag_id' and (frequency['won_count'] + frequency['lost_count']) < 50:
+            if field == 'tag_id' and (frequency['won_count'] + frequency['lost_count']) < PLS_TAG_MIN_COUNT:
                 continue
 
             if frequency.team_id:
@@ -2245,6 +2695,172 @@ class Lead(models.Model):
             lead_probabilities[lead_id] = min(max(round(100 * probability, 2), 0.01), 99.99)
         return lead_probabilities
 
+    # ---------------------------------
+    # PLS: Vectorized Probability Computation
+    # ---------------------------------
+    # Same naive Bayes model as _pls_get_naive_bayes_probabilities(batch_mode=True), computed with numpy for whole
+    # batches of leads: the frequency table is loaded once into dense (team x feature) arrays of log-likelihoods,
+    # each lead is encoded as the (row, feature) pairs of its PLS values, and the won/lost scores of all the leads
+    # are sums of log-likelihoods (products in the original formula) gathered with one bincount.
+    # Only difference: leads of a team without any won or lost lead get no probability (the python version skips
+    # the first of them and scores the others with the priors of the previous team).
+
+    def _pls_get_vectorized_model(self):
+        """ Load the frequency table into numpy arrays.
+
+        :return: dict with the feature index {(variable, value): column}, the team index {team_id: row} (row 0
+            aggregates every team, for leads whose team has no frequency), the (team x feature) won/lost
+            log-likelihoods, and the won/lost log priors and validity of each team row.
+        """
+        pls_fields = self._pls_get_safe_fields()
+        variables = ['stage_id'] + [field for field in pls_fields if field not in ('stage_id', 'team_id', 'tag_ids')]
+        if 'tag_ids' in pls_fields:
+            variables.append('tag_id')
+        self.env['crm.lead.scoring.frequency'].flush_model()
+        self._cr.execute(SQL(
+            """SELECT team_id, variable, value, won_count, lost_count
+                 FROM crm_lead_scoring_frequency
+                WHERE variable = ANY(%s)
+             ORDER BY team_id ASC, id""",
+            variables,
+        ))
+        frequencies = [row for row in self._cr.fetchall()
+                       if row[1] != 'tag_id' or row[3] + row[4] >= PLS_TAG_MIN_COUNT]
+
+        features, team_index = {}, {}
+        for team_id, variable, value, _won, _lost in frequencies:
+            features.setdefault((variable, value), len(features))
+            if team_id:
+                team_index.setdefault(team_id, len(team_index) + 1)
+        feature_variables = [variable for variable, _value in features]
+        shape = (len(team_index) + 1, len(features))
+        won, lost, present = np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=bool)
+        for team_id, variable, value, won_count, lost_count in frequencies:
+            column = features[(variable, value)]
+            if team_id:  # Last frequency wins for a team, as in the python engine
+                won[team_index[team_id], column] = won_count
+                lost[team_index[team_id], column] = lost_count
+                present[team_index[team_id], column] = True
+            won[0, column] += won_count
+            lost[0, column] += lost_count
+            present[0, column] = True
+
+        # Totals per variable (for each team row), and won/lost totals of the team given by the first stage
+        variable_columns = defaultdict(list)
+        for column, variable in enumerate(feature_variables):
+            variable_columns[variable].append(column)
+        won_total, lost_total = np.zeros(shape), np.zeros(shape)
+        for columns in variable_columns.values():
+            won_total[:, columns] = won[:, columns].sum(axis=1, keepdims=True)
+            lost_total[:, columns] = lost[:, columns].sum(axis=1, keepdims=True)
+        first_stage = self.env['crm.stage'].search([('team_id', '=', False)], order='sequence, id', limit=1)
+        first_stage_column = features.get(('stage_id', str(first_stage.id)))
+        if first_stage_column is None:
+            team_won = team_lost = np.zeros(shape[0])
+        else:
+            team_won, team_lost = won[:, first_stage_column], lost[:, first_stage_column]
+        stage_columns = variable_columns.get('stage_id', [])
+        won_total[:, stage_columns] = team_won[:, None]
+        lost_total[:, stage_columns] = team_lost[:, None]
+
+        valid_team = (team_won > 0) & (team_lost > 0)
+        usable = present & (won_total > 0) & (lost_total > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {
+                'features': features,
+                'team_index': team_index,
+                'won_weights': np.where(usable, np.log(won / np.where(usable, won_total, 1)), 0.0),
+                'lost_weights': np.where(usable, np.log(lost / np.where(usable, lost_total, 1)), 0.0),
+                'won_prior': np.where(valid_team, np.log(team_won / np.where(valid_team, team_won + team_lost, 1)), 0.0),
+                'lost_prior': np.where(valid_team, np.log(team_lost / np.where(valid_team, team_won + team_lost, 1)), 0.0),
+                'valid_team': valid_team,
+            }
+
+    def _pls_get_naive_bayes_probabilities_vectorized(self, model=None):
+        """ Vectorized equivalent of ``_pls_get_naive_bayes_probabilities(batch_mode=True)`` for the leads of self.
+
+        :param model: result of ``_pls_get_vectorized_model`` (loaded if not given, pass it to score several batches)
+        :return: {lead_id: probability in percent}
+        """
+        if not self:
+            return {}
+        model = model or self._pls_get_vectorized_model()
+        features = model['features']
+        pls_fields = ["stage_id", "team_id"] + self._pls_get_safe_fields()
+        use_tags = 'tag_ids' in pls_fields
+        value_fields = [field for field in pls_fields if field not in ('team_id', 'tag_ids')]
+
+        # 1. Lead values (same selection as the python engine in batch mode)
+        domain = [
+            '&',
+                ('active', '=', True), ('id', 'in', self.ids),
+                '|',
+                    ('probability', '=', None),
+                    '&',
+                        ('probability', '<', 100), ('probability', '>', 0)
+        ]
+        self.flush_model()
+        query = self.env['crm.lead'].with_context(active_test=False)._where_calc(domain)
+        table = query.table
+        self._cr.execute(query.select(
+            SQL.identifier(table, 'id'),
+            SQL.identifier(table, 'team_id'),
+            *[SQL.identifier(table, field) for field in value_fields],
+        ))
+        lead_rows = self._cr.fetchall()
+        if not lead_rows:
+            return {}
+        tag_rows = []
+        if use_tags:
+            self._cr.execute(SQL(
+                "SELECT lead_id, tag_id FROM crm_tag_rel WHERE lead_id = ANY(%s)", [row[0] for row in lead_rows],
+            ))
+            tag_rows = self._cr.fetchall()
+
+        # 2. Encode the leads as (lead row, feature column) pairs
+        lead_ids = [row[0] for row in lead_rows]
+        row_by_lead = {lead_id: row for row, lead_id in enumerate(lead_ids)}
+        lead_teams = np.fromiter((model['team_index'].get(row[1], 0) for row in lead_rows), dtype=np.intp, count=len(lead_rows))
+        pair_rows, pair_columns = [], []
+        for row, values in enumerate(lead_rows):
+            for field, value in zip(value_fields, values[2:]):
+                if not value and field not in ('email_state', 'phone_state'):
+                    continue
+                column = features.get((field, str(value or False)))
+                if column is not None:
+                    pair_rows.append(row)
+                    pair_columns.append(column)
+        for lead_id, tag_id in tag_rows:
+            column = features.get(('tag_id', str(tag_id)))
+            if column is not None:
+                pair_rows.append(row_by_lead[lead_id])
+                pair_columns.append(column)
+        pair_rows = np.array(pair_rows, dtype=np.intp)
+        pair_columns = np.array(pair_columns, dtype=np.intp)
+
+        # 3. Won / lost log scores of all leads at once
+        pair_teams = lead_teams[pair_rows]
+        won_scores = model['won_prior'][lead_teams] + np.bincount(
+            pair_rows, weights=model['won_weights'][pair_teams, pair_columns], minlength=len(lead_rows))
+        lost_scores = model['lost_prior'][lead_teams] + np.bincount(
+            pair_rows, weights=model['lost_weights'][pair_teams, pair_columns], minlength=len(lead_rows))
+        with np.errstate(over='ignore'):
+            probabilities = 1.0 / (1.0 + np.exp(lost_scores - won_scores))
+
+        # 4. Same special cases and rounding as the python engine
+        won_stage_ids = set(self.env['crm.stage'].search([('is_won', '=', True)]).ids)
+        valid_team = model['valid_team'][lead_teams]
+        lead_probabilities = {}
+        for row, lead_id in enumerate(lead_ids):
+            stage_id = lead_rows[row][2]
+            if not stage_id:
+                lead_probabilities[lead_id] = 0
+            elif stage_id in won_stage_ids:
+                lead_probabilities[lead_id] = 100
+            elif valid_team[row]:
+                lead_probabilities[lead_id] = min(max(round(100 * float(probabilities[row]), 2), 0.01), 99.99)
+        return lead_probabilities
+
     # ---------------------------------
     # PLS: Live Increment
     # ---------------------------------
@@ -2263,39 +2879,115 @@ class Lead(models.Model):
         what was the previous state that we need to decrement.
         This is why 'is_won' and 'decrement' parameters are used to describe the from / to change of its state.
         """
-        new_frequencies_by_team, existing_frequencies_by_team = self._pls_prepare_update_frequency_table(target_state=from_state or to_state)
+        # Use the criteria the frequency table was built with: criteria changed since are applied by the next sync
+        checkpoint = self._pls_get_frequency_checkpoint()
+        if checkpoint:
+            new_frequencies_by_team = self._pls_prepare_update_frequency_table(
+                target_state=from_state or to_state, pls_start_date=checkpoint['start_date'],
+                pls_fields=['stage_id', 'team_id'] + [field for field in checkpoint['fields'] if field in self._fields])
+        else:
+            new_frequencies_by_team = self._pls_prepare_update_frequency_table(target_state=from_state or to_state)
 
         # update frequency table
-        self._pls_update_frequency_table(new_frequencies_by_team, 1 if to_state else -1,
-                                         existing_frequencies_by_team=existing_frequencies_by_team)
+        self._pls_update_frequency_table(new_frequencies_by_team, 1 if to_state else -1)
 
     # ---------------------------------
-    # PLS: One shot rebuild
+    # PLS: Delta Sync / One shot rebuild
     # ---------------------------------
-    def _cron_update_automated_probabilities(self):
+    def _cron_update_automated_probabilities(self, force_rebuild=False):
         """ This cron will :
-          - rebuild the lead scoring frequency table
+          - sync the lead scoring frequency table with the current criteria
           - recompute all the automated_probability and align probability if both were aligned
+
+        :param bool force_rebuild: rebuild the frequency table from scratch, see ``_rebuild_pls_frequency_table``
         """
         cron_start_date = datetime.now()
-        self._rebuild_pls_frequency_table()
+        self._rebuild_pls_frequency_table(force=force_rebuild)
         self._update_automated_probabilities()
         _logger.info("Predictive Lead Scoring : Cron duration = %d seconds" % ((datetime.now() - cron_start_date).total_seconds()))
 
-    def _rebuild_pls_frequency_table(self):
-        # Clear the frequencies table (in sql to speed up the cron)
+    def _rebuild_pls_frequency_table(self, force=False):
+        """ Sync the frequency table with the current PLS criteria (fields and start date).
+
+        The checkpoint records the criteria the table was last built with; live increments keep it up to date
+        in between. Compared to the checkpoint:
+            - removed fields: their frequencies are deleted
+            - added fields: only these fields are computed, for every closed lead since the start date
+            - moved start date: only the closed leads between the old and new start dates are processed, their
+              frequencies being added (earlier start date) or subtracted (later start date)
+        Without checkpoint, when ``force`` is set or when the last full rebuild is older than
+        PLS_FREQUENCY_FULL_REBUILD_DAYS, the table is emptied and rebuilt from scratch.
+        """
         try:
             self.browse().check_access('unlink')
         except AccessError:
             raise UserError(_("You don't have the access needed to run this cron."))
-        else:
+
+        pls_start_date = self._pls_get_safe_start_date()
+        pls_fields = self._pls_get_safe_fields()
+        checkpoint = self._pls_get_frequency_checkpoint()
+        rebuild_date = checkpoint and fields.Datetime.to_datetime(checkpoint.get('rebuild_date'))
+        if not rebuild_date or rebuild_date < datetime.now() - timedelta(days=PLS_FREQUENCY_FULL_REBUILD_DAYS):
+            force = True
+        if force or not checkpoint or not pls_start_date:
+            # Clear the frequencies table (in sql to speed up the cron)
             self._cr.execute('TRUNCATE TABLE crm_lead_scoring_frequency')
+            self.env['crm.lead.scoring.frequency'].invalidate_model()
+            new_frequencies_by_team = self._pls_prepare_update_frequency_table(rebuild=True)
+            self._pls_update_frequency_table(new_frequencies_by_team, 1)
+            self._pls_set_frequency_checkpoint(pls_start_date, pls_fields, datetime.now())
+            _logger.info("Predictive Lead Scoring : crm.lead.scoring.frequency table rebuilt")
+            return
 
-        new_frequencies_by_team, unused = self._pls_prepare_update_frequency_table(rebuild=True)
-        # update frequency table
-        self._pls_update_frequency_table(new_frequencies_by_team, 1)
+        removed_fields = [field for field in checkpoint['fields'] if field not in pls_fields]
+        added_fields = [field for field in pls_fields if field not in checkpoint['fields']]
+        if removed_fields:
+            self.env['crm.lead.scoring.frequency'].flush_model()
+            self._cr.execute(SQL(
+                "DELETE FROM crm_lead_scoring_frequency WHERE variable = ANY(%s)",
+                ['tag_id' if field == 'tag_ids' else field for field in removed_fields],
+            ))
+            self.env['crm.lead.scoring.frequency'].invalidate_model()
+        if added_fields:
+            new_frequencies_by_team = self._pls_prepare_update_frequency_table(
+                rebuild=True, pls_fields=['team_id'] + added_fields)
+            self._pls_update_frequency_table(new_frequencies_by_team, 1)
+        if checkpoint['start_date'] != pls_start_date:
+            # Fields added above were already computed with the new start date
+            window_fields = ['stage_id', 'team_id'] + [field for field in pls_fields if field not in added_fields]
+            date_from, date_to = sorted([checkpoint['start_date'], pls_start_date])
+            new_frequencies_by_team = self._pls_prepare_update_frequency_table(
+                rebuild=True, pls_fields=window_fields,
+                rebuild_domain=self._pls_get_closed_leads_domain(date_from, date_to=date_to))
+            self._pls_update_frequency_table(new_frequencies_by_team, 1 if pls_start_date < checkpoint['start_date'] else -1)
+        self._pls_set_frequency_checkpoint(pls_start_date, pls_fields, rebuild_date)
+
+        _logger.info(
+            "Predictive Lead Scoring : crm.lead.scoring.frequency table synced (%d fields added, %d fields removed, start date %s)",
+            len(added_fields), len(removed_fields),
+            'moved' if checkpoint['start_date'] != pls_start_date else 'unchanged',
+        )
 
-        _logger.info("Predictive Lead Scoring : crm.lead.scoring.frequency table rebuilt")
+    def _pls_get_frequency_checkpoint(self):
+        """ Criteria the frequency table was last built with, or None:
+        {'start_date': str, 'fields': [str], 'rebuild_date': str (last full rebuild)}. """
+        checkpoint = self.env['ir.config_parameter'].sudo().get_param(PLS_FREQUENCY_CHECKPOINT_PARAM)
+        try:
+            checkpoint = json.loads(checkpoint) if checkpoint else None
+        except ValueError:
+            return None
+        if not isinstance(checkpoint, dict) or not fields.Date.to_date(checkpoint.get('start_date')):
+            return None
+        return checkpoint
+
+    def _pls_set_frequency_checkpoint(self, pls_start_date, pls_fields, rebuild_date):
+        self.env['ir.config_parameter'].sudo().set_param(
+            PLS_FREQUENCY_CHECKPOINT_PARAM,
+            json.dumps({
+                'start_date': pls_start_date, 'fields': pls_fields,
+                'rebuild_date': fields.Datetime.to_string(rebuild_date),
+            }) if pls_start_date else False,
+        )
 
     def _update_automated_probabilities(self):
         """ Recompute all the automated_probability (and align probability if both were aligned) for all the leads
@@ -2327,44 +3019,18 @@ class Lead(models.Model):
 
         # 2. Compute by batch to avoid memory error
         lead_probabilities = {}
+        vectorized_model = self._pls_get_vectorized_model() if self._pls_use_vectorized_engine() else None
         for i in range(0, leads_to_update_count, PLS_COMPUTE_BATCH_STEP):
             leads_to_update_part = leads_to_update[i:i + PLS_COMPUTE_BATCH_STEP]
-            lead_probabilities.update(leads_to_update_part._pls_get_naive_bayes_probabilities(batch_mode=True))
+            if vectorized_model is not None:
+                lead_probabilities.update(leads_to_update_part._pls_get_naive_bayes_probabilities_vectorized(vectorized_model))
+            else:
+                lead_probabilities.update(leads_to_update_part._pls_get_naive_bayes_probabilities(batch_mode=True))
         _logger.info("Predictive Lead Scoring : New automated probabilities computed")
 
-        # 3. Group by new probability to reduce server roundtrips when executing the update
-        probability_leads = defaultdict(list)
-        for lead_id, probability in sorted(lead_probabilities.items()):
-            probability_leads[probability].append(lead_id)
-
-        # 4. Update automated_probability (+ probability if both were equal)
-        update_sql = """UPDATE crm_lead
-                        SET automated_probability = %s,
-                            probability = CASE WHEN (probability = automated_probability OR probability is null)
-                                               THEN (%s)
-                                               ELSE (probability)
-                                          END
-                        WHERE id in %s"""
-
-        # Update by a maximum number of leads at the same time, one batch by transaction :
-        # - avoid memory errors
-        # - avoid blocking the table for too long with a too big transaction
-        transactions_count, transactions_failed_count = 0, 0
+        # 3. Update automated_probability (+ probability if both were equal)
         cron_update_lead_start_date = datetime.now()
-        auto_commit = not getattr(threading.current_thread(), 'testing', False)
-        self.flush_model()
-        for probability, probability_lead_ids in probability_leads.items():
-            for lead_ids_current in tools.split_every(PLS_UPDATE_BATCH_STEP, probability_lead_ids):
-                transactions_count += 1
-                try:
-                    self.env.cr.execute(update_sql, (probability, probability, tuple(lead_ids_current)))
-                    # auto-commit except in testing mode
-                    if auto_commit:
-                        self.env.cr.commit()
-                except Exception as e:
-                    _logger.warning("Predictive Lead Scoring : update transaction failed. Error: %s" % e)
-                    transactions_failed_count += 1
-        self.invalidate_model()
+        transactions_count, transactions_failed_count = self._pls_write_automated_probabilities(lead_probabilities)
 
         _logger.info(
             "Predictive Lead Scoring : All automated probabilities updated (%d leads / %d transactions (%d failed) / %d seconds)" % (
@@ -2375,29 +3041,70 @@ class Lead(models.Model):
             )
         )
 
+    def _pls_use_vectorized_engine(self):
+        """ Use the numpy engine when available, unless 'crm.pls_engine' is set to 'python'. """
+        return np is not None and self.env['ir.config_parameter'].sudo().get_param('crm.pls_engine') != 'python'
+
+    def _pls_write_automated_probabilities(self, lead_probabilities):
+        """ Write the automated probabilities (and the probabilities that were aligned with them) with one
+        UPDATE ... FROM (VALUES ...) per batch of PLS_UPDATE_BATCH_STEP leads.
+
+        Each batch is performed into its own transaction (except in testing mode), in order to minimise the lock
+        time on the lead table: if a concurrent update occurs, it will simply be put in the queue to get the lock.
+
+        :param lead_probabilities: {lead_id: probability}
+        :return: number of transactions, number of failed transactions
+        """
+        transactions_count, transactions_failed_count = 0, 0
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.flush_model()
+        for batch in tools.split_every(PLS_UPDATE_BATCH_STEP, sorted(lead_probabilities.items())):
+            transactions_count += 1
+            try:
+                self.env.cr.execute(SQL(
+                    """UPDATE crm_lead
+                          SET automated_probability = v.probability,
+                              probability = CASE WHEN (crm_lead.probability = crm_lead.automated_probability OR crm_lead.probability is null)
+                                                 THEN (v.probability)
+                                                 ELSE (crm_lead.probability)
+                                            END
+                         FROM (VALUES %s) AS v(id, probability)
+                        WHERE crm_lead.id = v.id""",
+                    SQL(", ").join(SQL("(%s, %s::float8)", lead_id, probability) for lead_id, probability in batch),
+                ))
+                # auto-commit except in testing mode
+                if auto_commit:
+                    self.env.cr.commit()
+            except Exception as e:
+                _logger.warning("Predictive Lead Scoring : update transaction failed. Error: %s" % e)
+                transactions_failed_count += 1
+        self.invalidate_model()
+        return transactions_count, transactions_failed_count
+
     # ---------------------------------
     # PLS: Common parts for both mode
     # ---------------------------------
-    def _pls_prepare_update_frequency_table(self, rebuild=False, target_state=False):
+    def _pls_prepare_update_frequency_table(self, rebuild=False, target_state=False, rebuild_domain=None,
+                                            pls_start_date=None, pls_fields=None):
         """
-        This method is common to Live Increment or Full Rebuild mode, as it shares the main steps.
-        This method will prepare the frequency dict needed to update the frequency table:
-            - New frequencies: frequencies that we need to add in the frequency table.
-            - Existing frequencies: frequencies that are already in the frequency table.
-        In rebuild mode, only the new frequencies are needed as existing frequencies are truncated.
+        This method is common to Live Increment or Rebuild / Delta Sync mode, as it shares the main steps.
+        This method will prepare the frequency dict needed to update the frequency table: the frequencies
+        (deltas) that we need to add to the frequency table.
         For each team, each dict contains the frequency in won and lost for each field/value couple
         of the target leads.
         Target leads are :
             - in Live increment mode : given ongoing leads (self)
-            - in Full rebuild mode : all the closed (won and lost) leads in the DB.
-        During the frequencies update, with both new and existing frequencies, we can split frequencies to update
-        and frequencies to add. If a field/value couple already exists in the frequency table, we just update it.
-        Otherwise, we need to insert a new one.
+            - in Rebuild mode : the closed (won and lost) leads in the DB matching ``rebuild_domain``
+              (by default, all the closed leads since the PLS start date).
+        During the frequencies update, if a field/value couple already exists in the frequency table,
+        it is incremented. Otherwise, a new one is inserted.
+        :param pls_start_date: leads created before are ignored (default: the PLS start date)
+        :param pls_fields: lead fields to compute (default: stage, team and the PLS fields)
         """
         # Keep eligible leads
-        pls_start_date = self._pls_get_safe_start_date()
+        pls_start_date = pls_start_date or self._pls_get_safe_start_date()
         if not pls_start_date:
-            return {}, {}
+            return {}
 
         if rebuild:  # rebuild will treat every closed lead in DB, increment will treat current ongoing leads
             pls_leads = self
@@ -2406,24 +3113,17 @@ class Lead(models.Model):
             pls_leads = self.filtered(
                 lambda lead: fields.Date.to_date(pls_start_date) <= fields.Date.to_date(lead.create_date))
             if not pls_leads:
-                return {}, {}
+                return {}
 
         # Extract target leads values
         if rebuild:  # rebuild is ok
-            domain = [
-                '&',
-                    ('create_date', '>=', pls_start_date),
-                    '|',
-                        ('probability', '=', 100),
-                        '&',
-                            ('probability', '=', 0), ('active', '=', False)
-              ]
+            domain = rebuild_domain or self._pls_get_closed_leads_domain(pls_start_date)
             team_ids = self.env['crm.team'].with_context(active_test=False).search([]).ids + [0]  # If team_id is unset, consider it as team 0
         else:  # increment
             domain = [('id', 'in', pls_leads.ids)]
             team_ids = pls_leads.mapped('team_id').ids + [0]
 
-        leads_values_dict = pls_leads._pls_get_lead_pls_values(domain=domain)
+        leads_values_dict = pls_leads._pls_get_lead_pls_values(domain=domain, pls_fields=pls_fields)
 
         # split leads values by team_id
         # get current frequencies related to the target leads
@@ -2451,67 +3151,52 @@ class Lead(models.Model):
             new_frequencies_by_team[team_id] = self._pls_prepare_frequencies(
                 leads_frequency_values_by_team[team_id], leads_pls_fields, target_state=target_state)
 
-        # get existing frequencies
-        existing_frequencies_by_team = {}
-        if not rebuild:  # there is no existing frequency in rebuild mode as they were all deleted.
-            # read all fields to get everything in memory in one query (instead of having query + prefetch)
-            existing_frequencies = self.env['crm.lead.scoring.frequency'].search_read(
-                ['&', ('variable', 'in', leads_pls_fields),
-                      '|', ('team_id', 'in', pls_leads.mapped('team_id').ids), ('team_id', '=', False)])
-            for frequency in existing_frequencies:
-                team_id = frequency['team_id'][0] if frequency.get('team_id') else 0
-                if team_id not in existing_frequencies_by_team:
-                    existing_frequencies_by_team[team_id] = dict((field, {}) for field in leads_pls_fields)
-
-                existing_frequencies_by_team[team_id][frequency['variable']][frequency['value']] = {
-                    'frequency_id': frequency['id'],
-                    'won': frequency['won_count'],
-                    'lost': frequency['lost_count']
-                }
+        return new_frequencies_by_team
 
-        return new_frequencies_by_team, existing_frequencies_by_team
-
-    def _pls_update_frequency_table(self, new_frequencies_by_team, step, existing_frequencies_by_team=None):
-        """ Create / update the frequency table in a cross company way, per team_id"""
-        values_to_update = {}
-        values_to_create = []
-        if not existing_frequencies_by_team:
-            existing_frequencies_by_team = {}
-        # build the create multi + frequencies to update
-        for team_id, new_frequencies in new_frequencies_by_team.items():
-            for field, value in new_frequencies.items():
-                # frequency already present ?
-                current_frequencies = existing_frequencies_by_team.get(team_id, {})
-                for param, result in value.items():
-                    current_frequency_for_couple = current_frequencies.get(field, {}).get(param, {})
-                    # If frequency already present : UPDATE IT
-                    if current_frequency_for_couple:
-                        new_won = current_frequency_for_couple['won'] + (result['won'] * step)
-                        new_lost = current_frequency_for_couple['lost'] + (result['lost'] * step)
-                        # ensure to have always positive frequencies
-                        values_to_update[current_frequency_for_couple['frequency_id']] = {
-                            'won_count': new_won if new_won > 0 else 0.1,
-                            'lost_count': new_lost if new_lost > 0 else 0.1
-                        }
-                        continue
-
-                    # Else, CREATE a new frequency record.
-                    # We add + 0.1 in won and lost counts to avoid zero frequency issues
-                    # should be +1 but it weights too much on small recordset.
-                    values_to_create.append({
-                        'variable': field,
-                        'value': param,
-                        'won_count': result['won'] + 0.1,
-                        'lost_count': result['lost'] + 0.1,
-                        'team_id': team_id if team_id else None  # team_id = 0 means no team_id
-                    })
-
-        LeadScoringFrequency = self.env['crm.lead.scoring.frequency'].sudo()
-        for frequency_id, values in values_to_update.items():
-            LeadScoringFrequency.browse(frequency_id).write(values)
-
-        if values_to_create:
-            LeadScoringFrequency.create(values_to_create)
+    def _pls_update_frequency_table(self, new_frequencies_by_team, step):
+        """ Apply the won / lost frequencies of new_frequencies_by_team (multiplied by step) to the frequency
+        table in a cross company way, with one SQL upsert per batch of (variable, value, team_id) couples:
+            - existing couples are incremented (decremented if step < 0), ensuring to have always positive
+              frequencies
+            - new couples are inserted with + 0.1 in won and lost counts to avoid zero frequency issues
+              (should be +1 but it weights too much on small recordset).
+        """
+        frequency_rows = [
+            (field, param, team_id or None, result['won'] * step, result['lost'] * step)  # team_id = 0 means no team_id
+            for team_id, new_frequencies in new_frequencies_by_team.items()
+            for field, value in new_frequencies.items()
+            for param, result in value.items()
+        ]
+        if not frequency_rows:
+            return
+        LeadScoringFrequency = self.env['crm.lead.scoring.frequency']
+        LeadScoringFrequency.flush_model()
+        for rows in tools.split_every(PLS_UPDATE_BATCH_STEP, frequency_rows):
+            # Inserted counts are "0.1 + delta": on conflict, the delta is added to the existing counts
+            self._cr.execute(SQL(
+                """INSERT INTO crm_lead_scoring_frequency AS f
+                              (variable, value, team_id, won_count, lost_count, create_uid, write_uid, create_date, write_date)
+                        SELECT v.variable, v.value, v.team_id::int4, 0.1 + v.won::numeric, 0.1 + v.lost::numeric,
+                               %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+                          FROM (VALUES %(values)s) AS v(variable, value, team_id, won, lost)
+                   ON CONFLICT (variable, value, (COALESCE(team_id, 0))) DO UPDATE
+                           SET won_count = CASE WHEN f.won_count + EXCLUDED.won_count - 0.1 > 0
+                                                THEN f.won_count + EXCLUDED.won_count - 0.1 ELSE 0.1 END,
+                               lost_count = CASE WHEN f.lost_count + EXCLUDED.lost_count - 0.1 > 0
+                                                 THEN f.lost_count + EXCLUDED.lost_count - 0.1 ELSE 0.1 END,
+                               write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+                     RETURNING id""",
+                uid=self.env.uid,
+                values=SQL(", ").join(SQL("(%s, %s, %s, %s, %s)", *row) for row in rows),
+            ))
+            # New couples decremented below zero: reset them to the minimal frequency
+            self._cr.execute(SQL(
+                """UPDATE crm_lead_scoring_frequency
+                      SET won_count = GREATEST(won_count, 0.1), lost_count = GREATEST(lost_count, 0.1)
+                    WHERE id = ANY(%s) AND (won_count <= 0 OR lost_count <= 0)""",
+                [row[0] for row in self._cr.fetchall()],
+            ))
+        LeadScoringFrequency.invalidate_model()
 
     # ---------------------------------
     # Utility Tools for PLS
@@ -2540,6 +3225,20 @@ class Lead(models.Model):
         pls_safe_fields = [field for field in pls_fields if field in self._fields.keys()]
         return pls_safe_fields
 
+    def _pls_get_closed_leads_domain(self, date_from, date_to=False):
+        """ Closed (won or lost) leads created since date_from (and before date_to, if given). """
+        domain = [
+            '&',
+                ('create_date', '>=', date_from),
+                '|',
+                    ('probability', '=', 100),
+                    '&',
+                        ('probability', '=', 0), ('active', '=', False)
+        ]
+        if date_to:
+            domain = expression.AND([domain, [('create_date', '<', date_to)]])
+        return domain
+
     # Compute Automated Probability Tools
     # -----------------------------------
     def _pls_get_won_lost_total_count(self, team_results):
@@ -2613,7 +3312,7 @@ class Lead(models.Model):
 
     # Common PLS Tools
     # ----------------
-    def _pls_get_lead_pls_values(self, domain=[]):
+    def _pls_get_lead_pls_values(self, domain=[], pls_fields=None):
         """
         This methods builds a dict where, for each lead in self or matching the given domain,
         we will get a list of field/value couple.
@@ -2626,10 +3325,13 @@ class Lead(models.Model):
         :param domain: If set, we get all the leads values via unique sql queries (one for tags, one for other fields),
                             using the given domain on leads.
                        If not set, get lead values lead by lead using the ORM.
+        :param pls_fields: lead fields to get (default: stage, team and the PLS fields)
         :return: {lead_id: [(field1: value1), (field2: value2), ...], ...}
         """
         leads_values_dict = OrderedDict()
-        pls_fields = ["stage_id", "team_id"] + self._pls_get_safe_fields()
+        pls_fields = list(pls_fields) if pls_fields else ["stage_id", "team_id"] + self._pls_get_safe_fields()
+        if 'team_id' not in pls_fields:  # needed to split the values by team
+            pls_fields.append('team_id')
 
         # Check if tag_ids is in the pls_fields and removed it from the list. The tags will be managed separately.
         use_tags = 'tag_ids' in pls_fields
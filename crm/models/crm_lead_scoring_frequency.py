@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from odoo import fields, models
+from odoo.tools import sql
 
 
 class LeadScoringFrequency(models.Model):
@@ -12,6 +13,36 @@ class LeadScoringFrequency(models.Model):
     lost_count = fields.Float('Lost Count', digits=(16, 1))  # Float because we add 0.1 to avoid zero Frequency issue
     team_id = fields.Many2one('crm.team', 'Sales Team', ondelete="cascade")
 
+    def init(self):
+        # One frequency per (variable, value, team) couple, so that crm.lead can apply frequency deltas with upserts
+        if sql.index_exists(self.env.cr, 'crm_lead_scoring_frequency_variable_value_team_uniq'):
+            return
+        # Concurrent live increments could create duplicated couples: keep the latest one (the one PLS updates),
+        # adding the counts of the older ones to it
+        self.env.cr.execute("""
+            UPDATE crm_lead_scoring_frequency f
+               SET won_count = totals.won_count,
+                   lost_count = totals.lost_count
+              FROM (
+                    SELECT max(id) AS id, sum(COALESCE(won_count, 0)) AS won_count, sum(COALESCE(lost_count, 0)) AS lost_count
+                      FROM crm_lead_scoring_frequency
+                     WHERE variable IS NOT NULL AND value IS NOT NULL
+                  GROUP BY variable, value, COALESCE(team_id, 0)
+                    HAVING count(*) > 1
+                   ) totals
+             WHERE f.id = totals.id
+        """)
+        self.env.cr.execute("""
+            DELETE FROM crm_lead_scoring_frequency f
+                  USING crm_lead_scoring_frequency newer
+                  WHERE newer.variable = f.variable AND newer.value = f.value
+                    AND COALESCE(newer.team_id, 0) = COALESCE(f.team_id, 0) AND newer.id > f.id
+        """)
+        sql.create_unique_index(
+            self.env.cr, 'crm_lead_scoring_frequency_variable_value_team_uniq', self._table,
+            ['variable', 'value', 'COALESCE(team_id, 0)'],
+        )
+
 class FrequencyField(models.Model):
     _name = 'crm.lead.scoring.frequency.field'
     _description = 'Fields that can be used for predictive lead scoring computation'
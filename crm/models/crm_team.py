@@ -7,11 +7,12 @@ import random
 import threading
 
 from ast import literal_eval
+from collections import defaultdict
 from markupsafe import Markup
 
 from odoo import api, exceptions, fields, models, _
 from odoo.osv import expression
-from odoo.tools import float_compare, float_round, SQL
+from odoo.tools import float_compare, float_round, split_every, SQL
 from odoo.tools.safe_eval import safe_eval
 
 _logger = logging.getLogger(__name__)
@@ -193,7 +194,7 @@ class Team(models.Model):
     # ------------------------------------------------------------
 
     @api.model
-    def _cron_assign_leads(self, force_quota=False, creation_delta_days=7):
+    def _cron_assign_leads(self, force_quota=False, creation_delta_days=7, dry_run=False):
         """ Cron method assigning leads. Leads are allocated to all teams and
         assigned to their members.
 
@@ -205,6 +206,8 @@ class Team(models.Model):
         times a day.
         The daily quota of leads can be forcefully assigned with force_quota
         (ignoring the daily leads already assigned).
+        With dry_run, the assignment is only planned and the planned distribution
+        is logged, without modifying any lead.
 
         See ``CrmTeam.action_assign_leads()`` and its sub methods for more
         details about assign process.
@@ -213,7 +216,7 @@ class Team(models.Model):
         self.env['crm.team'].search([
             '&', '|', ('use_leads', '=', True), ('use_opportunities', '=', True),
             ('assignment_optout', '=', False)
-        ])._action_assign_leads(force_quota=force_quota, creation_delta_days=creation_delta_days)
+        ])._action_assign_leads(force_quota=force_quota, creation_delta_days=creation_delta_days, dry_run=dry_run)
         return True
 
     def action_assign_leads(self):
@@ -253,7 +256,7 @@ class Team(models.Model):
             }
         }
 
-    def _action_assign_leads(self, force_quota=False, creation_delta_days=7):
+    def _action_assign_leads(self, force_quota=False, creation_delta_days=7, dry_run=False):
         """ Private method for lead assignment. This method both
 
           * assigns leads to teams given by self;
@@ -265,6 +268,9 @@ class Team(models.Model):
                                  the leads already assigned today
         :param int creation_delta_days: Take into account all leads created in the last nb days (by default 7).
                                         If set to zero we take all the past leads.
+        :param bool dry_run: only plan the assignment: nothing is written and the
+          returned data gives the planned distribution. Leads allocated to a team
+          are then distributed to its members as if they were already in it;
 
         :return teams_data, members_data: structure-based result of assignment
           process. For more details about data see ``CrmTeam._allocate_leads()``
@@ -274,13 +280,17 @@ class Team(models.Model):
             raise exceptions.UserError(_('Lead/Opportunities automatic assignment is limited to managers or administrators'))
 
         _logger.info(
-            '### START Lead Assignment (%d teams, %d sales persons, force daily quota: %s)',
+            '### START Lead Assignment (%d teams, %d sales persons, force daily quota: %s, dry run: %s)',
             len(self),
             len(self.crm_team_member_ids),
-            "ON" if force_quota else "OFF")
-        teams_data = self._allocate_leads(creation_delta_days=creation_delta_days)
+            "ON" if force_quota else "OFF",
+            "ON" if dry_run else "OFF")
+        teams_data = self._allocate_leads(creation_delta_days=creation_delta_days, dry_run=dry_run)
         _logger.info('### Team repartition done. Starting salesmen assignment.')
-        members_data = self._assign_and_convert_leads(force_quota=force_quota)
+        allocated_leads = None
+        if dry_run:
+            allocated_leads = {team: team_data['assigned'] | team_data['merged'] for team, team_data in teams_data.items()}
+        members_data = self._assign_and_convert_leads(force_quota=force_quota, dry_run=dry_run, allocated_leads=allocated_leads)
         _logger.info('### END Lead Assignment')
         return teams_data, members_data
 
@@ -350,7 +360,7 @@ class Team(models.Model):
 
         return message_parts
 
-    def _allocate_leads(self, creation_delta_days=7):
+    def _allocate_leads(self, creation_delta_days=7, dry_run=False):
         """ Allocate leads to teams given by self. This method sets ``team_id``
         field on lead records that are unassigned (no team and no responsible).
         No salesperson is assigned in this process. Its purpose is simply to
@@ -393,6 +403,12 @@ class Team(models.Model):
         allocation will be proportional to their size (assignment of their
         members).
 
+        The assignment domains of all teams are evaluated with a single query
+        into a lead x team eligibility bitmap (see ``_get_assignment_eligibility``)
+        and the weighted random choices are made in memory. The resulting plan
+        is then applied team by team, by bundles of leads allocated (and
+        deduplicated) together.
+
         :config int crm.assignment.bundle: deprecated
         :config int crm.assignment.commit.bundle: optional config parameter allowing
           to set size of lead batch to be committed together. By default 100
@@ -405,6 +421,9 @@ class Team(models.Model):
           into CRM. This is now not required anymore but still supported;
 
         :param int creation_delta_days: see ``CrmTeam._action_assign_leads()``;
+        :param bool dry_run: only plan the allocation, see ``CrmTeam._action_assign_leads()``.
+          In that case 'merged' holds the leads that would be merged with their
+          duplicates, the elected master being only known when merging;
 
         :return teams_data: dict() with each team assignment result:
           team: {
@@ -420,102 +439,150 @@ class Team(models.Model):
 
         BUNDLE_HOURS_DELAY = float(self.env['ir.config_parameter'].sudo().get_param('crm.assignment.delay', default=0))
         BUNDLE_COMMIT_SIZE = int(self.env['ir.config_parameter'].sudo().get_param('crm.assignment.commit.bundle', 100))
-        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        auto_commit = not dry_run and not getattr(threading.current_thread(), 'testing', False)
+        Lead = self.env['crm.lead']
 
         # leads
         max_create_dt = self.env.cr.now() - datetime.timedelta(hours=BUNDLE_HOURS_DELAY)
-        duplicates_lead_cache = dict()
-
-        # teams data
-        teams_data, population, weights = dict(), list(), list()
-        for team in self:
-            if not team.assignment_max:
-                continue
-
+        lead_domain = expression.AND([
+            [('create_date', '<=', max_create_dt)],
+            ['&', ('team_id', '=', False), ('user_id', '=', False)],
+            ['|', ('stage_id', '=', False), ('stage_id.is_won', '=', False)]
+        ])
+        if creation_delta_days > 0:
             lead_domain = expression.AND([
-                literal_eval(team.assignment_domain or '[]'),
-                [('create_date', '<=', max_create_dt)],
-                ['&', ('team_id', '=', False), ('user_id', '=', False)],
-                ['|', ('stage_id', '=', False), ('stage_id.is_won', '=', False)]
+                lead_domain,
+                [('create_date', '>', self.env.cr.now() - datetime.timedelta(days=creation_delta_days))]
             ])
-            if creation_delta_days > 0:
-                lead_domain = expression.AND([
-                    lead_domain,
-                    [('create_date', '>', self.env.cr.now() - datetime.timedelta(days=creation_delta_days))]
-                ])
-
-            leads = self.env["crm.lead"].search(lead_domain)
-            # Fill duplicate cache: search for duplicate lead before the assignation
-            # avoid to flush during the search at every assignation
-            for lead in leads:
-                if lead not in duplicates_lead_cache:
-                    duplicates_lead_cache[lead] = lead._get_lead_duplicates(email=lead.email_from)
-
-            teams_data[team] = {
+
+        # teams data: bit i of the eligibility of a lead is set when it matches the domain of teams[i]
+        teams = self.filtered('assignment_max')
+        eligibility = self._get_assignment_eligibility([
+            expression.AND([literal_eval(team.assignment_domain or '[]'), lead_domain])
+            for team in teams
+        ])
+        # teams pick their leads in the default order, as returned by a search
+        candidate_ids = [lead_id for lead_id in Lead._search(lead_domain, order=Lead._order) if lead_id in eligibility]
+        team_lead_ids = [
+            [lead_id for lead_id in candidate_ids if eligibility[lead_id] >> index & 1]
+            for index in range(len(teams))
+        ]
+        # Fill duplicate cache: search for duplicate leads of all candidates at once
+        # in the duplicate detection index, before the assignation
+        duplicates_lead_cache = Lead.browse(candidate_ids)._get_lead_duplicates_batch()
+        teams_data = {
+            team: {
                 "team": team,
-                "leads": leads,
                 "assigned": set(),
                 "merged": set(),
                 "duplicates": set(),
-            }
-            population.append(team)
-            weights.append(team.assignment_max)
-
-        # Start a new transaction, since data fetching take times
-        # and the first commit occur at the end of the bundle,
-        # the first transaction can be long which we want to avoid
-        if auto_commit:
-            self._cr.commit()
-
-        # assignment process data
-        global_data = dict(assigned=set(), merged=set(), duplicates=set())
-        leads_done_ids, lead_unlink_ids, counter = set(), set(), 0
-        while population:
-            counter += 1
-            team = random.choices(population, weights=weights, k=1)[0]
+            } for team in teams
+        }
 
-            # filter remaining leads, remove team if no more leads for it
-            teams_data[team]["leads"] = teams_data[team]["leads"].filtered(lambda l: l.id not in leads_done_ids).exists()
-            if not teams_data[team]["leads"]:
-                population_index = population.index(team)
+        # assignment plan: weighted random choice of a team, which takes its next
+        # lead still available; the lead and its duplicates are then done
+        leads_per_team = defaultdict(list)
+        leads_done_ids, next_positions = set(), [0] * len(teams)
+        population = [index for index in range(len(teams)) if team_lead_ids[index]]
+        weights = [teams[index].assignment_max for index in population]
+        while population:
+            population_index = random.choices(range(len(population)), weights=weights, k=1)[0]
+            team_index = population[population_index]
+            lead_ids, position = team_lead_ids[team_index], next_positions[team_index]
+            while position < len(lead_ids) and lead_ids[position] in leads_done_ids:
+                position += 1
+            next_positions[team_index] = position
+            # remove team if no more leads for it
+            if position == len(lead_ids):
                 population.pop(population_index)
                 weights.pop(population_index)
                 continue
 
-            # assign + deduplicate and concatenate results in teams_data to keep some history
-            candidate_lead = teams_data[team]["leads"][0]
-            assign_res = team._allocate_leads_deduplicate(candidate_lead, duplicates_cache=duplicates_lead_cache)
-            for key in ('assigned', 'merged', 'duplicates'):
-                teams_data[team][key].update(assign_res[key])
-                leads_done_ids.update(assign_res[key])
-                global_data[key].update(assign_res[key])
-            lead_unlink_ids.update(assign_res['duplicates'])
-
-            # auto-commit except in testing mode. As this process may be time consuming or we
-            # may encounter errors, already commit what is allocated to avoid endless cron loops.
-            if auto_commit and counter % BUNDLE_COMMIT_SIZE == 0:
-                # unlink duplicates once
-                self.env['crm.lead'].browse(lead_unlink_ids).unlink()
-                lead_unlink_ids = set()
+            team, lead_id = teams[team_index], lead_ids[position]
+            leads_per_team[team].append(lead_id)
+            duplicate_ids = set(duplicates_lead_cache[Lead.browse(lead_id)].ids)
+            leads_done_ids.add(lead_id)
+            leads_done_ids.update(duplicate_ids)
+            if dry_run:
+                if len(duplicate_ids) > 1:
+                    teams_data[team]['merged'].add(lead_id)
+                    teams_data[team]['duplicates'].update(duplicate_ids - {lead_id})
+                else:
+                    teams_data[team]['assigned'].add(lead_id)
+
+        if not dry_run:
+            # Start a new transaction, since data fetching take times
+            # and the first commit occur at the end of the bundle,
+            # the first transaction can be long which we want to avoid
+            if auto_commit:
                 self._cr.commit()
 
-        # unlink duplicates once
-        self.env['crm.lead'].browse(lead_unlink_ids).unlink()
+            lead_unlink_ids = set()
+            for team, lead_ids in leads_per_team.items():
+                for bundle_ids in split_every(BUNDLE_COMMIT_SIZE, lead_ids):
+                    # assign + deduplicate and concatenate results in teams_data to keep some history
+                    # Need to check that records still exist since previous bundles have been committed
+                    assign_res = team._allocate_leads_deduplicate(
+                        Lead.browse(bundle_ids).exists(), duplicates_cache=duplicates_lead_cache)
+                    for key in ('assigned', 'merged', 'duplicates'):
+                        teams_data[team][key].update(assign_res[key])
+                    lead_unlink_ids.update(assign_res['duplicates'])
+
+                    # auto-commit except in testing mode. As this process may be time consuming or we
+                    # may encounter errors, already commit what is allocated to avoid endless cron loops.
+                    if auto_commit:
+                        # unlink duplicates once
+                        Lead.browse(lead_unlink_ids).unlink()
+                        lead_unlink_ids = set()
+                        self._cr.commit()
+
+            # unlink duplicates once
+            Lead.browse(lead_unlink_ids).unlink()
 
-        if auto_commit:
-            self._cr.commit()
+            if auto_commit:
+                self._cr.commit()
 
         # some final log
-        _logger.info('## Assigned %s leads', (len(global_data['assigned']) + len(global_data['merged'])))
+        _logger.info(
+            '## %s %s leads', 'Planned' if dry_run else 'Assigned',
+            sum(len(team_data['assigned']) + len(team_data['merged']) for team_data in teams_data.values()))
         for team, team_data in teams_data.items():
             _logger.info(
-                '## Assigned %s leads to team %s',
+                '## %s %s leads to team %s', 'Planned' if dry_run else 'Assigned',
                 len(team_data['assigned']) + len(team_data['merged']), team.id)
             _logger.info(
                 '\tLeads: direct assign %s / merge result %s / duplicates merged: %s',
                 team_data['assigned'], team_data['merged'], team_data['duplicates'])
         return teams_data
 
+    def _get_assignment_eligibility(self, domains):
+        """ Evaluate lead domains all at once: a single query gives, for each
+        lead, the domains it matches.
+
+        :param list domains: list of ``crm.lead`` domains;
+
+        :return dict: {lead ID: bitmap of matched domains}, bit i being set
+          when the lead matches ``domains[i]``. Leads matching no domain are
+          not in the result;
+        """
+        if not domains:
+            return {}
+        queries = [self.env['crm.lead']._search(domain) for domain in domains]
+        self.env.cr.execute(SQL(
+            "SELECT lead_id, array_agg(domain_index) FROM (%s) AS eligible GROUP BY lead_id",
+            SQL(" UNION ALL ").join(
+                SQL("(%s)", query.select(
+                    SQL("%s AS domain_index", index),
+                    SQL("%s AS lead_id", SQL.identifier(query.table, 'id')),
+                ))
+                for index, query in enumerate(queries)
+            ),
+        ))
+        return {
+            lead_id: sum(1 << index for index in domain_indexes)
+            for lead_id, domain_indexes in self.env.cr.fetchall()
+        }
+
     def _allocate_leads_deduplicate(self, leads, duplicates_cache=None):
         """ Assign leads to sales team given by self by calling lead tool
         method _handle_salesmen_assignment. In this method we deduplicate leads
@@ -533,13 +600,13 @@ class Team(models.Model):
         leads_assigned = self.env['crm.lead']  # direct team assign
         leads_done_ids, leads_merged_ids, leads_dup_ids = set(), set(), set()  # classification
         leads_dups_dict = dict()  # lead -> its duplicate
+        # fill cache if not already done
+        duplicates_cache.update(leads.filtered(lambda lead: lead not in duplicates_cache)._get_lead_duplicates_batch())
         for lead in leads:
             if lead.id not in leads_done_ids:
-
-                # fill cache if not already done
-                if lead not in duplicates_cache:
-                    duplicates_cache[lead] = lead._get_lead_duplicates(email=lead.email_from)
-                lead_duplicates = duplicates_cache[lead].exists()
+                # a lead is merged in one group at most
+                lead_duplicates = duplicates_cache[lead].exists().filtered(
+                    lambda duplicate: duplicate == lead or duplicate.id not in leads_done_ids)
 
                 if len(lead_duplicates) > 1:
                     leads_dups_dict[lead] = lead_duplicates
@@ -553,11 +620,13 @@ class Team(models.Model):
         dups_to_assign = [lead for lead in leads_dups_dict]
         leads_assigned.union(*dups_to_assign)._handle_salesmen_assignment(user_ids=None, team_id=self.id)
 
-        for lead in leads.filtered(lambda lead: lead in leads_dups_dict):
-            lead_duplicates = leads_dups_dict[lead]
-            merged = lead_duplicates._merge_opportunity(user_id=False, team_id=False, auto_unlink=False, max_length=0)
-            leads_dup_ids.update((lead_duplicates - merged).ids)
-            leads_merged_ids.add(merged.id)
+        # merge all groups at once
+        dups_groups = [leads_dups_dict[lead] for lead in leads if lead in leads_dups_dict]
+        if dups_groups:
+            merged_leads = self.env['crm.lead']._merge_opportunity_batch(dups_groups, user_id=False, team_id=False, auto_unlink=False)
+            for lead_duplicates, merged in zip(dups_groups, merged_leads):
+                leads_dup_ids.update((lead_duplicates - merged).ids)
+                leads_merged_ids.add(merged.id)
 
         return {
             'assigned': set(leads_assigned.ids),
@@ -572,7 +641,7 @@ class Team(models.Model):
             ('team_id', 'in', self.ids),
         ]
 
-    def _assign_and_convert_leads(self, force_quota=False):
+    def _assign_and_convert_leads(self, force_quota=False, dry_run=False, allocated_leads=None):
         """ Main processing method to assign leads to sales team members. It also
         converts them into opportunities. This method should be called after
         ``_allocate_leads`` as this method assigns leads already allocated to
@@ -590,7 +659,15 @@ class Team(models.Model):
                 * Remove it otherwise
                 * Move to the next lead
 
+        The assignment domains of all members are evaluated with a single query
+        into a lead x member eligibility bitmap (see ``_get_assignment_eligibility``)
+        and the round robin runs in memory. Leads are then converted and assigned
+        with grouped writes, by bundles of leads of the same member.
+
         :param bool force_quota: see ``CrmTeam._action_assign_leads()``;
+        :param bool dry_run: only plan the assignment, see ``CrmTeam._action_assign_leads()``;
+        :param dict allocated_leads: {team: set of lead IDs} allocated by a dry
+          run of ``_allocate_leads``, distributed as if already in their team;
 
         :return members_data: dict() with each member assignment result:
           membership: {
@@ -598,65 +675,87 @@ class Team(models.Model):
           }, ...
 
         """
-        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        auto_commit = not dry_run and not getattr(threading.current_thread(), 'testing', False)
         result_data = {}
         commit_bundle_size = int(self.env['ir.config_parameter'].sudo().get_param('crm.assignment.commit.bundle', 100))
+        Lead = self.env['crm.lead']
         teams_with_members = self.filtered(lambda team: team.crm_team_member_ids)
         quota_per_member = {member: member._get_assignment_quota(force_quota=force_quota) for member in self.crm_team_member_ids}
-        counter = 0
-        leads_per_team = dict(self.env['crm.lead']._read_group(
-            teams_with_members._get_lead_to_assign_domain(),
-            ['team_id'],
-            # Do not use recordset aggregation to avoid fetching all the leads at once in memory
-            # We want to have in memory only leads for the current team
-            # and make sure we need them before fetching them
-            ['id:array_agg'],
-        ))
-        for team, leads_to_assign_ids in leads_per_team.items():
+
+        leads_domain = teams_with_members._get_lead_to_assign_domain()
+        allocated_team_ids = {lead_id: team.id for team, lead_ids in (allocated_leads or {}).items() for lead_id in lead_ids}
+        if allocated_team_ids:
+            leads_domain = expression.OR([leads_domain, [('id', 'in', list(allocated_team_ids))]])
+        query = Lead._search(leads_domain, order='probability desc nulls last, id')
+        self.env.cr.execute(query.select(SQL.identifier(query.table, 'id'), SQL.identifier(query.table, 'team_id')))
+        leads_per_team = defaultdict(list)
+        for lead_id, team_id in self.env.cr.fetchall():
+            leads_per_team[allocated_team_ids.get(lead_id, team_id)].append(lead_id)
+
+        # members without domain accept any lead of their team, others only the
+        # leads whose eligibility has their bit set
+        member_domains = {
+            member: literal_eval(member.assignment_domain or '[]')
+            for member in self.crm_team_member_ids
+            if not member.assignment_optout and quota_per_member.get(member, 0) > 0
+        }
+        members_with_domain = [member for member, domain in member_domains.items() if domain]
+        member_bits = {member: 1 << index for index, member in enumerate(members_with_domain)}
+        eligibility = self._get_assignment_eligibility([
+            expression.AND([member_domains[member], leads_domain]) for member in members_with_domain
+        ])
+
+        leads_per_member = defaultdict(list)
+        for team in teams_with_members:
+            leads_to_assign_ids = leads_per_team.get(team.id)
+            if not leads_to_assign_ids:
+                continue
             members_to_assign = list(team.crm_team_member_ids.filtered(lambda member:
                 not member.assignment_optout and quota_per_member.get(member, 0) > 0
             ).sorted(key=lambda member: quota_per_member.get(member, 0), reverse=True))
             if not members_to_assign:
                 continue
             result_data.update({
-                member: {"assigned": self.env["crm.lead"], "quota": quota_per_member[member]}
+                member: {"assigned": Lead, "quota": quota_per_member[member]}
                 for member in members_to_assign
             })
-            # Need to check that record still exists since the ids have been fetched at the begining of the process
-            # Previous iteration has commited the change, records may have been deleted in the meanwhile
-            leads_to_assign = self.env['crm.lead'].browse(leads_to_assign_ids).exists()
-            leads_per_member = {
-                member: leads_to_assign.filtered_domain(literal_eval(member.assignment_domain or '[]'))
-                for member in members_to_assign
-            }
-            for lead in leads_to_assign.sorted(lambda lead: (-lead.probability, id)):
-                counter += 1
-                member_found = next((member for member in members_to_assign if lead in leads_per_member[member]), False)
+            for lead_id in leads_to_assign_ids:
+                lead_bits = eligibility.get(lead_id, 0)
+                member_found = next((
+                    member for member in members_to_assign
+                    if member not in member_bits or lead_bits & member_bits[member]
+                ), False)
                 if not member_found:
                     continue
-                lead.with_context(mail_auto_subscribe_no_notify=True).convert_opportunity(
-                    lead.partner_id,
-                    user_ids=member_found.user_id.ids
-                )
-                result_data[member_found]['assigned'] += lead
+                leads_per_member[member_found].append(lead_id)
                 members_to_assign.remove(member_found)
                 quota_per_member[member_found] -= 1
                 if quota_per_member[member_found] > 0:
                     # If the member should receive more lead, send him back at the end of the list
                     members_to_assign.append(member_found)
+                elif not members_to_assign:
+                    break
 
-                if auto_commit and counter % commit_bundle_size == 0:
+        for member, lead_ids in leads_per_member.items():
+            if dry_run:
+                result_data[member]['assigned'] = Lead.browse(lead_ids)
+                continue
+            for bundle_ids in split_every(commit_bundle_size, lead_ids):
+                # Need to check that records still exist since previous bundles have been committed
+                leads = Lead.browse(bundle_ids).exists()
+                leads.with_context(mail_auto_subscribe_no_notify=True)._convert_opportunity_batch(member.user_id.id)
+                result_data[member]['assigned'] += leads
+                if auto_commit:
                     self.env.cr.commit()
-            # Make sure we commit at least at the end of the team
-            if auto_commit:
-                self.env.cr.commit()
-            # Once we are done with a team we don't need to keep the leads in memory
+            # Once we are done with a member we don't need to keep the leads in memory
             # Try to avoid to explode memory usage
             self.env.invalidate_all()
 
-        _logger.info('Assigned %s leads to %s salesmen', sum(len(r['assigned']) for r in result_data.values()), len(result_data))
+        _logger.info(
+            '%s %s leads to %s salesmen', 'Planned' if dry_run else 'Assigned',
+            sum(len(r['assigned']) for r in result_data.values()), len(result_data))
         for member, member_info in result_data.items():
-            _logger.info('-> member %s of team %s: assigned %d/%d leads (%s)', member.id, member.crm_team_id.id, len(member_info["assigned"]), member_info["quota"], member_info["assigned"])
+            _logger.info('-> member %s of team %s: %s %d/%d leads (%s)', member.id, member.crm_team_id.id, 'planned' if dry_run else 'assigned', len(member_info["assigned"]), member_info["quota"], member_info["assigned"])
         return result_data
 
     # ------------------------------------------------------------
@@ -3,6 +3,9 @@
 from odoo import api, fields, models
 from odoo.osv import expression
 
+# Partner fields whose update may change the duplicate detection keys of its leads
+DEDUPE_PARTNER_TRIGGER_FIELDS = {'email', 'phone', 'mobile', 'name', 'parent_id', 'is_company'}
+
 
 class Partner(models.Model):
     _name = 'res.partner'
@@ -37,6 +40,16 @@ class Partner(models.Model):
                 )
         return rec
 
+    def write(self, vals):
+        res = super().write(vals)
+        if not DEDUPE_PARTNER_TRIGGER_FIELDS.isdisjoint(vals):
+            # leads synchronize some of their values with their customer, and
+            # their commercial entity may change
+            self.env['crm.lead'].sudo().with_context(active_test=False).search([
+                ('partner_id', 'child_of', self.ids),
+            ])._dedupe_index_update()
+        return res
+
     def _compute_opportunity_count(self):
         self.opportunity_count = 0
         if not self.env.user._has_group('sales_team.group_sale_salesman'):
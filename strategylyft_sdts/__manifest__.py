@@ -63,6 +63,7 @@
         'data/jtbd_common_force_data.xml', # Refactored data
         'data/jtbd_server_actions_data.xml', # Includes outbound placeholders
         'data/jtbd_base_automation_data.xml', # Includes outbound triggers
+        'data/jtbd_cron_data.xml', # Scheduled maintenance jobs
     ],
 
     'installable': True,
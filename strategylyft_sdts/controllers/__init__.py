@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
-from . import jtbd_feedback_controller
\ No newline at end of file
+from . import jtbd_feedback_controller
+from . import jtbd_intake_controller
\ No newline at end of file
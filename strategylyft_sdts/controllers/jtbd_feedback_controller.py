@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import hmac
 import json
 import logging
 from odoo import http
@@ -6,17 +8,26 @@ from odoo.http import request, route, Response
 
 _logger = logging.getLogger(__name__)
 
+# Max number of signals accepted in one webhook call
+FEEDBACK_WEBHOOK_MAX_BATCH = 5000
+
+
 class JtbdFeedbackController(http.Controller):
     _name = 'jtbd.feedback.controller'
 
-    # Define a simple route to receive feedback data
-    # Ensure security later (e.g., API key, IP whitelist, request signature)
-    @route('/jtbd/feedback_webhook', type='json', auth='public', methods=['POST'], csrf=False)
+    @route('/jtbd/feedback_webhook', type='http', auth='public', methods=['POST'], csrf=False)
     def receive_feedback_signal(self, **kwargs):
         """
         Webhook endpoint to receive feedback signals (e.g., from Analytics/n8n).
-        Expected JSON payload:
+
+        Signals are only authenticated and appended to the jtbd.feedback.signal
+        inbox here (202 Accepted); a cron worker applies them in bulk.
+        The raw body must be signed: header ``X-JTBD-Signature: sha256=<hex
+        HMAC-SHA256 of the body>`` with the 'jtbd_odoo_crm.webhook_secret_token'
+        system parameter as key. Expected JSON body: one signal, a list of
+        signals, or {"signals": [...]} where each signal is
         {
+            "idempotency_key": "optional client key, re-sent keys are ignored",
             "signal_type": "pattern_performance" | "content_performance" | ...,
             "reference_id": Odoo_ID_of_pattern_or_content_record,
             "model_name": "jtbd.job.pattern" | "jtbd.content.alignment" | ...,
@@ -25,73 +36,35 @@ class JtbdFeedbackController(http.Controller):
             "details": { ... optional extra data ... }
         }
         """
-        # --- Phase 4: Implement Basic Security Check (Example: Simple Token) ---
-        # In production, use a more robust method (HMAC signature, OAuth)
-        # secret_token = request.env['ir.config_parameter'].sudo().get_param('jtbd_odoo_crm.webhook_secret_token')
-        # received_token = request.httprequest.headers.get('X-JTBD-Token')
-        # if not secret_token or not received_token or not hmac.compare_digest(secret_token, received_token):
-        #    _logger.warning("JTBD Feedback Webhook: Unauthorized access attempt.")
-        #    return Response("Unauthorized", status=401)
-        # --- End Security Placeholder ---
-
-        payload = request.get_json_data() # Get JSON payload using the correct method
-        _logger.info(f"JTBD Feedback Webhook Received: {payload}")
-
-        signal_type = payload.get('signal_type')
-        ref_id = payload.get('reference_id')
-        model_name = payload.get('model_name')
-        score = payload.get('score')
-        message = payload.get('message', '')
-
-        if not all([signal_type, ref_id, model_name]):
-             _logger.warning("JTBD Feedback Webhook: Received incomplete payload.")
-             # Return valid JSON response indicating error
-             return {'status': 'error', 'message': 'Incomplete payload (signal_type, reference_id, model_name required)'}
+        body = request.httprequest.get_data()
+        secret_token = request.env['ir.config_parameter'].sudo().get_param('jtbd_odoo_crm.webhook_secret_token')
+        if not secret_token:
+            _logger.warning("JTBD Feedback Webhook: Rejected call, no webhook secret configured.")
+            return self._json_response({'status': 'error', 'message': 'Webhook secret not configured'}, 401)
+        expected = 'sha256=' + hmac.new(secret_token.encode(), body, hashlib.sha256).hexdigest()
+        received = request.httprequest.headers.get('X-JTBD-Signature', '')
+        if not hmac.compare_digest(expected, received):
+            _logger.warning("JTBD Feedback Webhook: Unauthorized access attempt (bad signature).")
+            return self._json_response({'status': 'error', 'message': 'Invalid signature'}, 401)
 
         try:
-            # --- Phase 4: Implement Basic Reaction Logic ---
-            target_model = request.env[model_name]
-            target_record = target_model.browse(int(ref_id)).exists()
-
-            if not target_record:
-                 _logger.warning(f"JTBD Feedback Webhook: Record not found for {model_name} ID {ref_id}.")
-                 return {'status': 'warning', 'message': f'Record {model_name}/{ref_id} not found'}
-
-            # Example Actions based on signal type
-            log_body = f"Received feedback signal '{signal_type}' for {model_name} ID {ref_id}."
-            if score is not None: log_body += f" Score: {score}."
-            if message: log_body += f" Message: {message}"
-
-            if signal_type == 'pattern_performance':
-                # Example: If pattern score is low, log a warning or create activity
-                if score is not None and score < 50: # Example threshold
-                     log_body += "<br/><b>Action:</b> Low performance detected. Recommend review."
-                     # Option: Create activity for manager
-                     # target_record.activity_schedule(...)
-                # Option: Update a performance score field on the pattern
-                # if hasattr(target_record, 'jtbd_performance_score'):
-                #    target_record.write({'jtbd_performance_score': score})
-
-            elif signal_type == 'content_performance':
-                # Example: Update alignment score or log note
-                if hasattr(target_record, 'alignment_score') and score is not None:
-                     target_record.write({'alignment_score': score})
-                     log_body += f"<br/><b>Action:</b> Alignment score updated to {score}."
-                # Option: Change content approval state if score is very low?
-                # if score is not None and score < 30 and hasattr(target_record, 'approval_state'):
-                #    target_record.write({'approval_state': 'pending_review'})
-
-
-            # Log action to the target record's chatter if possible
-            if hasattr(target_record, 'message_post'):
-                target_record.message_post(body=log_body, subtype_id=request.env.ref('mail.mt_note').id)
-            else:
-                 _logger.info(log_body) # Log if no chatter
+            payload = json.loads(body or b'null')
+        except ValueError:
+            return self._json_response({'status': 'error', 'message': 'Invalid JSON body'}, 400)
+        if isinstance(payload, dict):
+            signals = payload['signals'] if isinstance(payload.get('signals'), list) else [payload]
+        elif isinstance(payload, list):
+            signals = payload
+        else:
+            return self._json_response({'status': 'error', 'message': 'Expected a signal, a list of signals or {"signals": [...]}'}, 400)
+        if len(signals) > FEEDBACK_WEBHOOK_MAX_BATCH:
+            return self._json_response({'status': 'error', 'message': f'Too many signals (max {FEEDBACK_WEBHOOK_MAX_BATCH} per call)'}, 413)
 
-            return {'status': 'success', 'message': f'Feedback processed for {model_name}/{ref_id}'}
-            # --- End Basic Reaction Logic ---
+        accepted, duplicates, invalid = request.env['jtbd.feedback.signal'].sudo()._enqueue_signals(signals)
+        _logger.info(f"JTBD Feedback Webhook: {accepted} signal(s) queued, {duplicates} duplicate(s), {invalid} invalid.")
+        return self._json_response({
+            'status': 'accepted', 'accepted': accepted, 'duplicates': duplicates, 'invalid': invalid,
+        }, 202)
 
-        except Exception as e:
-            _logger.error(f"JTBD Feedback Webhook Error processing payload for {model_name}/{ref_id}: {e}", exc_info=True)
-            # Return valid JSON response indicating server error
-            return {'status': 'error', 'message': f'Internal server error processing feedback: {str(e)}'}
\ No newline at end of file
+    def _json_response(self, data, status):
+        return Response(json.dumps(data), status=status, content_type='application/json')
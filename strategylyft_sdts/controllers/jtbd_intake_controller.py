@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import codecs
+import csv
+import hmac
+import json
+import logging
+from odoo import http, api, SUPERUSER_ID
+from odoo.http import request, route, Response
+
+_logger = logging.getLogger(__name__)
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+
+
+def iter_ndjson_rows(lines):
+    """ One dict per non-empty JSON line; unparsable lines are yielded as is (reported as invalid). """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def iter_csv_rows(lines):
+    """ One dict per CSV record (header line first), without empty cells. """
+    for record in csv.DictReader(lines):
+        yield {key: value for key, value in record.items() if key and value not in (None, '')}
+
+
+class JtbdIntakeController(http.Controller):
+    _name = 'jtbd.intake.controller'
+
+    @route('/jtbd/intake/<string:kind>', type='http', auth='public', methods=['POST'], csrf=False)
+    def bulk_intake(self, kind, **kwargs):
+        """
+        Streaming bulk upload of intent signals (kind 'intent_signal') or data
+        provenance records (kind 'provenance') for existing leads.
+
+        Authenticated with the header ``Authorization: Bearer <token>`` where
+        the token is the 'jtbd_odoo_crm.intake_token' system parameter. The
+        body is newline-delimited JSON (default) or CSV with a header line
+        (``Content-Type: text/csv`` or ``?format=csv``), read line by line and
+        ingested by chunks (see jtbd.bulk.intake); each row targets a lead by
+        ``lead_id``, ``external_key`` or ``email``. The response streams one
+        JSON progress line per committed chunk, then a summary line with
+        ``status: "done"``.
+        """
+        token = request.env['ir.config_parameter'].sudo().get_param('jtbd_odoo_crm.intake_token')
+        if not token:
+            _logger.warning("JTBD Bulk Intake: Rejected call, no intake token configured.")
+            return self._json_response({'status': 'error', 'message': 'Intake token not configured'}, 401)
+        received = request.httprequest.headers.get('Authorization', '')
+        if not hmac.compare_digest(f'Bearer {token}', received):
+            _logger.warning("JTBD Bulk Intake: Unauthorized access attempt (bad token).")
+            return self._json_response({'status': 'error', 'message': 'Invalid token'}, 401)
+        if kind not in request.env['jtbd.bulk.intake'].sudo()._get_intake_handlers():
+            return self._json_response({'status': 'error', 'message': f'Unknown intake kind: {kind}'}, 404)
+
+        is_csv = kwargs.get('format') == 'csv' or request.httprequest.mimetype in CSV_CONTENT_TYPES
+        lines = codecs.iterdecode(request.httprequest.stream, 'utf-8-sig')
+        rows = iter_csv_rows(lines) if is_csv else iter_ndjson_rows(lines)
+        registry = request.env.registry
+
+        def stream_progress():
+            # The request cursor is closed once the response starts streaming: use a dedicated one
+            with registry.cursor() as cr:
+                intake = api.Environment(cr, SUPERUSER_ID, {})['jtbd.bulk.intake']
+                for progress in intake._intake_rows(kind, rows):
+                    yield json.dumps(progress) + '\n'
+
+        return Response(stream_progress(), status=200, content_type='application/x-ndjson', direct_passthrough=True)
+
+    def _json_response(self, data, status):
+        return Response(json.dumps(data), status=status, content_type='application/json')
@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 
+# Shared Mixins (load before the models inheriting them)
+from . import jtbd_related_count_mixin
+from . import jtbd_retention_mixin
+from . import jtbd_trace_link_mixin
+
 # JTBD Specific Models
 from . import jtbd_job_category
 from . import jtbd_agency_type
@@ -28,6 +33,8 @@ from . import jtbd_data_provenance           # Added in V4 Align
 from . import jtbd_outbound_sequence         # Added in V4 Align
 from . import jtbd_outbound_engagement       # Added in V4 Align
 from . import jtbd_unified_journey_event     # Added in V4 Align
+from . import jtbd_feedback_signal
+from . import jtbd_bulk_intake
 
 # Inherited Models
 from . import crm_lead
@@ -35,4 +42,5 @@ from . import product_template
 from . import sale_order
 from . import project_project
 from . import project_task
-from . import res_partner
\ No newline at end of file
+from . import res_partner
+from . import ir_model
\ No newline at end of file
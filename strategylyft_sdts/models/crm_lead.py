@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 
-import re
-from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL, sql
+from odoo.addons.jtbd_odoo_crm.models.jtbd_analytics_report import PIPELINE_LEAD_FIELDS
+from odoo.addons.jtbd_odoo_crm.models.jtbd_statement_parser import is_valid_job_statement, score_job_statements
+from odoo.addons.jtbd_odoo_crm.models.jtbd_pattern_matcher import tokenize
+from odoo.addons.jtbd_odoo_crm.models.jtbd_intent_signal import INTENT_HALF_LIFE_DAYS, intent_decay_factor
 import logging # Import logging
+import threading
+from datetime import datetime
 
 _logger = logging.getLogger(__name__) # Initialize logger
 
@@ -15,12 +21,23 @@ JOB_QUADRANTS = [
     ('strategic', 'Strategic Job'),
     ('other', 'Other'),
 ]
-
-# Define minimum length for validation in score calculation
-MIN_TEXT_LENGTH_SCORE = 10
+# Leads re-matched (and committed) per chunk by _jtbd_rematch_job_patterns
+PATTERN_REMATCH_BATCH_SIZE = 5000
+# Journey timeline (see get_jtbd_journey_timeline): sources merged with UNION ALL, and their rank
+# in the (datetime, rank, id) keyset order. Journey events mirroring a signal/engagement are skipped.
+JOURNEY_TIMELINE_SOURCES = {
+    'journey_event': (4, 'jtbd.unified.journey.event', 'event_datetime', 'event_type', 'description',
+                      "(related_record_ref IS NULL OR split_part(related_record_ref, ',', 1) NOT IN ('jtbd.intent.signal', 'jtbd.outbound.engagement'))"),
+    'intent_signal': (3, 'jtbd.intent.signal', 'timestamp', 'signal_type', 'activity', 'TRUE'),
+    'outbound_engagement': (2, 'jtbd.outbound.engagement', 'engagement_datetime', 'channel', 'summary', 'TRUE'),
+    'message': (1, 'mail.message', 'date', 'message_type', "coalesce(subject, left(body::text, 500))",
+                "model = 'crm.lead' AND message_type IN ('email', 'comment', 'notification')"),
+}
+JOURNEY_TIMELINE_MAX_LIMIT = 500
+JOURNEY_TIMELINE_BUCKETS = ('day', 'week', 'month')
 
 class CrmLead(models.Model):
-    _inherit = 'crm.lead'
+    _inherit = ['crm.lead', 'jtbd.related.count.mixin']
 
     # --- Core JTBD Framework Fields (Phase 1) ---
     jtbd_job_category_id = fields.Many2one( # Renamed and changed type
@@ -103,6 +120,13 @@ class CrmLead(models.Model):
         readonly=True,
         help="Outcome Maps associated with this opportunity."
     )
+    # Stored pointer to the newest Outcome Map (create_date desc, id desc), kept up to date by
+    # jtbd.outcome.mapping create/write/unlink so readers never have to sort the maps per lead.
+    jtbd_latest_outcome_mapping_id = fields.Many2one(
+        'jtbd.outcome.mapping', string='Latest Outcome Map',
+        readonly=True, copy=False, index='btree_not_null', ondelete='set null',
+        help="Most recently created Outcome Map linked to this opportunity."
+    )
     # --- End Inverse Relations ---    
 
     # --- Foundational Profile/Tech/Source Fields (Aligned with PRD3 Phase 1 Req.) ---
@@ -358,6 +382,17 @@ class CrmLead(models.Model):
         string="Intent Signals",
         help="Collected intent signals related to this lead/opportunity."
     )
+    # Maintained in SQL by jtbd.intent.signal (see _update_intent_rollup), never computed per lead
+    jtbd_intent_anchored_score = fields.Float(
+        string="Intent Heat (Anchored)", readonly=True, copy=False,
+        help="Time-decayed intent score anchored at a fixed epoch: orders leads by current intent. Use 'Intent Score' for the actual value."
+    )
+    jtbd_intent_signal_count = fields.Integer(string="Intent Signal Count", readonly=True, copy=False)
+    jtbd_intent_last_signal_date = fields.Datetime(string="Last Intent Signal", readonly=True, copy=False)
+    jtbd_intent_score = fields.Float(
+        string="Intent Score", compute='_compute_jtbd_intent_score', search='_search_jtbd_intent_score', digits=(16, 2),
+        help="Sum of the intent signal scores, each halved every %s days since it occurred." % INTENT_HALF_LIFE_DAYS
+    )
     # --- End Market Intelligence Field ---
     
     # --- Job Evolution Relation (PRD3 Phase 3) ---
@@ -407,9 +442,9 @@ class CrmLead(models.Model):
         'jtbd_crm_lead_job_pattern_rel', # Relation table name
         'lead_id', 'pattern_id', # Column names
         string="Matched Job Patterns (AI)",
-        compute='_compute_ai_predictions', # Trigger computation
+        compute='_compute_job_pattern_matches',
         store=True, # Store the result
-        readonly=True, # Result comes from AI
+        readonly=True, # Result comes from the pattern matcher
         copy=False,
         help="Job Patterns automatically suggested by AI based on lead data (Future P4+)."
     )
@@ -418,7 +453,7 @@ class CrmLead(models.Model):
     # --- Expansion / Risk Fields (PRD3 Phase 3/4) ---
     jtbd_renewal_risk = fields.Integer(
         string="Renewal Risk Score",
-        compute='_compute_ai_predictions', # Trigger computation
+        compute='_compute_renewal_risk',
         store=True, # Store the result
         readonly=True, # Result comes from AI
         tracking=True,
@@ -496,6 +531,10 @@ class CrmLead(models.Model):
         string='Source Confidence Score', digits=(3, 2), tracking=True, aggregator='avg',
         help="Confidence score (0.0 to 1.0) reflecting the reliability of the primary data source."
     )
+    jtbd_external_key = fields.Char(
+        string='External Key', index=True, copy=False,
+        help="Identifier of this lead in external systems (scrapers, funnels), used to target it in bulk intake uploads."
+    )
     # Maybe add a link to the specific provenance record? Optional for now.
     # jtbd_data_provenance_id = fields.Many2one('jtbd.data.provenance', ...)
 
@@ -551,26 +590,11 @@ class CrmLead(models.Model):
     # --- Validation Constraints (PRD3 4.4.3) ---
     @api.constrains('jtbd_job_statement')
     def _check_job_statement_structure(self):
-        pattern = re.compile(r"^\s*when\s+.*?\s+i want\s+.*?\s+so i can\s+.*$", re.IGNORECASE | re.DOTALL)
-        # Explanation:
-        # ^\s*when\s+ : Starts with optional space, then 'when', then one or more spaces
-        # .*? : Matches any characters non-greedily (the situation)
-        # \s+i want\s+ : Matches ' i want ' surrounded by one or more spaces <--- CHANGE HERE
-        # .*? : Matches any characters non-greedily (the motivation)
-        # \s+so i can\s+ : Matches ' so i can ' surrounded by one or more spaces
-        # .*$ : Matches any remaining characters until the end of the string
-
-        _logger.info("JTBD Check: Running _check_job_statement_structure constraint...")
-
+        """ Statements must follow 'When ..., I want ..., so I can ...' (grammar in jtbd_statement_parser). """
         for lead in self.filtered('jtbd_job_statement'):
-            statement_to_check = lead.jtbd_job_statement.strip()
-            _logger.info(f"JTBD Check: Validating Lead ID {lead.id or 'New'}, Statement: >>>{statement_to_check}<<<")
-
-            if not pattern.match(statement_to_check):
-                _logger.warning(f"JTBD Check FAILED for Lead ID {lead.id or 'New'}, Statement: >>>{statement_to_check}<<<")
+            if not is_valid_job_statement(lead.jtbd_job_statement):
+                _logger.warning(f"JTBD Check FAILED for Lead ID {lead.id or 'New'}, Statement: >>>{lead.jtbd_job_statement.strip()[:200]}<<<")
                 raise ValidationError(_("Job Statement must follow the 'When..., I want [Motivation]..., so I can...' structure."))
-            else:
-                 _logger.info(f"JTBD Check PASSED for Lead ID {lead.id or 'New'}.")
 
     @api.constrains('jtbd_job_clarity_score', 'jtbd_job_category_id', 'jtbd_job_statement', 'jtbd_job_quadrant')
     def _check_required_fields_on_clarity(self):
@@ -622,43 +646,11 @@ class CrmLead(models.Model):
     # --- Compute Methods ---
     @api.depends('jtbd_job_statement', 'jtbd_job_category_id', 'jtbd_job_quadrant')
     def _compute_job_clarity_score(self):
-        """ Compute the job clarity score based on statement structure and completeness. """
-        # UPDATED Regex: Looks for "i want " to separate motivation
-        pattern = re.compile(r"when\s+(.*?)(?:,|\s?)\s*i want\s+(.*?)(?:,|\s?)\s*so i can\s+(.*?)(?:\.?\s*$)", re.IGNORECASE | re.DOTALL)
-        # Explanation: Use \s+ around 'i want' and 'so i can' to handle spacing.
-        # Use (?:,|\s?)\s* as a flexible separator (optional comma, optional space, then spaces)
-
+        """ Compute the job clarity score based on statement structure and completeness (shared parser). """
+        scores = score_job_statements(self, 'jtbd_job_statement', 'jtbd_job_category_id', 'jtbd_job_quadrant')
         for lead in self:
-            score = 0
-            max_score = 100
-            component_weight = 25
-            selection_weight = 12.5
-            situation, motivation, outcome = '', '', ''
-
-            if lead.jtbd_job_statement:
-                # Apply strip() before matching
-                match = pattern.match(lead.jtbd_job_statement.strip())
-                if match:
-                    # Extract captured groups
-                    situation = match.group(1).strip() if match.group(1) else ''
-                    motivation = match.group(2).strip() if match.group(2) else ''
-                    outcome = match.group(3).strip() if match.group(3) else ''
-                    _logger.debug(f"Clarity Score Parts - Lead {lead.id}: S='{situation}', M='{motivation}', O='{outcome}'")
-                else:
-                     _logger.warning(f"Clarity Score: Regex did not match for Lead {lead.id}. Statement: {lead.jtbd_job_statement}")
-
-
-            # Score text components based on minimum length
-            if situation and len(situation) >= MIN_TEXT_LENGTH_SCORE: score += component_weight
-            if motivation and len(motivation) >= MIN_TEXT_LENGTH_SCORE: score += component_weight # Should now correctly score motivation
-            if outcome and len(outcome) >= MIN_TEXT_LENGTH_SCORE: score += component_weight
-
-            # Score selections
-            if lead.jtbd_job_category_id: score += selection_weight
-            if lead.jtbd_job_quadrant: score += selection_weight
-            lead.jtbd_job_clarity_score = min(max_score, int(round(score)))
-            _logger.debug(f"Clarity Score - Lead {lead.id}: Final Score = {lead.jtbd_job_clarity_score}")
-            
+            lead.jtbd_job_clarity_score = scores[lead.id]
+
     @api.depends('expected_revenue', 'jtbd_cac') # Depends on standard expected_revenue and our new CAC field
     def _compute_ltv_cac_ratio(self):
         for lead in self:
@@ -676,101 +668,296 @@ class CrmLead(models.Model):
                 lead.jtbd_ltv_cac_ratio = 0.0 # Default to 0 if CAC is zero/missing or LTV is missing
 
     # --- NEW Compute method for latest impact ---
-    @api.depends('jtbd_outcome_mapping_ids.jtbd_economic_impact_value', 'jtbd_outcome_mapping_ids.create_date')
+    @api.depends('jtbd_latest_outcome_mapping_id.jtbd_economic_impact_value')
     def _compute_latest_economic_impact(self):
+        # Read through the stored pointer instead of searching the maps of each lead
         for lead in self:
-            # Find the latest outcome map with a value set
-            latest_map = self.env['jtbd.outcome.mapping'].search(
-                [('lead_id', '=', lead.id), ('jtbd_economic_impact_value', '!=', False)],
-                order='create_date desc, id desc', limit=1
-            )
-            lead.jtbd_latest_economic_impact = latest_map.jtbd_economic_impact_value if latest_map else 0.0
+            lead.jtbd_latest_economic_impact = lead.jtbd_latest_outcome_mapping_id.jtbd_economic_impact_value or 0.0
+
+    def _jtbd_refresh_latest_outcome_mapping(self):
+        """ Recompute the stored latest Outcome Map pointer of ``self`` with one UPDATE. """
+        lead_ids = tuple(self.ids)
+        if not lead_ids:
+            return
+        self.env['jtbd.outcome.mapping'].flush_model(['lead_id'])
+        self.flush_recordset(['jtbd_latest_outcome_mapping_id'])
+        self.env.cr.execute("""
+            UPDATE crm_lead l
+               SET jtbd_latest_outcome_mapping_id = latest.mapping_id
+              FROM (
+                    SELECT lead.id AS lead_id,
+                           (SELECT om.id FROM jtbd_outcome_mapping om
+                             WHERE om.lead_id = lead.id
+                             ORDER BY om.create_date DESC, om.id DESC LIMIT 1) AS mapping_id
+                      FROM crm_lead lead
+                     WHERE lead.id IN %s
+                   ) latest
+             WHERE l.id = latest.lead_id
+               AND l.jtbd_latest_outcome_mapping_id IS DISTINCT FROM latest.mapping_id
+        """, (lead_ids,))
+        if self.env.cr.rowcount:
+            self.invalidate_recordset(['jtbd_latest_outcome_mapping_id'])
+            self.modified(['jtbd_latest_outcome_mapping_id'])
+
+    def init(self):
+        """ Create the JTBD indexes and backfill the latest Outcome Map pointer of existing leads. """
+        super().init()
+        # Keyset pagination of the outbound integration sync (ORDER BY write_date, id)
+        tools.create_index(self.env.cr, 'crm_lead_jtbd_write_date_id_idx', self._table, ['write_date', 'id'])
+        # Hottest leads first (see _jtbd_get_hottest_leads)
+        tools.create_index(self.env.cr, 'crm_lead_jtbd_intent_anchored_score_idx', self._table,
+                           ['jtbd_intent_anchored_score DESC NULLS LAST'])
+        if not sql.table_exists(self.env.cr, 'jtbd_outcome_mapping'):
+            return # Fresh install: no Outcome Maps to point at yet
+        self.env.cr.execute("""
+            UPDATE crm_lead l
+               SET jtbd_latest_outcome_mapping_id = latest.mapping_id
+              FROM (
+                    SELECT DISTINCT ON (om.lead_id) om.lead_id, om.id AS mapping_id
+                      FROM jtbd_outcome_mapping om
+                     ORDER BY om.lead_id, om.create_date DESC, om.id DESC
+                   ) latest
+             WHERE l.id = latest.lead_id
+               AND l.jtbd_latest_outcome_mapping_id IS NULL
+        """)
 
     # Implement count calculation
     def _compute_jtbd_analysis_counts(self):
-        """ Compute the number of related Force Analyses and Outcome Maps using search_count. """
-        # Uses search_count for simplicity and robustness in this version.
-        # Consider optimizing with read_group if performance becomes an issue with many related records.
-        force_model = self.env['jtbd.force.analysis']
-        outcome_model = self.env['jtbd.outcome.mapping']
-        portfolio_model = self.env['jtbd.job.portfolio']
+        """ Compute the number of related Force Analyses, Outcome Maps and Job Portfolios.
+        One grouped query per related model for the whole recordset (see jtbd.related.count.mixin). """
+        self._jtbd_assign_counts('jtbd_force_analysis_count', 'jtbd.force.analysis', 'lead_id')
+        self._jtbd_assign_counts('jtbd_outcome_mapping_count', 'jtbd.outcome.mapping', 'lead_id')
+        self._jtbd_assign_counts('jtbd_portfolio_count', 'jtbd.job.portfolio', 'lead_id')
 
-        for lead in self:
-            try:
-                lead.jtbd_force_analysis_count = force_model.search_count(
-                    [('lead_id', '=', lead.id)]
-                )
-                lead.jtbd_outcome_mapping_count = outcome_model.search_count(
-                    [('lead_id', '=', lead.id)]
-                )
-                lead.jtbd_portfolio_count = portfolio_model.search_count(
-                    [('lead_id', '=', lead.id)]
-                )
-                
-            except Exception as e:
-                # Log error but prevent compute method from failing entirely
-#                _logger.error(f"Error counting related records for lead {lead.id}: {e}", exc_info=True)
-                _logger.error(f"Error counting job portfolios for lead {lead.id}: {e}", exc_info=True)
-                lead.jtbd_force_analysis_count = 0
-                lead.jtbd_outcome_mapping_count = 0
-                lead.jtbd_portfolio_count = 0
-            
     @api.depends(
         'description', 'name', # General text fields
-        'jtbd_job_category_id',
         'jtbd_job_statement', 'jtbd_job_category_id', # Core JTBD fields
-        'jtbd_agency_size', 'jtbd_revenue_range', 'jtbd_current_tools', # Profile fields
-        'jtbd_outcome_mapping_ids', 'jtbd_force_analysis_ids' # Related analysis
-        # Add more dependencies as needed (e.g., industry, linked activities)
+        'jtbd_current_tools', # Matched against the patterns' tech stacks
     )
-    def _compute_ai_predictions(self):
-        _logger.info(f"Attempting to compute AI predictions for Leads: {self.ids}")
-        # In a real scenario, batch API calls for efficiency
+    def _compute_job_pattern_matches(self):
+        """ Match leads against the cached job pattern index (see jtbd_pattern_matcher).
+        The index is built once per pattern change; each lead only costs a lookup of
+        its own terms, and the many2many values of the whole batch are flushed together. """
+        index = self.env['jtbd.job.pattern']._get_match_index()
+        for lead in self:
+            terms = tokenize(lead.name, lead.description, lead.jtbd_job_statement, lead.jtbd_current_tools)
+            lead.jtbd_job_pattern_match_ids = [(6, 0, index.match(terms, lead.jtbd_job_category_id.id))]
+
+    @api.depends('jtbd_job_clarity_score')
+    def _compute_renewal_risk(self):
+        # Placeholder until an external predictor exists: inverse of the clarity score
         for lead in self:
-            _logger.debug(f"Computing AI predictions for Lead ID: {lead.id}")
-            # --- Placeholder Logic ---
-            # 1. Prepare context data (similar to previous AI steps)
-            context_data = {
-                'lead_id': lead.id,
-                'description': lead.description or '',
-                'job_statement': lead.jtbd_job_statement or '',
-                'job_category': lead.jtbd_job_category_id.name if lead.jtbd_job_category_id else '',
-                'agency_size': lead.jtbd_agency_size or '',
-                # ... add more fields ...
-            }
-
-            # 2. Call external AI/n8n for Pattern Matching (Placeholder)
+            lead.jtbd_renewal_risk = max(0, min(100, 100 - lead.jtbd_job_clarity_score))
+
+    def _compute_jtbd_intent_score(self):
+        factor = intent_decay_factor()
+        for lead in self:
+            lead.jtbd_intent_score = (lead.jtbd_intent_anchored_score or 0.0) * factor
+
+    def _search_jtbd_intent_score(self, operator, value):
+        # The decay factor is common to all leads: compare the anchored (indexed) score instead
+        if operator in ('=', '!=') and value is False:
+            value = 0.0
+        if operator not in ('=', '!=', '>', '>=', '<', '<=') or isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise UserError(_('Operation not supported'))
+        if operator in ('=', '!='):
+            domain = [('jtbd_intent_anchored_score', '=', value / intent_decay_factor())]
+            if not value:
+                domain = ['|', ('jtbd_intent_anchored_score', '=', False)] + domain # No signal = score 0
+            return domain if operator == '=' else ['!'] + domain
+        domain = [('jtbd_intent_anchored_score', operator, value / intent_decay_factor())]
+        if operator in ('<', '<=') and value > 0:
+            domain = ['|', ('jtbd_intent_anchored_score', '=', False)] + domain # No signal = score 0
+        return domain
+
+    @api.model
+    def _jtbd_get_hottest_leads(self, limit=1000, domain=None):
+        """ Leads with the highest current intent score (index scan on the anchored score). """
+        return self.search(
+            [('jtbd_intent_anchored_score', '!=', False)] + list(domain or []),
+            order='jtbd_intent_anchored_score desc nulls last, id', limit=limit,
+        )
+
+    def _jtbd_rematch_job_patterns(self, batch_size=PATTERN_REMATCH_BATCH_SIZE):
+        """ Recompute the pattern matches of every lead, chunk by chunk (e.g. after
+        patterns changed). Each chunk is committed outside tests. """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        field = self._fields['jtbd_job_pattern_match_ids']
+        self.env.cr.execute(f"SELECT id FROM {self._table} ORDER BY id")
+        lead_ids = [row[0] for row in self.env.cr.fetchall()]
+        for chunk_ids in tools.split_every(batch_size, lead_ids):
+            leads = self.with_context(tracking_disable=True).browse(chunk_ids)
+            self.env.add_to_compute(field, leads)
+            leads.flush_recordset([field.name])
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info(f"JTBD Pattern Matcher: re-matched {len(lead_ids)} leads.")
+        return len(lead_ids)
+
+    @api.model
+    def _jtbd_resolve_intake_leads(self, rows):
+        """ Leads targeted by bulk intake rows, through ``lead_id``, else ``external_key``,
+        else ``email`` (most recent active lead), resolved with ONE query for all rows.
+
+        :return: list of lead ids (False when unresolved), aligned with ``rows``
+        """
+        row_keys = []
+        for row in rows:
             try:
-                # response_patterns = call_external_pattern_matcher(context_data)
-                # matched_pattern_ids = process_pattern_response(response_patterns)
-                # Simulate finding one or two patterns based on category for now
-                matched_pattern_ids = []
-                if lead.jtbd_job_category_id:
-                    patterns = self.env['jtbd.job.pattern'].search(
-                        [('job_category_id', '=', lead.jtbd_job_category_id.id)], limit=2 # Use ID for search
-                    )
-                    matched_pattern_ids = patterns.ids
-                _logger.debug(f"Lead {lead.id}: Simulated matched pattern IDs: {matched_pattern_ids}")
-                # Use write command for Many2many relationship (6, 0, ...)
-                lead.jtbd_job_pattern_match_ids = [(6, 0, matched_pattern_ids)]
-            except Exception as e:
-                _logger.error(f"Error during AI pattern matching simulation for lead {lead.id}: {e}")
-                lead.jtbd_job_pattern_match_ids = [(5, 0, 0)] # Clear on error
+                lead_id = int(row.get('lead_id') or 0)
+            except (TypeError, ValueError):
+                lead_id = 0
+            row_keys.append((lead_id, str(row.get('external_key') or '').strip(), tools.email_normalize(row.get('email') or '')))
+        if not row_keys:
+            return []
+        self.flush_model(['active', 'email_normalized', 'jtbd_external_key'])
+        self.env.cr.execute(f"""
+            SELECT id, active, email_normalized, jtbd_external_key FROM {self._table}
+             WHERE id = ANY(%(ids)s)
+                OR (active AND (jtbd_external_key = ANY(%(keys)s) OR email_normalized = ANY(%(emails)s)))
+          ORDER BY id
+        """, {
+            'ids': list({key[0] for key in row_keys if key[0]}),
+            'keys': list({key[1] for key in row_keys if key[1]}),
+            'emails': list({key[2] for key in row_keys if key[2]}),
+        })
+        existing_ids, id_by_key, id_by_email = set(), {}, {}
+        for lead_id, active, email, external_key in self.env.cr.fetchall():
+            existing_ids.add(lead_id)
+            if active: # Ordered by id: the most recent lead wins
+                if external_key:
+                    id_by_key[external_key] = lead_id
+                if email:
+                    id_by_email[email] = lead_id
+        return [
+            (lead_id if lead_id in existing_ids else False) or id_by_key.get(external_key) or id_by_email.get(email) or False
+            for lead_id, external_key, email in row_keys
+        ]
 
+    # --- Journey Timeline API ---
+    def get_jtbd_journey_timeline(self, cursor=None, limit=50, bucket=None):
+        """ One page of the lead journey: journey events, intent signals, outbound
+        engagements and chatter messages merged newest first.
 
-            # 3. Call external AI/n8n for Renewal Risk (Placeholder)
+        Each source is read through its (lead, datetime) index with the keyset
+        condition and LIMIT pushed down, then merged by a UNION ALL: the cost of a
+        page depends on ``limit``, not on the position in the timeline.
+
+        :param str cursor: ``next_cursor`` of the previous page (None for the first page)
+        :param int limit: page size (at most JOURNEY_TIMELINE_MAX_LIMIT)
+        :param str bucket: 'day', 'week' or 'month' to also return the number of
+            items per period of the whole timeline (e.g. for a sparkline)
+        :return: dict {'items': [...], 'next_cursor': str or False, 'buckets': [[period, count], ...]}
+        """
+        self.ensure_one()
+        self.check_access('read')
+        if bucket and bucket not in JOURNEY_TIMELINE_BUCKETS:
+            raise UserError(_("Unsupported timeline bucket: %s", bucket))
+        limit = max(1, min(int(limit or 50), JOURNEY_TIMELINE_MAX_LIMIT))
+        self.env['jtbd.unified.journey.event']._flush_event_buffer()
+        self.env.flush_all()
+
+        cursor_key = None
+        if cursor:
             try:
-                # response_risk = call_external_risk_predictor(context_data)
-                # risk_score = process_risk_response(response_risk)
-                # Simulate risk based on clarity score for now
-                risk_score = 100 - lead.jtbd_job_clarity_score # Inverse relationship example
-                _logger.debug(f"Lead {lead.id}: Simulated renewal risk score: {risk_score}")
-                lead.jtbd_renewal_risk = max(0, min(100, risk_score))
-            except Exception as e:
-                _logger.error(f"Error during AI renewal risk simulation for lead {lead.id}: {e}")
-                lead.jtbd_renewal_risk = 0 # Default to 0 on error
-            # --- End Placeholder Logic ---
+                cursor_date, cursor_rank, cursor_id = cursor.rsplit('|', 2)
+                cursor_key = (datetime.fromisoformat(cursor_date), int(cursor_rank), int(cursor_id))
+            except (ValueError, TypeError):
+                raise UserError(_("Invalid timeline cursor."))
+        branches = []
+        for source, rank, table, date, type_column, label, condition in self._jtbd_get_journey_sources():
+            if cursor_key:
+                condition = SQL(
+                    "%s AND %s <= %s AND (%s, %s, id) < (%s, %s, %s)",
+                    condition, SQL(date), cursor_key[0], SQL(date), rank, *cursor_key,
+                )
+            branches.append(SQL(
+                """
+            (SELECT %(date)s AS item_date, %(rank)s AS rank, id, %(source)s AS source, %(type_column)s::varchar AS item_type, %(label)s AS label
+               FROM %(table)s
+              WHERE %(date)s IS NOT NULL AND %(condition)s
+           ORDER BY %(date)s DESC, id DESC
+              LIMIT %(limit)s)""",
+                date=SQL(date), rank=rank, source=source, type_column=SQL(type_column), label=SQL(label),
+                table=SQL.identifier(table), condition=condition, limit=limit + 1,
+            ))
+        rows = []
+        if branches:
+            self.env.cr.execute(SQL(
+                """
+                SELECT item_date, rank, id, source, item_type, label
+                  FROM (%s) items
+              ORDER BY item_date DESC, rank DESC, id DESC
+                 LIMIT %s
+                """,
+                SQL(" UNION ALL ").join(branches), limit + 1,
+            ))
+            rows = self.env.cr.fetchall()
+        next_cursor = False
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_date, last_rank, last_id = rows[-1][:3]
+            # Raw isoformat: keeps any sub-second part, so the keyset never skips rows of the same second
+            next_cursor = f"{last_date.isoformat()}|{last_rank}|{last_id}"
+        result = {
+            'items': [{
+                'source': source, 'id': record_id, 'date': fields.Datetime.to_string(item_date), 'type': item_type,
+                'label': tools.html2plaintext(label or '') if source == 'message' else (label or ''),
+            } for item_date, _rank, record_id, source, item_type, label in rows],
+            'next_cursor': next_cursor,
+        }
+        if bucket:
+            result['buckets'] = self._jtbd_get_journey_buckets(bucket)
+        return result
 
+    def _jtbd_get_journey_sources(self):
+        """ Timeline sources the current user may read, as tuples
+        (source, rank, table, date, type column, label, condition) where the
+        condition restricts the source to this lead and to the readable rows:
+        record rules of the source model, and no internal message for non-employees
+        (messages of a readable lead are readable otherwise). """
+        self.ensure_one()
+        sources = []
+        for source, (rank, model_name, date, type_column, label, where) in JOURNEY_TIMELINE_SOURCES.items():
+            model = self.env[model_name]
+            if not model.has_access('read'):
+                continue
+            if model_name == 'mail.message':
+                condition = SQL("res_id = %s AND %s", self.id, SQL(where))
+                if not self.env.su and not self.env.user._is_internal():
+                    condition = SQL(
+                        "%s AND NOT is_internal AND (subtype_id IS NULL OR subtype_id NOT IN (SELECT id FROM mail_message_subtype WHERE internal))",
+                        condition,
+                    )
+            else:
+                condition = SQL("lead_id = %s AND %s", self.id, SQL(where))
+                rule_domain = self.env['ir.rule']._compute_domain(model_name, 'read') if not self.env.su else []
+                if rule_domain:
+                    condition = SQL("%s AND id IN %s", condition, model.sudo()._search(rule_domain, active_test=False).subselect())
+            sources.append((source, rank, model._table, date, type_column, label, condition))
+        return sources
+
+    def _jtbd_get_journey_buckets(self, bucket):
+        """ Number of timeline items per ``bucket`` period, aggregated in SQL. """
+        self.ensure_one()
+        branches = [
+            SQL("SELECT %s AS item_date FROM %s WHERE %s", SQL(date), SQL.identifier(table), condition)
+            for _source, _rank, table, date, _type, _label, condition in self._jtbd_get_journey_sources()
+        ]
+        if not branches:
+            return []
+        self.env.cr.execute(SQL(
+            """
+            SELECT date_trunc(%s, item_date) AS period, count(*)
+              FROM (%s) items
+             WHERE item_date IS NOT NULL
+          GROUP BY period
+          ORDER BY period
+            """,
+            bucket, SQL(" UNION ALL ").join(branches),
+        ))
+        return [[fields.Datetime.to_string(period), count] for period, count in self.env.cr.fetchall()]
 
     # --- Action Methods (Currently not called by standard buttons) ---
     # These methods provide programmatic access to open related records.
@@ -806,56 +993,58 @@ class CrmLead(models.Model):
         return action    
     
     def write(self, vals):
-        # Track stage changes BEFORE writing
-        stage_change_events = []
+        # Track stage / progression status changes BEFORE writing
+        journey_events = []
+        now = fields.Datetime.now()
         if 'stage_id' in vals:
             new_stage_id = vals['stage_id']
-            stage_model = self.env['crm.stage']
+            new_stage_name = self.env['crm.stage'].browse(new_stage_id).name or 'N/A'
             for lead in self.filtered(lambda l: l.stage_id.id != new_stage_id): # Only log if stage actually changes
-                try:
-                    old_stage_name = lead.stage_id.name or 'N/A'
-                    new_stage_name = stage_model.browse(new_stage_id).name or 'N/A'
-                    stage_change_events.append({
-                        'lead_id': lead.id,
-                        'event_datetime': fields.Datetime.now(),
-                        'event_type': 'stage_change',
-                        'source_system': 'odoo_crm',
-                        'channel': 'CRM UI/Automation',
-                        'description': f"Stage changed from '{old_stage_name}' to '{new_stage_name}'",
-                        'related_record_ref': f'{lead._name},{lead.id}',
-                    })
-                except Exception as e:
-                     _logger.warning(f"Failed to prepare stage change event for lead {lead.id}: {e}")
-
-        # Also track progression status changes
+                journey_events.append({
+                    'lead_id': lead.id,
+                    'event_datetime': now,
+                    'event_type': 'stage_change',
+                    'source_system': 'odoo_crm',
+                    'channel': 'CRM UI/Automation',
+                    'description': f"Stage changed from '{lead.stage_id.name or 'N/A'}' to '{new_stage_name}'",
+                    'related_record_ref': f'{lead._name},{lead.id}',
+                })
+
         if 'jtbd_contact_progression_status' in vals:
             new_status = vals['jtbd_contact_progression_status']
             status_dict = dict(self._fields['jtbd_contact_progression_status'].selection)
+            new_status_name = status_dict.get(new_status, 'N/A')
             for lead in self.filtered(lambda l: l.jtbd_contact_progression_status != new_status):
-                 try:
-                     old_status_name = status_dict.get(lead.jtbd_contact_progression_status, 'N/A')
-                     new_status_name = status_dict.get(new_status, 'N/A')
-                     stage_change_events.append({ # Reuse the list for efficiency
-                         'lead_id': lead.id,
-                         'event_datetime': fields.Datetime.now(),
-                         'event_type': 'status_change',
-                         'source_system': 'odoo_jtbd', # Likely changed by our module/automation
-                         'channel': 'CRM UI/Automation',
-                         'description': f"Progression Status changed from '{old_status_name}' to '{new_status_name}'",
-                         'related_record_ref': f'{lead._name},{lead.id}',
-                     })
-                 except Exception as e:
-                      _logger.warning(f"Failed to prepare status change event for lead {lead.id}: {e}")
-
+                journey_events.append({
+                    'lead_id': lead.id,
+                    'event_datetime': now,
+                    'event_type': 'status_change',
+                    'source_system': 'odoo_jtbd', # Likely changed by our module/automation
+                    'channel': 'CRM UI/Automation',
+                    'description': f"Progression Status changed from '{status_dict.get(lead.jtbd_contact_progression_status, 'N/A')}' to '{new_status_name}'",
+                    'related_record_ref': f'{lead._name},{lead.id}',
+                })
 
         # Call original write method
         result = super(CrmLead, self).write(vals)
 
-        # Create journey events AFTER successful write
-        if stage_change_events:
-            try:
-                self.env['jtbd.unified.journey.event'].create(stage_change_events)
-            except Exception as e:
-                 _logger.error(f"Failed to create journey event(s) after crm.lead write: {e}", exc_info=True)
+        # Queue the journey events (inserted in bulk before commit, dropped if the write rolls back)
+        self.env['jtbd.unified.journey.event']._log_events(journey_events)
+
+        # Keep the materialized Pipeline Analysis rows in sync (no-op in live view mode)
+        if PIPELINE_LEAD_FIELDS.intersection(vals):
+            self.env['jtbd.pipeline.analysis']._refresh_leads(self.ids)
+
+        return result
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leads = super().create(vals_list)
+        self.env['jtbd.pipeline.analysis']._refresh_leads(leads.ids)
+        return leads
 
-        return result
\ No newline at end of file
+    def unlink(self):
+        lead_ids = self.ids
+        res = super().unlink()
+        self.env['jtbd.pipeline.analysis']._refresh_leads(lead_ids)
+        return res
\ No newline at end of file
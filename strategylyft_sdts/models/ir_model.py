@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, tools
+
+
+class IrModel(models.Model):
+    _inherit = 'ir.model'
+
+    # --- Shared selection for the JTBD Reference fields ---
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _jtbd_get_reference_selection(self):
+        """ (model, name) pairs of all installed models, cached per language.
+
+        Reference fields call their selection on every fields_get, import and
+        view load; searching ir.model each time reads ~1000 records. The cache
+        lives in the registry, so it is rebuilt after module install/uninstall
+        and cleared below whenever ir.model rows change through the ORM.
+        """
+        models_data = self.sudo().search_fetch([], ['model', 'name'], order='model')
+        return tuple((model.model, model.name) for model in models_data)
+
+    @api.model
+    def _jtbd_reference_selection(self):
+        """ Selection callable to use on JTBD Reference fields. """
+        return list(self._jtbd_get_reference_selection())
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'model', 'name'}.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -10,4 +10,16 @@ class JtbdAgencyType(models.Model):
     description = fields.Text(string='Description', translate=True)
     active = fields.Boolean(default=True)
     # Add relation back to patterns if needed
-    # job_pattern_ids = fields.Many2many('jtbd.job.pattern', 'jtbd_job_pattern_agency_type_rel', 'agency_type_id', 'pattern_id', string='Applicable Job Patterns')
\ No newline at end of file
+    # job_pattern_ids = fields.Many2many('jtbd.job.pattern', 'jtbd_job_pattern_agency_type_rel', 'agency_type_id', 'pattern_id', string='Applicable Job Patterns')
+
+    # Names are part of the job pattern match index (jtbd.job.pattern._get_match_index)
+    def write(self, vals):
+        res = super().write(vals)
+        if {'name', 'active'}.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -2,11 +2,8 @@
 
 from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
+import hashlib
 import logging
-try:
-    import psycopg2 # Import for catching SQL errors
-except ImportError:
-    psycopg2 = None
 
 _logger = logging.getLogger(__name__)
 
@@ -21,6 +18,32 @@ OUTCOME_STATUS_SELECTION = [('no_data', 'No Data'), ('on_baseline', 'On Baseline
 ACCOUNT_TIER_SELECTION = [('strategic', 'Strategic'), ('target', 'Target'), ('watch', 'Watch'), ('other', 'Other')]
 # --- End Local Selection Definitions ---
 
+# --- Materialized Mode ---
+# 'view': plain SQL view (always current, rescans crm_lead on every read)
+# 'materialized': real table refreshed incrementally from the write paths + nightly cron
+PIPELINE_ANALYSIS_MODE_PARAM = 'jtbd_odoo_crm.pipeline_analysis_mode'
+PIPELINE_ANALYSIS_REFRESHED_PARAM = 'jtbd_odoo_crm.pipeline_analysis_refreshed_at'
+# crm.lead fields read by the report: writing any of them makes the lead's row stale
+PIPELINE_LEAD_FIELDS = {
+    'name', 'type', 'stage_id', 'team_id', 'user_id', 'company_id', 'partner_id', 'date_closed',
+    'active', 'probability', 'expected_revenue', 'jtbd_mrr', 'jtbd_job_category_id', 'jtbd_job_quadrant',
+    'jtbd_job_clarity_score', 'jtbd_momentum_score', 'jtbd_signal_strength', 'jtbd_risk_level',
+    'jtbd_trigger_window', 'jtbd_ltv_cac_ratio', 'jtbd_agency_size', 'jtbd_account_tier',
+    'jtbd_data_source_label', 'jtbd_source_confidence_score', 'jtbd_contact_progression_status',
+    'jtbd_automation_source', 'jtbd_latest_outcome_mapping_id',
+}
+# Indexed columns of the materialized table (the usual pivot/graph groupbys and filters)
+PIPELINE_ANALYSIS_INDEXED_COLUMNS = [
+    'lead_id', 'create_date', 'stage_id', 'team_id', 'user_id', 'company_id', 'job_category_id',
+]
+# JTBD columns of crm_lead the report SELECT depends on (the relation is created once they all exist)
+PIPELINE_REQUIRED_LEAD_COLUMNS = (
+    'jtbd_mrr', 'jtbd_job_category_id', 'jtbd_job_quadrant', 'jtbd_job_clarity_score', 'jtbd_momentum_score',
+    'jtbd_signal_strength', 'jtbd_risk_level', 'jtbd_trigger_window', 'jtbd_ltv_cac_ratio', 'jtbd_agency_size',
+    'jtbd_account_tier', 'jtbd_data_source_label', 'jtbd_source_confidence_score', 'jtbd_contact_progression_status',
+    'jtbd_automation_source', 'jtbd_latest_outcome_mapping_id',
+)
+
 
 class JtbdPipelineAnalysis(models.Model):
     _name = 'jtbd.pipeline.analysis'
@@ -61,83 +84,151 @@ class JtbdPipelineAnalysis(models.Model):
     source_confidence_score = fields.Float(string='Source Confidence', readonly=True, digits=(3, 2), aggregator='avg')
     contact_progression_status = fields.Selection(selection=PROGRESSION_STATUS_SELECTION, string='Progression Status', readonly=True)
     automation_source = fields.Selection(selection=AUTOMATION_SOURCE_SELECTION, string="Lead Source Type", readonly=True)
+    refresh_date = fields.Datetime(string="Data As Of", readonly=True,
+                                   help="When this row was last computed (always 'now' in view mode).")
+
+    # --- Relation Setup ---
+    def init(self):
+        """ Create the report relation once its crm.lead columns exist (on install/upgrade only,
+        never on a worker cold start), skipping it when the deployed definition is unchanged. """
+        super().init()
+        lead_columns = self._get_lead_column_types()
+        missing_cols = [col for col in PIPELINE_REQUIRED_LEAD_COLUMNS if col not in lead_columns]
+        if missing_cols:
+            _logger.warning(f"Deferring SQL view creation for {self._table}: Missing columns in crm_lead: {missing_cols}. View will be created on next update/restart.")
+            return
+        signature = self._get_relation_signature(lead_columns)
+        if self._get_deployed_signature() == signature:
+            _logger.debug(f"SQL relation {self._table} is up to date, not recreated.")
+            return
+        self._create_or_replace_view(signature=signature)
 
-    # --- _auto_init using direct SQL check ---
     @api.model
-    def _auto_init(self):
-        """ Override to defer view creation until dependent columns exist. """
-        res = super(JtbdPipelineAnalysis, self)._auto_init()
-        required_lead_columns = [ 'jtbd_mrr', 'jtbd_job_category_id', 'jtbd_job_quadrant', 'jtbd_job_clarity_score', 'jtbd_momentum_score', 'jtbd_signal_strength', 'jtbd_risk_level', 'jtbd_trigger_window', 'jtbd_ltv_cac_ratio', 'jtbd_agency_size', 'jtbd_account_tier', 'jtbd_data_source_label', 'jtbd_source_confidence_score', 'jtbd_contact_progression_status', 'jtbd_automation_source' ]
-        all_columns_exist = True
-        missing_cols = []
-
-        # --- Use direct SQL query to information_schema ---
-        # This avoids relying on potentially unavailable tools.column_exists or connection info attributes
-        check_query = """
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name = 'crm_lead' AND column_name = %s
+    def _get_lead_column_types(self):
+        """ Types of the required crm_lead columns, in one catalog query.
+        :return: dict {column name: data type} of the existing columns
         """
-        _logger.debug(f"Checking existence of columns in crm_lead for {self._table} view: {required_lead_columns}")
-        try:
-            for col in required_lead_columns:
-                self.env.cr.execute(check_query, (col,))
-                if self.env.cr.fetchone() is None:
-                    all_columns_exist = False
-                    missing_cols.append(col)
-                    # Optional: Break early if one is missing
-                    # break
-            _logger.debug(f"Column existence check complete. Missing: {missing_cols}")
-
-        except (psycopg2.Error, Exception) if psycopg2 else Exception as e:
-            _logger.error(f"Error performing SQL column existence check for crm_lead: {e}", exc_info=True)
-            all_columns_exist = False # Assume failure if query fails
-            missing_cols = required_lead_columns
-
-        # --- Conditional View Creation ---
-        if all_columns_exist:
-            _logger.info(f"Dependent columns found in crm_lead. Proceeding with SQL view creation for {self._table}.")
-            self._create_or_replace_view() # Call the view creation method
-        else:
-            _logger.warning(f"Deferring SQL view creation for {self._table}: Missing columns in crm_lead: {missing_cols}. View will be created on next update/restart.")
+        self.env.cr.execute("""
+            SELECT column_name, data_type FROM information_schema.columns
+             WHERE table_name = 'crm_lead' AND column_name = ANY(%s)
+        """, [list(PIPELINE_REQUIRED_LEAD_COLUMNS)])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_relation_signature(self, lead_columns=None):
+        """ Hash of everything the relation is built from: storage mode, SELECT and the types of its columns. """
+        if lead_columns is None:
+            lead_columns = self._get_lead_column_types()
+        definition = '\n'.join([
+            'materialized' if self._is_materialized() else 'view',
+            self._select_query(),
+            *(f'{column}:{lead_columns.get(column)}' for column in PIPELINE_REQUIRED_LEAD_COLUMNS),
+        ])
+        return hashlib.sha1(definition.encode()).hexdigest()
+
+    def _get_deployed_signature(self):
+        """ Signature stored on the existing relation (see _create_or_replace_view), or None. """
+        self.env.cr.execute("""
+            SELECT obj_description(oid, 'pg_class') FROM pg_class
+             WHERE relname = %s AND relkind IN ('v', 'r')
+        """, (self._table,))
+        row = self.env.cr.fetchone()
+        return row and row[0]
+
+    # --- Relation Management ---
+    @api.model
+    def _is_materialized(self):
+        return self.env['ir.config_parameter'].sudo().get_param(PIPELINE_ANALYSIS_MODE_PARAM, 'view') == 'materialized'
 
-        return res
-
-    def _create_or_replace_view(self):
-        """ Creates or replaces the SQL view for pipeline analysis. """
-        _logger.info(f"Creating/Replacing SQL View: {self._table}")
-        query = """
-            CREATE OR REPLACE VIEW %(table_name)s AS (
-                SELECT
-                    l.id as id, l.id as lead_id, l.name as lead_name, l.stage_id, l.team_id,
-                    l.user_id, l.company_id, l.partner_id, l.create_date, l.date_closed, l.active, l.probability,
-                    rc.currency_id as currency_id, l.expected_revenue, l.jtbd_mrr as est_mrr,
-                    l.jtbd_job_category_id as job_category_id, l.jtbd_job_quadrant as job_quadrant,
-                    l.jtbd_job_clarity_score as job_clarity_score, l.jtbd_momentum_score as momentum_score,
-                    l.jtbd_signal_strength as signal_strength, l.jtbd_risk_level as risk_level,
-                    l.jtbd_trigger_window as trigger_window, om.outcome_metric as primary_outcome_metric,
-                    om.primary_outcome_progress, om.jtbd_outcome_status as outcome_status,
-                    l.jtbd_ltv_cac_ratio as ltv_cac_ratio, l.jtbd_agency_size as agency_size,
-                    l.jtbd_account_tier as account_tier, l.jtbd_data_source_label as data_source_label,
-                    l.jtbd_source_confidence_score as source_confidence_score,
-                    l.jtbd_contact_progression_status as contact_progression_status,
-                    l.jtbd_automation_source as automation_source
-                FROM
-                    crm_lead l
-                LEFT JOIN res_company rc ON l.company_id = rc.id
-                LEFT JOIN LATERAL (
-                    SELECT om_sub.outcome_metric, om_sub.primary_outcome_progress, om_sub.jtbd_outcome_status
-                    FROM jtbd_outcome_mapping om_sub
-                    WHERE om_sub.lead_id = l.id ORDER BY om_sub.create_date DESC, om_sub.id DESC LIMIT 1
-                ) om ON true
-                WHERE l.type = 'opportunity'
-            )
+    @api.model
+    def _select_query(self, where_lead_ids=False):
+        """ SELECT shared by the view and the materialized table.
+        :param where_lead_ids: if True, the query expects a tuple of lead ids as parameter (incremental refresh)
         """
-        params = {'table_name': self._table}
-        # Use odoo.tools.sql.drop_view_if_exists for better cross-DB compatibility if needed
-        tools.drop_view_if_exists(self.env.cr, self._table)
+        return """
+            SELECT
+                l.id as id, l.id as lead_id, l.name as lead_name, l.stage_id, l.team_id,
+                l.user_id, l.company_id, l.partner_id, l.create_date, l.date_closed, l.active, l.probability,
+                rc.currency_id as currency_id, l.expected_revenue, l.jtbd_mrr as est_mrr,
+                l.jtbd_job_category_id as job_category_id, l.jtbd_job_quadrant as job_quadrant,
+                l.jtbd_job_clarity_score as job_clarity_score, l.jtbd_momentum_score as momentum_score,
+                l.jtbd_signal_strength as signal_strength, l.jtbd_risk_level as risk_level,
+                l.jtbd_trigger_window as trigger_window, om.outcome_metric as primary_outcome_metric,
+                om.primary_outcome_progress, om.jtbd_outcome_status as outcome_status,
+                l.jtbd_ltv_cac_ratio as ltv_cac_ratio, l.jtbd_agency_size as agency_size,
+                l.jtbd_account_tier as account_tier, l.jtbd_data_source_label as data_source_label,
+                l.jtbd_source_confidence_score as source_confidence_score,
+                l.jtbd_contact_progression_status as contact_progression_status,
+                l.jtbd_automation_source as automation_source,
+                (now() at time zone 'UTC') as refresh_date
+            FROM
+                crm_lead l
+            LEFT JOIN res_company rc ON l.company_id = rc.id
+            LEFT JOIN jtbd_outcome_mapping om ON om.id = l.jtbd_latest_outcome_mapping_id
+            WHERE l.type = 'opportunity'%s
+        """ % (" AND l.id IN %s" if where_lead_ids else "")
+
+    def _drop_relation(self):
+        """ Drop the report relation whatever its current kind (view, materialized view or table). """
+        self.env.cr.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('v', 'm', 'r')", (self._table,))
+        row = self.env.cr.fetchone()
+        if not row:
+            return
+        kind = {'v': 'VIEW', 'm': 'MATERIALIZED VIEW', 'r': 'TABLE'}[row[0]]
+        self.env.cr.execute(f'DROP {kind} IF EXISTS "{self._table}" CASCADE')
+
+    def _create_or_replace_view(self, signature=None):
+        """ Creates or replaces the SQL relation for pipeline analysis (view or materialized table).
+        The relation is commented with its definition signature, so init() only rebuilds it when it changes. """
+        materialized = self._is_materialized()
+        signature = signature or self._get_relation_signature()
+        _logger.info(f"Creating/Replacing SQL {'Table' if materialized else 'View'}: {self._table}")
+        self._drop_relation()
         try:
-            self.env.cr.execute(query % params)
-            _logger.info(f"Successfully created/replaced SQL View: {self._table}")
+            if materialized:
+                self.env.cr.execute(f'CREATE TABLE "{self._table}" AS ({self._select_query()})')
+                self.env.cr.execute(f'ALTER TABLE "{self._table}" ADD PRIMARY KEY (id)')
+                for column in PIPELINE_ANALYSIS_INDEXED_COLUMNS:
+                    tools.create_index(self.env.cr, f'{self._table}_{column}_idx', self._table, [column])
+                self._set_refreshed_at()
+            else:
+                self.env.cr.execute(f'CREATE OR REPLACE VIEW "{self._table}" AS ({self._select_query()})')
+            self.env.cr.execute(f'COMMENT ON {"TABLE" if materialized else "VIEW"} "{self._table}" IS %s', (signature,))
+            _logger.info(f"Successfully created/replaced SQL relation: {self._table}")
         except Exception as e:
-            _logger.error(f"CRITICAL FAILURE: Failed to create/replace SQL View {self._table}: {e}", exc_info=True)
-            raise UserError(_("Database View creation failed for JTBD Pipeline Analysis. Module cannot be installed/upgraded correctly. Please check server logs for details. Error: %s") % str(e)) from e
\ No newline at end of file
+            _logger.error(f"CRITICAL FAILURE: Failed to create/replace SQL relation {self._table}: {e}", exc_info=True)
+            raise UserError(_("Database View creation failed for JTBD Pipeline Analysis. Module cannot be installed/upgraded correctly. Please check server logs for details. Error: %s") % str(e)) from e
+
+    def _set_refreshed_at(self):
+        self.env['ir.config_parameter'].sudo().set_param(PIPELINE_ANALYSIS_REFRESHED_PARAM, fields.Datetime.to_string(fields.Datetime.now()))
+
+    # --- Materialized Mode Refresh ---
+    def _flush_sources(self):
+        """ Push pending ORM writes of the source models to the database before reading them in SQL. """
+        self.env['crm.lead'].flush_model()
+        self.env['jtbd.outcome.mapping'].flush_model()
+
+    @api.model
+    def _refresh_leads(self, lead_ids):
+        """ Incremental refresh: recompute the rows of the given leads in the materialized table.
+        No-op in view mode, so the write paths can call it unconditionally. """
+        if not lead_ids or not self._is_materialized():
+            return
+        lead_ids = tuple(lead_ids)
+        self._flush_sources()
+        self.env.cr.execute(f'DELETE FROM "{self._table}" WHERE id IN %s', (lead_ids,))
+        self.env.cr.execute(f'INSERT INTO "{self._table}" {self._select_query(where_lead_ids=True)}', (lead_ids,))
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh_pipeline_analysis(self):
+        """ Full refresh of the materialized table (safety net for writes done outside the ORM).
+        DELETE + INSERT in one transaction keeps the previous rows visible to readers until commit. """
+        if not self._is_materialized():
+            return
+        self._flush_sources()
+        self.env.cr.execute(f'DELETE FROM "{self._table}"')
+        self.env.cr.execute(f'INSERT INTO "{self._table}" {self._select_query()}')
+        self.invalidate_model()
+        self._set_refreshed_at()
+        _logger.info(f"JTBD Pipeline Analysis: materialized table {self._table} fully refreshed.")
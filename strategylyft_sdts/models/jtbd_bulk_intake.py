@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from odoo import models, fields, api, tools, _
+
+_logger = logging.getLogger(__name__)
+
+# Rows resolved, inserted and committed together
+INTAKE_CHUNK_SIZE = 5000
+# Row errors reported back per upload (the others are only counted)
+INTAKE_MAX_REPORTED_ERRORS = 50
+DEFAULT_INTAKE_SIGNAL_SCORE = 5
+
+
+def parse_intake_datetime(value):
+    """ Naive UTC datetime of an ISO 8601 string (with or without UTC offset), or None.
+    Truncated to the second like the ORM stores Datetime values (the rows are inserted in SQL). """
+    if not value:
+        return None
+    value = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+
+def intake_text(value):
+    """ Stripped text of a scalar value, JSON of a structured one ('' if empty). """
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value).strip() if value is not None else ''
+
+
+class JtbdBulkIntake(models.AbstractModel):
+    """ Bulk intake of scraper/funnel data (see the /jtbd/intake/<kind> route).
+
+    Rows are plain dicts (parsed NDJSON lines or CSV records) targeting a lead
+    by ``lead_id``, ``external_key`` (crm.lead jtbd_external_key) or
+    ``email``. They are processed by chunks: the leads of a chunk are resolved
+    with one query, and its rows are inserted with a few multi-row statements
+    instead of one ORM ``create`` per row.
+    """
+    _name = 'jtbd.bulk.intake'
+    _description = 'JTBD Bulk Data Intake'
+
+    @api.model
+    def _get_intake_handlers(self):
+        """ Intake kinds and their chunk handler: handler(chunk, errors) -> (inserted, unresolved). """
+        return {
+            'intent_signal': self._intake_intent_signals,
+            'provenance': self._intake_provenance,
+        }
+
+    @api.model
+    def _intake_rows(self, kind, rows, chunk_size=INTAKE_CHUNK_SIZE):
+        """ Ingest an iterable of rows chunk by chunk.
+
+        Each chunk runs in a savepoint and is committed (outside tests), so an
+        upload of millions of rows keeps memory flat and a failing chunk only
+        loses its own rows. Rows that are not dicts (unparsable input lines)
+        are counted as invalid.
+
+        :return: generator of progress dicts, one per chunk, then a final summary
+        """
+        handler = self._get_intake_handlers()[kind]
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        totals = {'kind': kind, 'rows': 0, 'inserted': 0, 'unresolved': 0, 'invalid': 0, 'failed': 0}
+        reported_count = 0
+        start = time.monotonic()
+        for chunk in tools.split_every(chunk_size, enumerate(rows, 1)):
+            errors, failed = [], 0
+            try:
+                with self.env.cr.savepoint():
+                    inserted, unresolved = handler(chunk, errors)
+            except Exception as e:
+                _logger.error(f"JTBD Bulk Intake: {kind} chunk starting at row {chunk[0][0]} failed: {e}", exc_info=True)
+                inserted, unresolved, failed = 0, 0, len(chunk)
+                errors = [(chunk[0][0], _("Chunk of %(count)s rows rejected: %(error)s", count=len(chunk), error=e))]
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all() # Keep memory flat on large uploads
+            totals['rows'] += len(chunk)
+            totals['inserted'] += inserted
+            totals['unresolved'] += unresolved
+            totals['invalid'] += 0 if failed else len(errors)
+            totals['failed'] += failed
+            reported = errors[:max(0, INTAKE_MAX_REPORTED_ERRORS - reported_count)]
+            reported_count += len(reported)
+            elapsed = time.monotonic() - start
+            yield dict(totals, status='progress', rows_per_second=round(totals['rows'] / elapsed) if elapsed else totals['rows'],
+                       errors=[{'row': number, 'error': str(message)} for number, message in reported])
+        elapsed = time.monotonic() - start
+        totals['rows_per_second'] = round(totals['rows'] / elapsed) if elapsed else totals['rows']
+        _logger.info(f"JTBD Bulk Intake: {kind} upload done in {elapsed:.1f}s: {totals}")
+        yield dict(totals, status='done', seconds=round(elapsed, 3))
+
+    @api.model
+    def _resolve_chunk_rows(self, chunk, errors):
+        """ Resolve the leads of a chunk with one query.
+
+        :return: list of (row number, row, lead id or False) of the dict rows
+        """
+        rows = []
+        for number, row in chunk:
+            if isinstance(row, dict):
+                rows.append((number, row))
+            else:
+                errors.append((number, _("Not a JSON object or CSV record.")))
+        lead_ids = self.env['crm.lead']._jtbd_resolve_intake_leads([row for _number, row in rows])
+        return [(number, row, lead_id) for (number, row), lead_id in zip(rows, lead_ids)]
+
+    # --- Chunk Handlers ---
+    @api.model
+    def _intake_intent_signals(self, chunk, errors):
+        """ Insert the intent signals of a chunk with one multi-row INSERT, their journey
+        events with one INSERT ... SELECT, and update the intent rollup in SQL: the
+        effects of jtbd.intent.signal create, without its per-record overhead. """
+        Signal = self.env['jtbd.intent.signal']
+        signal_types = dict(Signal._fields['signal_type'].selection)
+        now = fields.Datetime.now()
+        values, unresolved = [], 0
+        for number, row, lead_id in self._resolve_chunk_rows(chunk, errors):
+            if not lead_id:
+                unresolved += 1
+                continue
+            try:
+                signal_type = intake_text(row.get('signal_type'))
+                if signal_type not in signal_types:
+                    raise ValueError(_("Unknown signal type '%s'.", signal_type))
+                source, activity = intake_text(row.get('source')), intake_text(row.get('activity'))
+                if not source or not activity:
+                    raise ValueError(_("'source' and 'activity' are required."))
+                score = row.get('score')
+                values.append((
+                    lead_id, signal_type, source, parse_intake_datetime(row.get('timestamp')) or now, activity,
+                    int(score) if score not in (None, '') else DEFAULT_INTAKE_SIGNAL_SCORE,
+                    intake_text(row.get('topic')) or None, intake_text(row.get('details')) or None,
+                ))
+            except (TypeError, ValueError) as e:
+                errors.append((number, str(e)))
+        if not values:
+            return 0, unresolved
+
+        cr = self.env.cr
+        cr.execute(f"""
+            INSERT INTO {Signal._table} (lead_id, signal_type, source, timestamp, activity, score, topic, details,
+                                         create_uid, write_uid, create_date, write_date)
+            SELECT v.lead_id::int4, v.signal_type, v.source, v.timestamp::timestamp, v.activity, v.score::int4, v.topic, v.details,
+                   %s, %s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM (VALUES {', '.join(['%s'] * len(values))})
+                AS v(lead_id, signal_type, source, timestamp, activity, score, topic, details)
+         RETURNING id
+        """, [self.env.uid, self.env.uid] + values)
+        signal_ids = [row[0] for row in cr.fetchall()]
+
+        # Journey events, as queued by jtbd.intent.signal create (name as computed by the event model)
+        Event = self.env['jtbd.unified.journey.event']
+        cr.execute(f"""
+            INSERT INTO {Event._table} (name, lead_id, partner_id, company_id, event_datetime, event_type, source_system,
+                                        channel, description, related_record_ref, details_json,
+                                        create_uid, write_uid, create_date, write_date)
+            SELECT %(label)s || ' - ' || l.name || ' (' || to_char(s.timestamp, 'YYYY-MM-DD HH24:MI') || ')',
+                   s.lead_id, l.partner_id, l.company_id, s.timestamp, 'intent_signal', 'odoo_jtbd',
+                   s.signal_type, 'Intent Signal: ' || s.activity, %(model)s || ',' || s.id, s.details,
+                   %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM {Signal._table} s
+              JOIN crm_lead l ON l.id = s.lead_id
+             WHERE s.id = ANY(%(ids)s)
+        """, {
+            'label': dict(Event._fields['event_type']._description_selection(self.env))['intent_signal'],
+            'model': Signal._name, 'uid': self.env.uid, 'ids': signal_ids,
+        })
+        Signal.browse(signal_ids)._update_intent_rollup()
+        return len(signal_ids), unresolved
+
+    @api.model
+    def _intake_provenance(self, chunk, errors):
+        """ Insert the provenance records of a chunk's leads with one multi-row INSERT. """
+        Provenance = self.env['jtbd.data.provenance']
+        source_labels = dict(Provenance._fields['data_source_label']._description_selection(self.env))
+        res_model_id = self.env['ir.model']._get_id('crm.lead')
+        name_prefix = _("Provenance")
+        now = fields.Datetime.now()
+        values, unresolved = [], 0
+        for number, row, lead_id in self._resolve_chunk_rows(chunk, errors):
+            if not lead_id:
+                unresolved += 1
+                continue
+            try:
+                label = intake_text(row.get('data_source_label'))
+                if label not in source_labels:
+                    raise ValueError(_("Unknown data source label '%s'.", label))
+                confidence = row.get('source_confidence_score')
+                values.append((
+                    f"{name_prefix} [crm.lead ID:{lead_id}] ({source_labels[label]})", res_model_id, lead_id, label,
+                    intake_text(row.get('source_reference')) or None,
+                    parse_intake_datetime(row.get('ingestion_datetime')) or now,
+                    float(confidence) if confidence not in (None, '') else None,
+                    parse_intake_datetime(row.get('record_write_date')),
+                ))
+            except (TypeError, ValueError) as e:
+                errors.append((number, str(e)))
+        if not values:
+            return 0, unresolved
+
+        self.env.cr.execute(f"""
+            INSERT INTO {Provenance._table} (name, res_model_id, res_id, data_source_label, source_reference,
+                                             ingestion_datetime, source_confidence_score, record_write_date,
+                                             create_uid, write_uid, create_date, write_date)
+            SELECT v.name, v.res_model_id::int4, v.res_id::int4, v.data_source_label, v.source_reference,
+                   v.ingestion_datetime::timestamp, v.source_confidence_score::numeric, v.record_write_date::timestamp,
+                   %s, %s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM (VALUES {', '.join(['%s'] * len(values))})
+                AS v(name, res_model_id, res_id, data_source_label, source_reference,
+                     ingestion_datetime, source_confidence_score, record_write_date)
+        """, [self.env.uid, self.env.uid] + values)
+        return self.env.cr.rowcount, unresolved
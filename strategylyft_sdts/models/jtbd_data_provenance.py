@@ -12,7 +12,7 @@ class JtbdDataProvenance(models.Model):
     res_model_id = fields.Many2one('ir.model', string='Source Model', index=True, required=True, ondelete='cascade')
     res_id = fields.Integer(string='Source Record ID', index=True, required=True)
     # Optional: Generic Reference field for easier linking in UI
-    # source_record = fields.Reference(lambda self: [(m.model, m.name) for m in self.env['ir.model'].search([])], string="Source Record", compute='_compute_source_record', store=False)
+    # source_record = fields.Reference(lambda self: self.env['ir.model']._jtbd_reference_selection(), string="Source Record", compute='_compute_source_record', store=False)
 
     # Provenance Details
     data_source_label = fields.Selection(
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import threading
+from collections import defaultdict
+from markupsafe import Markup
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+FEEDBACK_INBOX_BATCH_SIZE = 1000
+# Only JTBD records (and their opportunities) can be targeted by external feedback
+FEEDBACK_TARGET_MODEL_PREFIX = 'jtbd.'
+FEEDBACK_TARGET_MODELS = ('crm.lead',)
+
+
+class JtbdFeedbackSignal(models.Model):
+    _name = 'jtbd.feedback.signal'
+    _description = 'JTBD Feedback Signal Inbox'
+    _order = 'id desc'
+
+    idempotency_key = fields.Char(
+        string='Idempotency Key', readonly=True, copy=False,
+        help="Client-supplied key: a signal re-sent with the same key is ignored."
+    )
+    signal_type = fields.Char(string='Signal Type', required=True, readonly=True, index=True)
+    model_name = fields.Char(string='Target Model', required=True, readonly=True)
+    reference_id = fields.Integer(string='Target Record ID', required=True, readonly=True)
+    score = fields.Float(string='Score', readonly=True)
+    has_score = fields.Boolean(string='Score Provided', readonly=True)
+    message = fields.Text(string='Message', readonly=True)
+    details_json = fields.Text(string='Details (JSON)', readonly=True)
+    state = fields.Selection(
+        [('pending', 'Pending'), ('done', 'Processed'), ('error', 'Error')],
+        string='Status', default='pending', required=True, readonly=True, index=True
+    )
+    error_message = fields.Text(string='Error', readonly=True)
+    processed_date = fields.Datetime(string='Processed On', readonly=True)
+
+    _sql_constraints = [
+        ('idempotency_key_uniq', 'unique(idempotency_key)', 'A feedback signal with this idempotency key was already received!'),
+    ]
+
+    # --- Inbox Writer (called by the webhook controller) ---
+    @api.model
+    def _enqueue_signals(self, payloads):
+        """ Append valid webhook payloads to the inbox with one multi-row INSERT.
+
+        Payloads whose ``idempotency_key`` is already in the inbox are skipped
+        by the unique constraint (ON CONFLICT DO NOTHING), so client retries
+        are safe.
+
+        :return: tuple (accepted_count, duplicate_count, invalid_count)
+        """
+        rows, invalid_count = [], 0
+        for payload in payloads:
+            if not isinstance(payload, dict) or not all(payload.get(key) for key in ('signal_type', 'reference_id', 'model_name')):
+                invalid_count += 1
+                continue
+            try:
+                reference_id = int(payload['reference_id'])
+                score = payload.get('score')
+                score = float(score) if score is not None else None
+            except (TypeError, ValueError):
+                invalid_count += 1
+                continue
+            details = payload.get('details')
+            rows.append((
+                payload.get('idempotency_key') or None, str(payload['signal_type']), str(payload['model_name']),
+                reference_id, score, score is not None, payload.get('message') or None,
+                json.dumps(details, default=str) if details else None, 'pending',
+            ))
+        if not rows:
+            return 0, 0, invalid_count
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (idempotency_key, signal_type, model_name, reference_id, score, has_score,
+                                       message, details_json, state, create_uid, write_uid, create_date, write_date)
+            SELECT v.idempotency_key, v.signal_type, v.model_name, v.reference_id::int4, v.score::float8, v.has_score::bool,
+                   v.message, v.details_json, v.state, %s, %s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM (VALUES {', '.join(['%s'] * len(rows))})
+                AS v(idempotency_key, signal_type, model_name, reference_id, score, has_score, message, details_json, state)
+            ON CONFLICT (idempotency_key) DO NOTHING
+        """, [self.env.uid, self.env.uid] + rows)
+        accepted_count = self.env.cr.rowcount
+        if accepted_count:
+            self.env.ref('jtbd_odoo_crm.ir_cron_jtbd_feedback_inbox')._trigger()
+        return accepted_count, len(rows) - accepted_count, invalid_count
+
+    # --- Inbox Worker ---
+    @api.model
+    def _cron_process_feedback_inbox(self, batch_size=FEEDBACK_INBOX_BATCH_SIZE):
+        """ Drain the pending signals in batches, grouping the work per target model. """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            signals = self.search([('state', '=', 'pending')], order='id', limit=batch_size)
+            if not signals:
+                break
+            signals._process_signals()
+            if auto_commit:
+                self.env.cr.commit()
+            if len(signals) < batch_size:
+                break
+
+    def _process_signals(self):
+        """ Apply a batch of signals: one exists() check, grouped score writes and
+        one batched chatter log per target model. """
+        now = fields.Datetime.now()
+        for model_name, model_signals in self.grouped('model_name').items():
+            if model_name not in self.env or not (model_name.startswith(FEEDBACK_TARGET_MODEL_PREFIX) or model_name in FEEDBACK_TARGET_MODELS):
+                model_signals.write({'state': 'error', 'processed_date': now,
+                                     'error_message': _("Model %s cannot receive feedback signals.", model_name)})
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    model_signals._apply_to_model(self.env[model_name].sudo(), now)
+            except Exception as e:
+                _logger.error(f"JTBD Feedback Inbox: Failed to apply {len(model_signals)} signal(s) to {model_name}: {e}", exc_info=True)
+                model_signals.write({'state': 'error', 'processed_date': now, 'error_message': str(e)})
+
+    def _apply_to_model(self, target_model, now):
+        """ Apply the signals of ``self`` (all targeting ``target_model``). """
+        targets = target_model.browse(set(self.mapped('reference_id'))).exists()
+        existing_ids = set(targets.ids)
+        missing = self.filtered(lambda s: s.reference_id not in existing_ids)
+        missing.write({'state': 'error', 'processed_date': now, 'error_message': _("Target record not found.")})
+        signals = self - missing
+
+        # content_performance: one write per distinct score (last signal per record wins)
+        writes_score = 'alignment_score' in target_model._fields
+        if writes_score:
+            score_by_record = {}
+            for signal in signals.sorted('id'):
+                if signal.signal_type == 'content_performance' and signal.has_score:
+                    score_by_record[signal.reference_id] = signal.score
+            ids_by_score = defaultdict(list)
+            for record_id, score in score_by_record.items():
+                ids_by_score[score].append(record_id)
+            for score, record_ids in ids_by_score.items():
+                target_model.browse(record_ids).write({'alignment_score': score})
+
+        # Chatter: one batched note per target record
+        if hasattr(target_model, '_message_log_batch'):
+            bodies = defaultdict(list)
+            for signal in signals:
+                bodies[signal.reference_id].append(signal._get_log_body(writes_score))
+            target_model.browse(list(bodies))._message_log_batch(
+                bodies={record_id: Markup('<br/>').join(lines) for record_id, lines in bodies.items()},
+            )
+        else:
+            for signal in signals:
+                _logger.info(signal._get_log_body(writes_score))
+        signals.write({'state': 'done', 'processed_date': now, 'error_message': False})
+
+    def _get_log_body(self, writes_score=False):
+        """ Chatter note of the signal (external values are escaped by Markup). """
+        self.ensure_one()
+        log_body = Markup("Received feedback signal '%s' for %s ID %s.") % (self.signal_type, self.model_name, self.reference_id)
+        if self.has_score: log_body += Markup(" Score: %s.") % self.score
+        if self.message: log_body += Markup(" Message: %s") % self.message
+        if self.signal_type == 'pattern_performance' and self.has_score and self.score < 50: # Example threshold
+            log_body += Markup("<br/><b>Action:</b> Low performance detected. Recommend review.")
+        elif self.signal_type == 'content_performance' and self.has_score and writes_score:
+            log_body += Markup("<br/><b>Action:</b> Alignment score updated to %s.") % self.score
+        return log_body
@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 import logging
-from odoo import models, fields, api, _
+import threading
+from collections import defaultdict
+from odoo import models, fields, api, tools, _
 from odoo.tools.safe_eval import safe_eval # Keep if common force wizard uses it
 from odoo.exceptions import UserError # Keep
 
 _logger = logging.getLogger(__name__)
 
+FORCE_TYPES = ('push', 'pull', 'anxiety', 'habit')
+FORCE_SCORE_CAP = 50
+DEFAULT_CONFIDENCE_WEIGHT = 0.75
+# Signal strength adjustment per decision window
+WINDOW_ADJUSTMENTS = {'immediate': 20, 'short': 10, 'medium': 0, 'long': -10, 'undefined': -5, False: 0}
+# Analyses rescored (and committed) per chunk by _rescore_all_analyses
+RESCORE_BATCH_SIZE = 5000
+
 class JtbdForceAnalysis(models.Model):
     _name = 'jtbd.force.analysis'
     _description = 'JTBD Force Analysis'
@@ -32,12 +42,13 @@ class JtbdForceAnalysis(models.Model):
     habit_force_ids = fields.One2many('jtbd.force.item', 'analysis_id', string='Habit Forces', domain=[('force_type', '=', 'habit')], context={'default_force_type': 'habit'})
 
     # --- Calculated Scores (Based on Force Items) ---
+    # All six scores share one batch compute (see _compute_scores)
     push_score = fields.Integer( string='Push Score', compute='_compute_scores', store=True, help="Aggregated push force strength (Max 50).")
     pull_score = fields.Integer( string='Pull Score', compute='_compute_scores', store=True, help="Aggregated pull force strength (Max 50).")
     anxiety_score = fields.Integer( string='Anxiety Score', compute='_compute_scores', store=True, help="Aggregated anxiety force strength (Max 50).")
     habit_score = fields.Integer( string='Habit Score', compute='_compute_scores', store=True, help="Aggregated habit force strength (Max 50).")
-    momentum_score = fields.Integer( string='Momentum Score', compute='_compute_momentum', store=True, help="Overall momentum towards change (0-100).")
-    signal_strength = fields.Integer( string='Signal Strength', compute='_compute_signal_strength', store=True, help="Combined intent score (0-100).")
+    momentum_score = fields.Integer( string='Momentum Score', compute='_compute_scores', store=True, help="Overall momentum towards change (0-100).")
+    signal_strength = fields.Integer( string='Signal Strength', compute='_compute_scores', store=True, help="Combined intent score (0-100).")
 
     # --- Add Field for PRD3 Enhanced Flow ---
     jtbd_source_confidence_weighting = fields.Float(
@@ -50,68 +61,104 @@ class JtbdForceAnalysis(models.Model):
     # --- Notes ---
     notes = fields.Html(string='Analysis Notes')
 
-    # --- Compute Methods (Refactored) ---
+    # --- Compute Methods (Batch Scoring Engine) ---
+    def _get_force_strength_sums(self):
+        """ Sum of force item strengths per analysis and force type.
+
+        Stored analyses are aggregated with ONE grouped query for the whole
+        recordset; new records (onchange) are summed from the cache since their
+        force items are not in the database yet.
+        :return: dict {analysis id: {force_type: strength sum}}
+        """
+        sums = defaultdict(lambda: dict.fromkeys(FORCE_TYPES, 0))
+        stored = self.filtered(lambda a: isinstance(a.id, int))
+        if stored:
+            groups = self.env['jtbd.force.item']._read_group(
+                [('analysis_id', 'in', stored.ids)], ['analysis_id', 'force_type'], ['strength:sum'])
+            for analysis, force_type, strength in groups:
+                sums[analysis.id][force_type] = strength or 0
+        for record in self - stored:
+            for force_type in FORCE_TYPES:
+                sums[record.id][force_type] = sum(record[f'{force_type}_force_ids'].mapped('strength'))
+        return sums
+
+    @api.model
+    def _score_forces(self, strength_sums, confidence, trigger_window, intensity_score, contract_loss):
+        """ Pure scoring rules: confidence-weighted capped force scores, momentum and signal strength.
+        :return: dict of the six score field values
+        """
+        scores = {
+            f'{force_type}_score': min(int(round(strength_sums[force_type] * confidence)), FORCE_SCORE_CAP)
+            for force_type in FORCE_TYPES
+        }
+        change_forces = scores['push_score'] + scores['pull_score']
+        resistance_forces = scores['anxiety_score'] + scores['habit_score']
+        momentum = 50 # Default neutral
+        if (change_forces + resistance_forces) > 0:
+            momentum = int(round(change_forces / (change_forces + resistance_forces) * 100))
+        momentum = max(0, min(100, momentum))
+
+        signal = momentum + WINDOW_ADJUSTMENTS.get(trigger_window, 0) # Momentum already reflects weighted forces
+        if intensity_score: signal += (intensity_score - 5.5) * 3
+        if contract_loss: signal += 15
+        scores.update(momentum_score=momentum, signal_strength=max(0, min(100, int(round(signal)))))
+        return scores
+
     @api.depends('push_force_ids.strength', 'pull_force_ids.strength',
                  'anxiety_force_ids.strength', 'habit_force_ids.strength',
-                 'jtbd_source_confidence_weighting') # Keep dependency
+                 'push_force_ids.force_type', 'pull_force_ids.force_type',
+                 'anxiety_force_ids.force_type', 'habit_force_ids.force_type',
+                 'jtbd_source_confidence_weighting', 'trigger_window', 'intensity_score', 'contract_loss')
     def _compute_scores(self):
-        """Calculate aggregated scores, applying confidence weighting."""
+        """ Compute force scores, momentum and signal strength of the whole recordset in one pass. """
         _logger.debug(f"Computing scores for FA IDs: {self.ids} with confidence")
+        strength_sums = self._get_force_strength_sums()
         for record in self:
-            # Get confidence, default to 0.75 if not set (avoids zeroing out everything)
-            confidence = record.jtbd_source_confidence_weighting if record.jtbd_source_confidence_weighting is not None else 0.75
-
-            # Apply confidence weighting directly to the sum, then cap
-            record.push_score = min(int(round(sum(record.push_force_ids.mapped('strength')) * confidence)), 50)
-            record.pull_score = min(int(round(sum(record.pull_force_ids.mapped('strength')) * confidence)), 50)
-            record.anxiety_score = min(int(round(sum(record.anxiety_force_ids.mapped('strength')) * confidence)), 50)
-            record.habit_score = min(int(round(sum(record.habit_force_ids.mapped('strength')) * confidence)), 50)
-            _logger.debug(f"FA {record.id}: Weighted Scores (Conf: {confidence:.2f}) - P={record.push_score}, Pl={record.pull_score}, A={record.anxiety_score}, H={record.habit_score}")
-
-
-    # Depends now includes confidence indirectly via scores, and explicitly for potential adjustments
-    @api.depends('push_score', 'pull_score', 'anxiety_score', 'habit_score', 'jtbd_source_confidence_weighting')
-    def _compute_momentum(self):
-        """Calculate momentum score based on confidence-weighted driving vs. resisting forces."""
-        _logger.debug(f"Computing momentum for FA IDs: {self.ids}")
-        for record in self:
-
-            change_forces = record.push_score + record.pull_score
-            resistance_forces = record.anxiety_score + record.habit_score
+            # Default confidence to 0.75 if not set (avoids zeroing out everything)
+            confidence = record.jtbd_source_confidence_weighting if record.jtbd_source_confidence_weighting is not None else DEFAULT_CONFIDENCE_WEIGHT
+            record.update(record._score_forces(
+                strength_sums[record.id], confidence, record.trigger_window, record.intensity_score, record.contract_loss))
 
-            momentum = 50 # Default neutral
-
-            if change_forces == 0 and resistance_forces == 0:
-                pass
-            elif (change_forces + resistance_forces) > 0:
-                momentum_ratio = change_forces / (change_forces + resistance_forces)
-                momentum = int(round(momentum_ratio * 100))
-            else:
-                pass
-
-            # Assign the calculated momentum
-            record.momentum_score = max(0, min(100, momentum))
-            _logger.debug(f"FA {record.id}: Momentum = {record.momentum_score} (Based on weighted scores)")
-                    
     # --- Ensure compute method for confidence itself exists ---
     @api.depends('lead_id.jtbd_source_confidence_score')
     def _compute_source_confidence_weighting(self):
         for analysis in self:
             # Default to 0.75 if lead score is missing or zero
-            analysis.jtbd_source_confidence_weighting = analysis.lead_id.jtbd_source_confidence_score or 0.75
-            
-    @api.depends('momentum_score', 'trigger_window', 'intensity_score', 'contract_loss') # Remove confidence dependency here
-    def _compute_signal_strength(self):
-        """ Calculate signal strength using confidence-adjusted momentum. """
-        window_adjustments = {'immediate': 20, 'short': 10, 'medium': 0, 'long': -10, 'undefined': -5, False: 0}
-        for record in self:
-            signal = record.momentum_score # Momentum score already reflects weighted forces
-            signal += window_adjustments.get(record.trigger_window, 0)
-            if record.intensity_score: signal += (record.intensity_score - 5.5) * 3
-            if record.contract_loss: signal += 15
-            record.signal_strength = max(0, min(100, int(round(signal)))) # Use direct signal
-            # _logger.debug(f"FA {record.id}: Final Signal Strength = {record.signal_strength}")
-            
+            analysis.jtbd_source_confidence_weighting = analysis.lead_id.jtbd_source_confidence_score or DEFAULT_CONFIDENCE_WEIGHT
+
+    @api.model
+    def _rescore_all_analyses(self, batch_size=RESCORE_BATCH_SIZE):
+        """ Recompute confidence weighting and scores of every analysis, chunk by chunk
+        (e.g. after the weighting rules changed). Each chunk is committed outside tests. """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        score_fnames = ['jtbd_source_confidence_weighting', 'push_score', 'pull_score', 'anxiety_score',
+                        'habit_score', 'momentum_score', 'signal_strength']
+        self.env.cr.execute(f"SELECT id FROM {self._table} ORDER BY id")
+        analysis_ids = [row[0] for row in self.env.cr.fetchall()]
+        for chunk_ids in tools.split_every(batch_size, analysis_ids):
+            analyses = self.with_context(tracking_disable=True).browse(chunk_ids)
+            for fname in score_fnames:
+                self.env.add_to_compute(self._fields[fname], analyses)
+            analyses.flush_recordset(score_fnames)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info(f"JTBD Force Analysis: rescored {len(analysis_ids)} analyses.")
+        return len(analysis_ids)
+
+    @api.model
+    def _cron_rescore_all_analyses(self):
+        count = self._rescore_all_analyses()
+        # One-shot job: the cron is enabled again by the next rescoring request
+        self.env['ir.cron']._notify_progress(done=count, remaining=0, deactivate=True)
+
+    def action_rescore_all_analyses(self):
+        """ Rescore every analysis in the background (chunks are committed by the cron). """
+        cron = self.env.ref('jtbd_odoo_crm.ir_cron_jtbd_force_analysis_rescore').sudo()
+        cron.try_write({'active': True}) # Already active (and locked) when a run is in progress
+        cron._trigger()
+        return self._notify_success(_("Rescoring of all force analyses scheduled: it runs in the background."))
+
     # --- Action Methods ---
     def action_share_analysis(self): # Unchanged
         self.ensure_one()
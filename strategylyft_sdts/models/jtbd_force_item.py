@@ -8,6 +8,7 @@ _logger = logging.getLogger(__name__) # Initialize logger
 class JtbdForceItem(models.Model):
     _name = 'jtbd.force.item'
     _description = 'JTBD Force Item'
+    _inherit = ['jtbd.trace.link.mixin']
     _order = 'sequence, id'
 
     analysis_id = fields.Many2one( 'jtbd.force.analysis', string='Analysis', required=True, ondelete='cascade', index=True )
@@ -19,31 +20,10 @@ class JtbdForceItem(models.Model):
     sequence = fields.Integer(string='Sequence', default=10)
 
 
-    # --- Counter Field (Using search_count loop) ---
+    # --- Counter Field (Grouped count, see jtbd.trace.link.mixin) ---
     def _compute_trace_link_count(self):
-        """ Computes the number of trace links using search_count loop (more robust). """
-        _logger.debug(f"Computing trace link count for Force Item IDs: {self.ids}")
-        TraceLink = self.env['jtbd.trace.link']
-        # Find the ir.model ID once
-        trace_link_model_id = self.env['ir.model']._get_id(self._name)
-        if not trace_link_model_id:
-             _logger.error("Could not find ir.model ID for jtbd.force.item")
-             for record in self: record.jtbd_trace_link_count = 0
-             return
-
-        for record in self:
-            try:
-                count = TraceLink.search_count([
-                    ('source_model_id', '=', trace_link_model_id),
-                    ('source_res_id', '=', record.id)
-                ])
-                record.jtbd_trace_link_count = count
-                # _logger.debug(f"Force Item {record.id}: Trace Link Count = {count}")
-            except Exception as e:
-                 _logger.error(f"Error counting trace links for Force Item {record.id}: {e}", exc_info=True)
-                 record.jtbd_trace_link_count = 0 # Default to 0 on error
-        _logger.debug(f"Finished computing trace link count.")
-
+        """ Computes the number of trace links with one grouped query for the recordset. """
+        self._jtbd_assign_trace_link_counts('jtbd_trace_link_count')
 
     jtbd_trace_link_count = fields.Integer(
         compute='_compute_trace_link_count',
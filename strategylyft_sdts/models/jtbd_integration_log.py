@@ -8,8 +8,16 @@ _logger = logging.getLogger(__name__)
 class JtbdIntegrationLog(models.Model):
     _name = 'jtbd.integration.log'
     _description = 'JTBD Integration Log'
+    _inherit = ['jtbd.retention.mixin']
     _order = 'timestamp desc, id desc'
 
+    # Logs older than the retention are summarized into jtbd.integration.log.daily (see jtbd.retention.mixin)
+    _jtbd_retention_date_column = 'timestamp'
+    _jtbd_retention_param = 'jtbd_odoo_crm.integration_log_retention_days'
+    _jtbd_rollup_model = 'jtbd.integration.log.daily'
+    _jtbd_rollup_group_columns = ('integration_id', 'operation', 'status', 'company_id')
+    _jtbd_compressed_columns = ('details',)
+
     integration_id = fields.Many2one(
         'jtbd.integration.settings', string='Integration Setting', required=True, ondelete='cascade', index=True
     )
@@ -30,7 +38,7 @@ class JtbdIntegrationLog(models.Model):
     related_res_model = fields.Char(string="Related Model")
     related_res_id = fields.Integer(string="Related Record ID")
     related_record_ref = fields.Reference( # Use Reference for better display if model/id known
-         lambda self: [(m.model, m.name) for m in self.env['ir.model'].search([])],
+         lambda self: self.env['ir.model']._jtbd_reference_selection(),
          compute='_compute_related_record_ref', store=False, string="Related Record"
     )
 
@@ -45,4 +53,25 @@ class JtbdIntegrationLog(models.Model):
              if log.related_res_model and log.related_res_id and log.related_res_model in self.env:
                  log.related_record_ref = f"{log.related_res_model},{log.related_res_id}"
              else:
-                 log.related_record_ref = False # Set to False if model doesn't exist or IDs are missing
\ No newline at end of file
+                 log.related_record_ref = False # Set to False if model doesn't exist or IDs are missing
+
+
+class JtbdIntegrationLogDaily(models.Model):
+    _name = 'jtbd.integration.log.daily'
+    _description = 'JTBD Integration Log Daily Summary'
+    _order = 'day desc, id desc'
+
+    day = fields.Date(string='Day', required=True, readonly=True, index=True)
+    integration_id = fields.Many2one(
+        'jtbd.integration.settings', string='Integration Setting', readonly=True, ondelete='cascade', index=True
+    )
+    operation = fields.Selection(
+        selection=lambda self: self.env['jtbd.integration.log']._fields['operation'].selection,
+        string='Operation', readonly=True
+    )
+    status = fields.Selection(
+        selection=lambda self: self.env['jtbd.integration.log']._fields['status'].selection,
+        string='Status', readonly=True
+    )
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    event_count = fields.Integer(string='Logs', readonly=True, aggregator='sum')
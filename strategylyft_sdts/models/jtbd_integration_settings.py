@@ -6,14 +6,22 @@ import requests # Add for connection testing/sync logic later
 import json # For potential payload handling
 # REMOVED incorrect slugify imports
 import uuid # For webhook token alternative
+import threading
+from collections import defaultdict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 _logger = logging.getLogger(__name__)
 
+# --- Sync Engine Tuning ---
+SYNC_HTTP_TIMEOUT = 30 # Seconds per bulk request
+SYNC_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 class JtbdIntegrationSettings(models.Model):
     _name = 'jtbd.integration.settings'
     _description = 'JTBD Integration Configuration & Control' # Enhanced Description
     _order = 'sequence, name'
-    _inherit = ['mail.thread', 'mail.activity.mixin'] # Add chatter for logging/notifications
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'jtbd.related.count.mixin'] # Add chatter for logging/notifications
 
     name = fields.Char(string='Integration Name', required=True, tracking=True)
     sequence = fields.Integer(default=10)
@@ -92,6 +100,30 @@ class JtbdIntegrationSettings(models.Model):
     sync_cron_id = fields.Many2one('ir.cron', string='Sync Scheduler Job', readonly=True, copy=False, ondelete='set null')
     last_sync = fields.Datetime(string='Last Sync Timestamp', readonly=True, copy=False)
     last_sync_status = fields.Selection( [('success', 'Success'), ('warning', 'Warning'), ('error', 'Error')], string='Last Sync Status', readonly=True, copy=False)
+    sync_batch_size = fields.Integer(
+        string='Sync Batch Size', default=500,
+        help="Number of records read and sent per bulk request. Each successful batch is committed, so an interrupted sync resumes after the last one."
+    )
+    sync_push_path = fields.Char(
+        string='Bulk Push Path',
+        help="Path appended to the API Endpoint for outbound pushes (e.g. 'leads/bulk'). Receives {'key_field': ..., 'records': [...]} as JSON."
+    )
+    sync_pull_path = fields.Char(
+        string='Pull Path',
+        help="Path appended to the API Endpoint for inbound pulls (e.g. 'leads'). Called with 'updated_since', 'limit' and 'cursor' "
+             "params, it must answer {'records': [...], 'next_cursor': ...} (next_cursor empty on the last page)."
+    )
+    inbound_data_source_label = fields.Selection(
+        selection=lambda self: self.env['jtbd.data.provenance']._fields['data_source_label'].selection,
+        string='Inbound Data Source Label', default='other',
+        help="Data Source Label recorded on the provenance of records created/updated by inbound syncs."
+    )
+    # Durable inbound position: page cursor of an unfinished pull + start time of the last complete one
+    sync_inbound_cursor = fields.Char(string='Inbound Page Cursor', readonly=True, copy=False)
+    sync_inbound_since = fields.Datetime(string='Inbound Synced Until', readonly=True, copy=False)
+    # Durable keyset cursor (write_date, id) of the last lead pushed outwards
+    sync_cursor_write_date = fields.Datetime(string='Outbound Cursor Date', readonly=True, copy=False)
+    sync_cursor_res_id = fields.Integer(string='Outbound Cursor Record ID', readonly=True, copy=False)
     # Link to logs directly
     integration_log_ids = fields.One2many('jtbd.integration.log', 'integration_id', string='Integration Logs', readonly=True)
     integration_log_count = fields.Integer(compute='_compute_integration_log_count', string="# Logs")
@@ -179,14 +211,8 @@ class JtbdIntegrationSettings(models.Model):
 
       
     def _compute_integration_log_count(self):
-        """ Compute the number of related log entries using search_count. """
-        log_model = self.env['jtbd.integration.log']
-        for record in self:
-            try:
-                record.integration_log_count = log_model.search_count([('integration_id', '=', record.id)])
-            except Exception as e_sc:
-                _logger.error(f"Error counting logs for integration {record.id}: {e_sc}")
-                record.integration_log_count = 0 # Fallback
+        """ Compute the number of related log entries (one grouped query). """
+        self._jtbd_assign_counts('integration_log_count', 'jtbd.integration.log', 'integration_id')
 
     # --- Action Methods ---
     def action_test_connection(self):
@@ -240,65 +266,19 @@ class JtbdIntegrationSettings(models.Model):
                  'params': {'title': _('Connection Test'), 'message': message, 'sticky': False, 'type': msg_type}}
 
     def action_sync_now(self):
-        """ Action to manually trigger a sync. Ensures logging and status updates. """
+        """ Action to manually trigger a sync. _execute_sync handles logging and status updates. """
         self.ensure_one()
         _logger.info(f"ACTION_SYNC_NOW: Triggered for Integration: {self.name} (ID: {self.id})")
-        sync_status = 'error' # Default to error
-        sync_log_msg = _("Manual sync execution failed.")
-        details_for_log = "Execution did not complete as expected."
-        processed_count = 0 # Track processed items if needed later
-
         try:
-            # --- Call the actual sync logic placeholder ---
-            # We expect _execute_sync to handle its own internal logging and potentially return status/counts
-            # For now, we assume it runs and we simulate a result based on name.
-            self._execute_sync()
-            # --- End Call ---
-
-            # Simulate success/failure based on name for testing
-            if 'fail' not in (self.name or '').lower():
-                sync_status = 'success'
-                sync_log_msg = _("Manual sync completed (Simulated).")
-                details_for_log = "Placeholder simulation ran successfully."
-                # Update last sync time ONLY on success
-                self.last_sync = fields.Datetime.now()
-            else:
-                # Keep status as error if name contains 'fail'
-                sync_log_msg = _("Manual sync FAILED (Simulated based on name).")
-                details_for_log = "Integration name contained 'fail', simulating an error during execution."
-
-            _logger.info(f"ACTION_SYNC_NOW: Sync simulation finished for {self.name}. Status: {sync_status}")
-
+            result = self._execute_sync(auto_commit=False)
+            sync_status, sync_log_msg = result['status'], result['message']
         except Exception as e:
             sync_status = 'error'
             sync_log_msg = _("Manual sync encountered an error: %s") % str(e)
-            details_for_log = str(e)
             _logger.error(f"ACTION_SYNC_NOW: Error during sync execution for {self.name}: {e}", exc_info=True)
-            # Re-raise the error if you want the user to see it immediately
-            # raise UserError(sync_log_msg) from e
-
-        finally:
-            # Always attempt to update status and create a log entry
-            try:
-                self.write({'last_sync_status': sync_status})
-            except Exception as write_e:
-                _logger.error(f"ACTION_SYNC_NOW: Failed to write final sync status for {self.name}: {write_e}")
-
-            log_vals = {
-                'integration_id': self.id,
-                'operation': 'sync', # Could be 'manual_sync'
-                'status': sync_status,
-                'message': sync_log_msg,
-                'details': details_for_log
-            }
-            try:
-                log_entry = self.env['jtbd.integration.log'].create(log_vals)
-                _logger.info(f"ACTION_SYNC_NOW: Created log entry {log_entry.id} for {self.name} with status {sync_status}")
-            except Exception as log_e:
-                _logger.error(f"ACTION_SYNC_NOW: Failed to create integration log entry for {self.name}: {log_e}", exc_info=True)
 
         # Return notification based on final outcome
-        msg_type = 'success' if sync_status == 'success' else 'danger'
+        msg_type = {'success': 'success', 'warning': 'warning'}.get(sync_status, 'danger')
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -333,16 +313,282 @@ class JtbdIntegrationSettings(models.Model):
         return self._notify_success("OAuth flow start not fully implemented.")
 
 
-    def _execute_sync(self):
+    # --- Sync Engine ---
+    def _get_sync_url(self, path):
+        self.ensure_one()
+        if not self.api_endpoint:
+            raise UserError(_("No API Endpoint configured for integration '%s'.") % self.name)
+        return f"{self.api_endpoint.rstrip('/')}/{(path or '').lstrip('/')}"
+
+    def _get_http_session(self):
+        """ requests.Session carrying the authentication of this integration, with a
+        pooled keep-alive connection and retries following the error handling strategy. """
+        self.ensure_one()
+        integration = self.sudo() # Credentials are restricted to base.group_system
+        retries = {'retry_log': 1, 'retry_notify': max(integration.retry_count, 0)}.get(integration.error_handling, 0)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=Retry(
+            total=retries, backoff_factor=0.5, status_forcelist=SYNC_RETRY_STATUSES,
+            allowed_methods=None, raise_on_status=False,
+        ))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+        if integration.auth_method == 'api_key_header':
+            session.headers[integration.api_key_name or 'X-API-Key'] = integration.api_key or ''
+        elif integration.auth_method == 'api_key_param':
+            session.params = {integration.api_key_name or 'api_key': integration.api_key or ''}
+        elif integration.auth_method == 'bearer':
+            session.headers['Authorization'] = f"Bearer {integration.api_key or ''}"
+        elif integration.auth_method == 'basic_auth':
+            session.auth = (integration.auth_user or '', integration.auth_password or '')
+        elif integration.auth_method in ('oauth2_cc', 'oauth2_auth_code') and integration.oauth_access_token:
+            session.headers['Authorization'] = f"Bearer {integration.oauth_access_token}"
+        return session
+
+    def _sync_outbound_leads(self, session, lead_mappings, auto_commit):
+        """ Push the leads changed since the stored cursor, in keyset-paginated batches.
+
+        Each batch is fetched with one query, serialized from the cache and sent
+        in one bulk request; the cursor is then advanced (and committed when
+        ``auto_commit``) so an interrupted run resumes after the last sent batch.
+        A failed batch stops the run, leaving the cursor on the previous batch.
+
+        :return: tuple (processed_count, error_count, error_message or None)
         """
-        Placeholder method simulating the execution of sync logic.
-        This version includes basic structure for fetching data, applying mappings,
-        simulating API calls, and logging.
+        self.ensure_one()
+        lead_model = self.env['crm.lead']
+        field_names = []
+        key_field = False
+        for mapping in lead_mappings:
+            if mapping.odoo_field_name not in lead_model._fields:
+                _logger.warning(f"Integration {self.name}: Field {mapping.odoo_field_name} not found on crm.lead. Skipping mapping {mapping.id}.")
+                continue
+            field_names.append(mapping.odoo_field_name)
+            if mapping.is_key:
+                key_field = mapping.external_field
+        external_names = {m.odoo_field_name: m.external_field for m in lead_mappings}
+        url = self._get_sync_url(self.sync_push_path)
+        batch_size = max(self.sync_batch_size, 1)
+
+        base_domain = [
+            ('write_date', '<=', fields.Datetime.now()), # Leads touched during the run wait for the next one
+            '|', ('company_id', '=', False), ('company_id', '=', self.company_id.id),
+        ]
+        cursor_date, cursor_id = self.sync_cursor_write_date, self.sync_cursor_res_id
+        if not cursor_date and self.last_sync: # Resume from the pre-cursor timestamp
+            cursor_date, cursor_id = self.last_sync, 0
+
+        processed_count = 0
+        while True:
+            domain = list(base_domain)
+            if cursor_date:
+                domain += ['|', ('write_date', '>', cursor_date),
+                           '&', ('write_date', '=', cursor_date), ('id', '>', cursor_id)]
+            leads = lead_model.search_fetch(domain, field_names + ['write_date'], order='write_date, id', limit=batch_size)
+            if not leads:
+                break
+            payloads = []
+            for row in leads.read(field_names, load=None):
+                payload = {'odoo_id': row['id']}
+                payload.update({external_names[fname]: row[fname] for fname in field_names})
+                payloads.append(payload)
+            try:
+                response = session.post(
+                    url, data=json.dumps({'key_field': key_field, 'records': payloads}, default=str),
+                    timeout=SYNC_HTTP_TIMEOUT,
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException as api_e:
+                _logger.error(f"Integration {self.name}: Bulk push of {len(leads)} leads (ids {leads[0].id}..{leads[-1].id}) failed: {api_e}")
+                return processed_count, len(leads), _("Bulk push of leads %(first)s..%(last)s failed: %(error)s",
+                                                       first=leads[0].id, last=leads[-1].id, error=str(api_e))
+
+            processed_count += len(leads)
+            cursor_date, cursor_id = leads[-1].write_date, leads[-1].id
+            self.write({'sync_cursor_write_date': cursor_date, 'sync_cursor_res_id': cursor_id})
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.debug(f"Integration {self.name}: pushed {len(leads)} leads, cursor at ({cursor_date}, {cursor_id}).")
+            self.env.invalidate_all() # Keep memory flat on large backlogs
+            if len(leads) < batch_size:
+                break
+        return processed_count, 0, None
+
+    @api.model
+    def _normalize_inbound_key_value(self, model, field, value):
+        """ Return the comparable form of a key value of ``field``, whether it comes
+        from an external record or from an existing Odoo record. """
+        if field.type == 'many2one':
+            return value.id if isinstance(value, models.BaseModel) else int(value)
+        if field.type in ('char', 'text', 'selection') and not isinstance(value, str):
+            value = str(value)
+        return field.convert_to_cache(value, model, validate=False)
+
+    def _upsert_inbound_records(self, model_name, model_mappings, records):
+        """ Create or update the records of ``model_name`` matching a page of external records.
+
+        Records are matched on the ``is_key`` mappings through an index of the
+        existing keys built with ONE query for the whole page; creates go
+        through one multi-row ``create``, writes are grouped by identical
+        values and the provenance rows are created in bulk.
+
+        :return: tuple (processed_count, skipped_count)
+        """
+        self.ensure_one()
+        model = self.env[model_name].with_context(active_test=False, tracking_disable=True)
+        key_mappings = model_mappings.filtered('is_key')
+        key_fnames = key_mappings.mapped('odoo_field_name')
+        for fname in key_fnames:
+            field = model._fields.get(fname)
+            if not field or not field.store or field.type in ('one2many', 'many2many', 'binary'):
+                raise UserError(_(
+                    "Field '%(field)s' cannot be used as a key to match inbound records of model %(model)s.",
+                    field=fname, model=model_name,
+                ))
+        field_map = [(m.external_field, m.odoo_field_name, m.default_value) for m in model_mappings
+                     if m.odoo_field_name in model._fields]
+
+        # Map the page, de-duplicated on the external key (last occurrence wins)
+        # Keys are normalized to their cache value on both sides (ids for many2one,
+        # ints for numeric ids sent as strings, ...) so incoming and existing keys compare equal
+        key_fields = [model._fields[fname] for fname in key_fnames]
+        vals_by_key = {}
+        skipped_count = 0
+        for record in records:
+            key = tuple(record.get(m.external_field) for m in key_mappings)
+            if any(value in (None, False, '') for value in key):
+                skipped_count += 1
+                continue
+            try:
+                key = tuple(self._normalize_inbound_key_value(model, field, value)
+                            for field, value in zip(key_fields, key))
+            except (TypeError, ValueError):
+                skipped_count += 1
+                continue
+            vals_by_key[key] = {
+                fname: record.get(external_field) if record.get(external_field) not in (None, '') else default_value or False
+                for external_field, fname, default_value in field_map
+            }
+        if not vals_by_key:
+            return 0, skipped_count
+
+        # Index of the existing keys: one query for the whole page
+        domain = []
+        for position, fname in enumerate(key_fnames):
+            domain.append((fname, 'in', list({key[position] for key in vals_by_key})))
+        existing = model.search_fetch(domain, key_fnames)
+        id_by_key = {
+            tuple(self._normalize_inbound_key_value(model, field, rec[field.name]) for field in key_fields): rec.id
+            for rec in existing
+        }
+
+        to_create_keys, to_create = [], []
+        write_groups = {} # Records receiving identical values share one write
+        for key, vals in vals_by_key.items():
+            record_id = id_by_key.get(key)
+            if record_id:
+                group = write_groups.setdefault(json.dumps(vals, sort_keys=True, default=str), (vals, []))
+                group[1].append(record_id)
+            else:
+                to_create_keys.append(key)
+                to_create.append(vals)
+        created = model.create(to_create) if to_create else model
+        for vals, record_ids in write_groups.values():
+            model.browse(record_ids).write(vals)
+
+        # Provenance of every created/updated record, in bulk
+        now = fields.Datetime.now()
+        res_model_id = self.env['ir.model']._get_id(model_name)
+        key_by_id = dict(zip(created.ids, to_create_keys))
+        key_by_id.update({record_id: key for key, record_id in id_by_key.items() if key in vals_by_key})
+        self.env['jtbd.data.provenance'].sudo().create([{
+            'res_model_id': res_model_id,
+            'res_id': record_id,
+            'data_source_label': self.inbound_data_source_label or 'other',
+            'source_reference': '/'.join(str(value) for value in key),
+            'integration_setting_id': self.id,
+            'ingestion_datetime': now,
+            'record_write_date': now,
+        } for record_id, key in key_by_id.items()])
+        return len(key_by_id), skipped_count
+
+    def _sync_inbound(self, session, inbound_mappings, auto_commit):
+        """ Pull the external records changed since the last complete pull, page by page,
+        and upsert them into every mapped model. The page cursor is stored (and committed
+        when ``auto_commit``) after each page so an interrupted pull resumes where it stopped.
+
+        :return: tuple (processed_count, error_count, error_message or None)
+        """
+        self.ensure_one()
+        url = self._get_sync_url(self.sync_pull_path)
+        mappings_by_model = defaultdict(lambda: self.env['jtbd.integration.field.mapping'])
+        for mapping in inbound_mappings:
+            mappings_by_model[mapping.odoo_model_id.model] |= mapping
+        error_messages = []
+        for model_name, model_mappings in list(mappings_by_model.items()):
+            if not model_mappings.filtered('is_key'):
+                error_messages.append(_("No key field mapped for model %s: inbound records cannot be matched.", model_name))
+                del mappings_by_model[model_name]
+        if not mappings_by_model:
+            return 0, len(error_messages), '\n'.join(error_messages) or None
+
+        started_at = fields.Datetime.now()
+        processed_count = error_count = 0
+        page_cursor = self.sync_inbound_cursor
+        while True:
+            params = {'limit': max(self.sync_batch_size, 1)}
+            if self.sync_inbound_since:
+                params['updated_since'] = fields.Datetime.to_string(self.sync_inbound_since)
+            if page_cursor:
+                params['cursor'] = page_cursor
+            try:
+                response = session.get(url, params=params, timeout=SYNC_HTTP_TIMEOUT)
+                response.raise_for_status()
+                page = response.json()
+            except (requests.exceptions.RequestException, ValueError) as pull_e:
+                _logger.error(f"Integration {self.name}: Inbound pull failed (cursor {page_cursor}): {pull_e}")
+                error_messages.append(_("Inbound pull failed: %s", str(pull_e)))
+                return processed_count, error_count + 1, '\n'.join(error_messages)
+            records = page.get('records', []) if isinstance(page, dict) else page
+            page_cursor = page.get('next_cursor') if isinstance(page, dict) else False
+
+            for model_name, model_mappings in mappings_by_model.items():
+                upserted, skipped = self._upsert_inbound_records(model_name, model_mappings, records)
+                processed_count += upserted
+                error_count += skipped
+            if page_cursor:
+                self.write({'sync_inbound_cursor': page_cursor})
+            else: # Last page: the next pull only asks for changes since this run started
+                self.write({'sync_inbound_cursor': False, 'sync_inbound_since': started_at})
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all() # Keep memory flat on large pulls
+            if not page_cursor or not records:
+                break
+        if error_count:
+            error_messages.append(_("%s inbound record(s) skipped: missing key value.", error_count))
+        return processed_count, error_count, '\n'.join(error_messages) or None
+
+    def action_reset_sync_cursor(self):
+        """ Restart the next syncs from the first record, in both directions. """
+        self.write({
+            'sync_cursor_write_date': False, 'sync_cursor_res_id': 0, 'last_sync': False,
+            'sync_inbound_cursor': False, 'sync_inbound_since': False,
+        })
+
+    def _execute_sync(self, auto_commit=True):
+        """ Run the synchronization of this integration in every mapped direction.
+
+        Writes one summary integration log per run and updates the sync status.
+        :param bool auto_commit: commit after each batch so an interrupted run resumes where it
+            stopped (scheduled runs); disabled when called from the UI, which runs in the request transaction
+        :return: dict with the final 'status' and summary 'message'
         """
         self.ensure_one()
         _logger.info(f"Executing sync logic for Integration: {self.name} (ID: {self.id})")
-        log_entries = [] # Collect log entries to create at the end
-        sync_status = 'success' # Assume success initially
+        auto_commit = auto_commit and not getattr(threading.current_thread(), 'testing', False)
+        error_messages = []
         error_count = 0
         processed_count = 0
 
@@ -353,104 +599,37 @@ class JtbdIntegrationSettings(models.Model):
 
         _logger.debug(f"Integration {self.name}: Syncing models { [m.model for m in models_to_sync] } in directions {list(set(directions_to_sync))}")
 
-        # --- Example: Syncing crm.lead data OUT ('odoo_to_external') ---
+        # --- Syncing crm.lead data OUT ('odoo_to_external') ---
         if 'odoo_to_external' in directions_to_sync or 'bidirectional' in directions_to_sync:
-            lead_model = self.env['crm.lead']
-            # Define relevant fields based on mappings for this model/direction
             lead_mappings = mappings.filtered(lambda m: m.odoo_model_id.model == 'crm.lead' and m.direction in ('odoo_to_external', 'bidirectional'))
             if lead_mappings:
-                odoo_field_names = lead_mappings.mapped('odoo_field_name') # Fields to read from Odoo
-                # Find leads modified since last sync (or all if no last sync)
-                # Add state filter if needed
-                domain = [('write_date', '>', self.last_sync)] if self.last_sync else []
-                # Add company check
-                domain.append('|')
-                domain.append(('company_id', '=', False))
-                domain.append(('company_id', '=', self.company_id.id))
-
-                leads_to_sync = lead_model.search(domain, limit=100) # Limit batch size
-                _logger.info(f"Integration {self.name}: Found {len(leads_to_sync)} leads to sync outwards.")
-
-                for lead in leads_to_sync:
-                    processed_count += 1
-                    payload = {'odoo_id': lead.id}
-                    external_key_field = False
-                    external_key_value = None
-
-                    # Build payload based on mappings
-                    for mapping in lead_mappings:
-                        try:
-                            payload[mapping.external_field] = getattr(lead, mapping.odoo_field_name)
-                            if mapping.is_key:
-                                external_key_field = mapping.external_field
-                                external_key_value = payload[mapping.external_field]
-                        except AttributeError:
-                             _logger.warning(f"Field {mapping.odoo_field_name} not found on lead {lead.id}. Skipping.")
-                        except Exception as prep_e:
-                            _logger.error(f"Error preparing payload for lead {lead.id}, mapping {mapping.id}: {prep_e}")
-                            error_count += 1
-                            continue # Skip this mapping for this lead
-
-                    # Simulate API Call (e.g., Update/Create external record)
-                    api_call_successful = False
-                    api_error_msg = None
-                    try:
-                        _logger.debug(f"Integration {self.name}: Simulating external API call for lead {lead.id}. Payload: {payload}")
-                        # --- Placeholder for actual API call ---
-                        # if external_key_value: # Found key, attempt update
-                        #    # response = requests.put(f"{self.api_endpoint}/contacts/{external_key_value}", json=payload, ...)
-                        # else: # No key, attempt create
-                        #    # response = requests.post(f"{self.api_endpoint}/contacts", json=payload, ...)
-                        # response.raise_for_status()
-                        # api_call_successful = True
-                        # --- End Placeholder ---
-                        api_call_successful = True # Simulate success
-
-                    except Exception as api_e:
-                         _logger.error(f"Integration {self.name}: Simulated API call FAILED for lead {lead.id}: {api_e}", exc_info=True)
-                         api_call_successful = False
-                         api_error_msg = str(api_e)
-                         error_count += 1
-
-                    # Log result for this record
-                    log_entries.append({
-                        'integration_id': self.id, 'operation': 'push', 'status': 'success' if api_call_successful else 'error',
-                        'message': f"Simulated push for Lead {lead.id} ({lead.name}) " + ("succeeded." if api_call_successful else "failed."),
-                        'related_res_model': 'crm.lead', 'related_res_id': lead.id,
-                        'details': api_error_msg or json.dumps(payload, indent=2, default=str) # Log payload or error
-                    })
-
-        # --- Example: Syncing data IN ('external_to_odoo') ---
+                try:
+                    with self._get_http_session() as session:
+                        pushed, failed, error_msg = self._sync_outbound_leads(session, lead_mappings, auto_commit)
+                    processed_count += pushed
+                    error_count += failed
+                    if error_msg:
+                        error_messages.append(error_msg)
+                except UserError as config_e:
+                    error_count += 1
+                    error_messages.append(str(config_e))
+                _logger.info(f"Integration {self.name}: Pushed {processed_count} leads outwards.")
+
+        # --- Syncing data IN ('external_to_odoo') ---
         if 'external_to_odoo' in directions_to_sync or 'bidirectional' in directions_to_sync:
-            _logger.info(f"Integration {self.name}: Simulating fetch and update for incoming data (Placeholder).")
-            # --- Placeholder for fetching external data ---
-            # try:
-            #    # response = requests.get(f"{self.api_endpoint}/leads?updated_since={self.last_sync}", ...)
-            #    # response.raise_for_status()
-            #    # external_data_list = response.json()
-            #    external_data_list = [{'external_id': 123, 'hs_job_category': 'team_efficiency', 'odoo_id': 1}] # Simulate fetched data
-            #    processed_count += len(external_data_list)
-            #
-            #    for external_data in external_data_list:
-            #       # Find mapping keys
-            #       key_mapping = mappings.filtered(lambda m: m.is_key and m.direction in ('external_to_odoo', 'bidirectional'))
-            #       odoo_record = False
-            #       # Find matching Odoo record based on keys
-            #       # ... logic to match records ...
-            #       vals_to_write = {}
-            #       # Map external fields to Odoo fields based on mappings
-            #       # ... logic to build vals_to_write ...
-            #       # Update or create Odoo record
-            #       # ... logic to write/create ...
-            #       # Log result
-            #       log_entries.append({...})
-            #
-            # except Exception as pull_e:
-            #    _logger.error(f"Integration {self.name}: Error during pull/update: {pull_e}", exc_info=True)
-            #    error_count += 1
-            #    log_entries.append({... error log ...})
-            # --- End Placeholder ---
-            pass # No actual pull logic implemented in this phase
+            inbound_mappings = mappings.filtered(lambda m: m.direction in ('external_to_odoo', 'bidirectional') and m.odoo_model_id)
+            if inbound_mappings:
+                try:
+                    with self._get_http_session() as session:
+                        pulled, failed, error_msg = self._sync_inbound(session, inbound_mappings, auto_commit)
+                    processed_count += pulled
+                    error_count += failed
+                    if error_msg:
+                        error_messages.append(error_msg)
+                    _logger.info(f"Integration {self.name}: Upserted {pulled} records from inbound pull.")
+                except UserError as config_e:
+                    error_count += 1
+                    error_messages.append(str(config_e))
 
         # --- Final Logging & Status Update ---
         final_sync_status = 'success' if error_count == 0 else ('warning' if processed_count > 0 else 'error')
@@ -473,18 +652,22 @@ class JtbdIntegrationSettings(models.Model):
         else:
              _logger.info(f"Integration {self.name}: {summary_message}")
 
-        # Create log entries in batch if possible
-        if log_entries:
-            try:
-                self.env['jtbd.integration.log'].create(log_entries)
-            except Exception as log_create_e:
-                 _logger.error(f"Error creating batch log entries for integration {self.name}: {log_create_e}")
+        # One summary log per run (not one per record)
+        try:
+            self.env['jtbd.integration.log'].create({
+                'integration_id': self.id, 'operation': 'sync', 'status': final_sync_status,
+                'message': summary_message,
+                'details': '\n'.join(error_messages) or False,
+            })
+        except Exception as log_create_e:
+             _logger.error(f"Error creating sync log entry for integration {self.name}: {log_create_e}")
 
         # Update the integration setting record's status
         self.write({
             'last_sync': fields.Datetime.now(),
             'last_sync_status': final_sync_status
         })
+        return {'status': final_sync_status, 'message': summary_message}
 
     # Inside JtbdIntegrationSettings class in models/jtbd_integration_settings.py
 
@@ -1,5 +1,32 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+import logging
+from datetime import datetime
+
+from odoo import models, fields, api, tools, _
+
+_logger = logging.getLogger(__name__)
+
+# Exponential decay of intent: a signal weighs half as much every INTENT_HALF_LIFE_DAYS.
+# Scores are stored "anchored" at INTENT_DECAY_EPOCH (score * 2^((t - epoch) / half-life)):
+# the decay factor at read time is common to every lead, so anchored sums only need to be
+# incremented when signals arrive, and ordering by them ranks leads by their current score.
+INTENT_HALF_LIFE_DAYS = 14
+INTENT_DECAY_EPOCH = datetime(2025, 1, 1)
+# Fields feeding the rollup (changing them moves the signal between rollup rows)
+INTENT_ROLLUP_FIELDS = {'lead_id', 'signal_type', 'timestamp', 'score'}
+
+
+def _anchored_weight_sql(timestamp_column):
+    """ SQL expression of the anchored decay weight of a signal timestamp. """
+    return (f"power(2.0::float8, extract(epoch FROM {timestamp_column} - %(epoch)s::timestamp)::float8 "
+            f"/ {INTENT_HALF_LIFE_DAYS * 86400.0})")
+
+
+def intent_decay_factor(now=None):
+    """ Factor converting anchored intent scores to their value at ``now``. """
+    elapsed = ((now or fields.Datetime.now()) - INTENT_DECAY_EPOCH).total_seconds()
+    return 2.0 ** (-elapsed / (INTENT_HALF_LIFE_DAYS * 86400.0))
+
 
 class JtbdIntentSignal(models.Model):
     _name = 'jtbd.intent.signal'
@@ -52,26 +79,156 @@ class JtbdIntentSignal(models.Model):
     # Could add user_id who logged it if manual
     # user_id = fields.Many2one('res.users', string='Logged By', default=lambda self: self.env.user)
     
+    def init(self):
+        super().init()
+        # Lead journey timeline (crm.lead.get_jtbd_journey_timeline): newest signals of one lead first
+        tools.create_index(self.env.cr, 'jtbd_intent_signal_lead_timestamp_idx', self._table,
+                           ['lead_id', 'timestamp DESC', 'id DESC'])
+
     @api.model_create_multi
     def create(self, vals_list):
         signals = super().create(vals_list)
-        # Create corresponding Journey Event
-        journey_event_model = self.env['jtbd.unified.journey.event']
-        for signal in signals:
-            try:
-                journey_event_model.create({
-                    'lead_id': signal.lead_id.id,
-                    'event_datetime': signal.timestamp,
-                    'event_type': 'intent_signal',
-                    'source_system': 'odoo_jtbd', # Or derive from signal.source if more granular
-                    'channel': signal.signal_type, # Use signal type as channel? Or source?
-                    'description': f"Intent Signal: {signal.activity or signal.name}",
-                    'related_record_ref': f'{signal._name},{signal.id}',
-                    'details_json': signal.details, # Pass details
-                })
-            except Exception as e:
-                 _logger.error(f"Failed to create Journey Event for Intent Signal {signal.id}: {e}", exc_info=True)
+        # Queue the corresponding Journey Events (inserted in bulk before commit)
+        self.env['jtbd.unified.journey.event']._log_events([{
+            'lead_id': signal.lead_id.id,
+            'event_datetime': signal.timestamp,
+            'event_type': 'intent_signal',
+            'source_system': 'odoo_jtbd', # Or derive from signal.source if more granular
+            'channel': signal.signal_type, # Use signal type as channel? Or source?
+            'description': f"Intent Signal: {signal.activity}",
+            'related_record_ref': f'{signal._name},{signal.id}',
+            'details_json': signal.details, # Pass details
+        } for signal in signals])
+        signals._update_intent_rollup()
         return signals
 
+    def write(self, vals):
+        rollup_changed = bool(INTENT_ROLLUP_FIELDS.intersection(vals))
+        if rollup_changed:
+            self._update_intent_rollup(sign=-1)
+        res = super().write(vals)
+        if rollup_changed:
+            self._update_intent_rollup()
+        return res
+
+    def unlink(self):
+        self._update_intent_rollup(sign=-1)
+        return super().unlink()
+
+    # --- Intent Rollup (jtbd.intent.signal.rollup and crm.lead intent fields) ---
+    def _update_intent_rollup(self, sign=1):
+        """ Add (sign=1) or remove (sign=-1) the signals of ``self`` to/from the
+        per lead x signal type x day rollup and the lead intent fields, with one
+        upsert and one lead UPDATE for the whole recordset. """
+        if not self:
+            return
+        self.flush_recordset(list(INTENT_ROLLUP_FIELDS))
+        cr = self.env.cr
+        rollup_table = self.env['jtbd.intent.signal.rollup']._table
+        params = {'ids': self.ids, 'sign': sign, 'epoch': INTENT_DECAY_EPOCH, 'uid': self.env.uid}
+        cr.execute(f"""
+            INSERT INTO {rollup_table} AS r (lead_id, signal_type, day, signal_count, score_sum, anchored_score,
+                                             create_uid, write_uid, create_date, write_date)
+            SELECT lead_id, signal_type, timestamp::date, %(sign)s * count(*), %(sign)s * sum(coalesce(score, 0)),
+                   %(sign)s * sum(coalesce(score, 0) * {_anchored_weight_sql('timestamp')}),
+                   %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM {self._table}
+             WHERE id = ANY(%(ids)s)
+          GROUP BY lead_id, signal_type, timestamp::date
+            ON CONFLICT (lead_id, signal_type, day) DO UPDATE
+               SET signal_count = r.signal_count + EXCLUDED.signal_count,
+                   score_sum = r.score_sum + EXCLUDED.score_sum,
+                   anchored_score = r.anchored_score + EXCLUDED.anchored_score,
+                   write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+        """, params)
+        if sign < 0:
+            cr.execute(f"DELETE FROM {rollup_table} WHERE signal_count <= 0 AND lead_id IN (SELECT lead_id FROM {self._table} WHERE id = ANY(%(ids)s))", params)
+        # Last signal date: removed signals may have been the latest one, so recompute it from the other signals
+        last_date_sql = ("GREATEST(l.jtbd_intent_last_signal_date, d.last_date)" if sign > 0 else
+                         f"(SELECT max(s.timestamp) FROM {self._table} s WHERE s.lead_id = l.id AND s.id != ALL(%(ids)s))")
+        cr.execute(f"""
+            UPDATE crm_lead l
+               SET jtbd_intent_anchored_score = coalesce(l.jtbd_intent_anchored_score, 0) + d.anchored_score,
+                   jtbd_intent_signal_count = coalesce(l.jtbd_intent_signal_count, 0) + d.signal_count,
+                   jtbd_intent_last_signal_date = {last_date_sql}
+              FROM (SELECT lead_id, %(sign)s * count(*) AS signal_count, max(timestamp) AS last_date,
+                           %(sign)s * sum(coalesce(score, 0) * {_anchored_weight_sql('timestamp')}) AS anchored_score
+                      FROM {self._table}
+                     WHERE id = ANY(%(ids)s)
+                  GROUP BY lead_id) d
+             WHERE l.id = d.lead_id
+        """, params)
+        self.env['crm.lead'].invalidate_model(['jtbd_intent_anchored_score', 'jtbd_intent_signal_count', 'jtbd_intent_last_signal_date'])
+        self.env['jtbd.intent.signal.rollup'].invalidate_model()
+
+    @api.model
+    def _rebuild_intent_rollup(self):
+        """ Bulk backfill: rebuild the rollup and the lead intent fields from all raw signals. """
+        self.env.flush_all()
+        cr = self.env.cr
+        rollup_table = self.env['jtbd.intent.signal.rollup']._table
+        params = {'epoch': INTENT_DECAY_EPOCH, 'uid': self.env.uid}
+        cr.execute(f"DELETE FROM {rollup_table}")
+        cr.execute(f"""
+            INSERT INTO {rollup_table} (lead_id, signal_type, day, signal_count, score_sum, anchored_score,
+                                        create_uid, write_uid, create_date, write_date)
+            SELECT lead_id, signal_type, timestamp::date, count(*), sum(coalesce(score, 0)),
+                   sum(coalesce(score, 0) * {_anchored_weight_sql('timestamp')}),
+                   %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM {self._table}
+          GROUP BY lead_id, signal_type, timestamp::date
+        """, params)
+        rollup_count = cr.rowcount
+        cr.execute("""
+            UPDATE crm_lead
+               SET jtbd_intent_anchored_score = NULL, jtbd_intent_signal_count = NULL, jtbd_intent_last_signal_date = NULL
+             WHERE jtbd_intent_anchored_score IS NOT NULL OR jtbd_intent_signal_count IS NOT NULL
+        """)
+        cr.execute(f"""
+            UPDATE crm_lead l
+               SET jtbd_intent_anchored_score = d.anchored_score,
+                   jtbd_intent_signal_count = d.signal_count,
+                   jtbd_intent_last_signal_date = d.last_date
+              FROM (SELECT lead_id, count(*) AS signal_count, max(timestamp) AS last_date,
+                           sum(coalesce(score, 0) * {_anchored_weight_sql('timestamp')}) AS anchored_score
+                      FROM {self._table}
+                  GROUP BY lead_id) d
+             WHERE l.id = d.lead_id
+        """, params)
+        self.env.invalidate_all()
+        _logger.info(f"JTBD Intent Rollup: rebuilt {rollup_count} rollup rows for {cr.rowcount} leads.")
+        return rollup_count
+
+    @api.model
+    def action_rebuild_intent_rollup(self):
+        count = self._rebuild_intent_rollup()
+        return {'type': 'ir.actions.client', 'tag': 'display_notification',
+                'params': {'title': _('Intent Rollup'), 'message': _("%s rollup rows rebuilt.", count),
+                           'sticky': False, 'type': 'success'}}
+
     # Optional: Override write? More complex - need to track changes.
-    # Optional: Override unlink? Delete corresponding journey event?
\ No newline at end of file
+    # Optional: Override unlink? Delete corresponding journey event?
+
+
+class JtbdIntentSignalRollup(models.Model):
+    _name = 'jtbd.intent.signal.rollup'
+    _description = 'JTBD Intent Signal Daily Rollup'
+    _order = 'day desc, id desc'
+
+    # Maintained in SQL by jtbd.intent.signal (_update_intent_rollup / _rebuild_intent_rollup)
+    lead_id = fields.Many2one('crm.lead', string='Opportunity/Lead', required=True, readonly=True, ondelete='cascade')
+    signal_type = fields.Selection(
+        selection=lambda self: self.env['jtbd.intent.signal']._fields['signal_type'].selection,
+        string='Signal Type', required=True, readonly=True
+    )
+    day = fields.Date(string='Day', required=True, readonly=True, index=True)
+    signal_count = fields.Integer(string='Signals', readonly=True, aggregator='sum')
+    score_sum = fields.Integer(string='Total Score', readonly=True, aggregator='sum')
+    anchored_score = fields.Float(
+        string='Anchored Decayed Score', readonly=True, aggregator='sum',
+        help="Sum of the signal scores weighted by 2^((timestamp - decay epoch) / half-life)."
+    )
+
+    _sql_constraints = [
+        ('lead_type_day_uniq', 'unique(lead_id, signal_type, day)', 'Only one rollup row per lead, signal type and day.'),
+    ]
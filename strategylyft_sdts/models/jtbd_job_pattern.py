@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _ # Added api, _
+from odoo import models, fields, api, tools, _ # Added api, _
 import logging # Added logging
+from .jtbd_pattern_matcher import JobPatternIndex, tokenize
 _logger = logging.getLogger(__name__) # Added logger
 
+# Fields read into the match index: changing them rebuilds it
+JOB_PATTERN_INDEX_FIELDS = {
+    'name', 'description', 'situation_template', 'motivation_template', 'outcome_template',
+    'applicable_agency_type_ids', 'applicable_tech_stack_ids', 'job_category_id', 'sequence', 'active',
+}
+
 
 class JtbdJobPattern(models.Model):
     _name = 'jtbd.job.pattern'
     _description = 'JTBD Pattern'
+    _inherit = ['jtbd.trace.link.mixin']
     _order = 'sequence, name'
 
     name = fields.Char(
@@ -77,18 +85,7 @@ class JtbdJobPattern(models.Model):
     jtbd_trace_link_count = fields.Integer(compute='_compute_trace_link_count', string="# Trace Links")
 
     def _compute_trace_link_count(self):
-        TraceLink = self.env['jtbd.trace.link']
-        trace_link_model_id = self.env['ir.model']._get_id(self._name)
-        if not trace_link_model_id:
-            for record in self: record.jtbd_trace_link_count = 0
-            return
-        for record in self:
-            try:
-                count = TraceLink.search_count([ ('source_model_id', '=', trace_link_model_id), ('source_res_id', '=', record.id) ])
-                record.jtbd_trace_link_count = count
-            except Exception as e:
-                 _logger.error(f"Error counting trace links for Job Pattern {record.id}: {e}", exc_info=True)
-                 record.jtbd_trace_link_count = 0
+        self._jtbd_assign_trace_link_counts('jtbd_trace_link_count')
 
     def action_open_trace_links(self):
         self.ensure_one()
@@ -97,4 +94,61 @@ class JtbdJobPattern(models.Model):
             'name': _('Create Trace Link for Job Pattern'), 'type': 'ir.actions.act_window',
             'res_model': 'jtbd.create.trace.link.wizard', 'view_mode': 'form', 'target': 'new',
             'context': { 'default_source_model_id': source_model_id, 'default_source_res_id': self.id,
-                         'default_name': f'Link for Pattern: {self.name[:30]}...' }}
\ No newline at end of file
+                         'default_name': f'Link for Pattern: {self.name[:30]}...' }}
+
+    # --- Pattern Match Index (see jtbd_pattern_matcher) ---
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_match_index(self):
+        """ TF-IDF index of the active patterns, cached in the registry per language
+        and cleared whenever patterns (or their agency types / tech stacks) change. """
+        patterns = self.sudo().search_fetch([], [
+            'name', 'description', 'situation_template', 'motivation_template', 'outcome_template',
+            'job_category_id', 'applicable_agency_type_ids', 'applicable_tech_stack_ids',
+        ])
+        index = JobPatternIndex(
+            (pattern.id, pattern.job_category_id.id, tokenize(
+                pattern.name, pattern.description, pattern.situation_template,
+                pattern.motivation_template, pattern.outcome_template,
+                *pattern.applicable_agency_type_ids.mapped('name'),
+                *pattern.applicable_tech_stack_ids.mapped('name'),
+            ))
+            for pattern in patterns
+        )
+        _logger.info(f"JTBD Pattern Matcher: indexed {len(index)} job patterns ({len(index.postings)} terms).")
+        return index
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        patterns = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return patterns
+
+    def write(self, vals):
+        res = super().write(vals)
+        if JOB_PATTERN_INDEX_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    def _cron_rematch_leads(self):
+        count = self.env['crm.lead']._jtbd_rematch_job_patterns()
+        # One-shot job: the cron is enabled again by the next re-match request
+        self.env['ir.cron']._notify_progress(done=count, remaining=0, deactivate=True)
+
+    def action_rematch_leads(self):
+        """ Re-match every lead against the current patterns (matches are only
+        recomputed automatically when the lead itself changes), in the background. """
+        cron = self.env.ref('jtbd_odoo_crm.ir_cron_jtbd_job_pattern_rematch').sudo()
+        cron.try_write({'active': True}) # Already active (and locked) when a run is in progress
+        cron._trigger()
+        return {
+            'type': 'ir.actions.client', 'tag': 'display_notification',
+            'params': {'title': _('Job Patterns'), 'message': _("Re-matching of all leads scheduled: it runs in the background."),
+                       'type': 'success', 'sticky': False},
+        }
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+
+# Responses that stop the outbound sequences of the lead
+OUTBOUND_STOP_RESPONSES = ('replied_pos', 'replied_neg', 'meeting_booked', 'unsubscribed')
 
 class JtbdOutboundEngagement(models.Model):
     _name = 'jtbd.outbound.engagement'
@@ -7,9 +10,9 @@ class JtbdOutboundEngagement(models.Model):
     _order = 'engagement_datetime desc'
 
     lead_id = fields.Many2one('crm.lead', string='Opportunity/Lead', required=True, ondelete='cascade', index=True)
-    # Optional: Link to specific sequence/step that triggered this
-    # sequence_id = fields.Many2one('jtbd.outbound.sequence', string='Sequence Template')
-    # step_id = fields.Many2one('jtbd.outbound.step', string='Step Template')
+    # Sequence/step that triggered this engagement (set by the outbound scheduler)
+    sequence_id = fields.Many2one('jtbd.outbound.sequence', string='Sequence Template', ondelete='set null')
+    step_id = fields.Many2one('jtbd.outbound.step', string='Step Template', ondelete='set null')
     channel = fields.Selection([('email', 'Email'), ('linkedin', 'LinkedIn'), ('call', 'Call'), ('meeting', 'Meeting'), ('other', 'Other')], string='Channel', required=True, index=True)
     engagement_datetime = fields.Datetime(string='Engagement Time', default=fields.Datetime.now, required=True, index=True)
     summary = fields.Char(string='Engagement Summary', required=True, help="e.g., Sent Connection Request, Left Voicemail, Email Opened")
@@ -19,23 +22,40 @@ class JtbdOutboundEngagement(models.Model):
 
     # Link outbound engagement back to the unified journey log eventually
     
+    def init(self):
+        super().init()
+        # Lead journey timeline (crm.lead.get_jtbd_journey_timeline): newest engagements of one lead first
+        tools.create_index(self.env.cr, 'jtbd_outbound_engagement_lead_datetime_idx', self._table,
+                           ['lead_id', 'engagement_datetime DESC', 'id DESC'])
+
     @api.model_create_multi
     def create(self, vals_list):
         engagements = super().create(vals_list)
-        # Create corresponding Journey Event
-        journey_event_model = self.env['jtbd.unified.journey.event']
-        for eng in engagements:
-            try:
-                journey_event_model.create({
-                    'lead_id': eng.lead_id.id,
-                    'event_datetime': eng.engagement_datetime,
-                    'event_type': 'outbound_touch' if not eng.response_type or eng.response_type == 'none' else 'outbound_response',
-                    'source_system': 'outbound_seq', # Assuming created by external system
-                    'channel': eng.channel,
-                    'description': f"Outbound {eng.channel}: {eng.summary or eng.name}",
-                    'related_record_ref': f'{eng._name},{eng.id}',
-                    'details_json': eng.response_details,
-                })
-            except Exception as e:
-                 _logger.error(f"Failed to create Journey Event for Outbound Engagement {eng.id}: {e}", exc_info=True)
-        return engagements
\ No newline at end of file
+        # Queue the corresponding Journey Events (inserted in bulk before commit)
+        self.env['jtbd.unified.journey.event']._log_events([{
+            'lead_id': eng.lead_id.id,
+            'event_datetime': eng.engagement_datetime,
+            'event_type': 'outbound_touch' if not eng.response_type or eng.response_type == 'none' else 'outbound_response',
+            'source_system': 'outbound_seq', # Assuming created by external system
+            'channel': eng.channel,
+            'description': f"Outbound {eng.channel}: {eng.summary}",
+            'related_record_ref': f'{eng._name},{eng.id}',
+            'details_json': eng.response_details,
+        } for eng in engagements])
+        engagements._stop_lead_sequences()
+        return engagements
+
+    def write(self, vals):
+        res = super().write(vals)
+        # The response is usually recorded after the scheduler created the engagement
+        if vals.get('response_type') in OUTBOUND_STOP_RESPONSES:
+            self._stop_lead_sequences()
+        return res
+
+    def _stop_lead_sequences(self):
+        """ A reply ends the running sequences of the lead. """
+        replied_leads = self.filtered(lambda eng: eng.response_type in OUTBOUND_STOP_RESPONSES).lead_id
+        if replied_leads:
+            self.env['jtbd.outbound.enrollment'].search([('lead_id', 'in', replied_leads.ids), ('state', '=', 'running')]).write({
+                'state': 'stopped', 'next_due_date': False, 'stop_reason': _("Lead responded"),
+            })
\ No newline at end of file
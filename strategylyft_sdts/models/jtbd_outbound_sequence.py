@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import models, fields, api, tools, _
+
+_logger = logging.getLogger(__name__)
+
+# Due enrollments processed (and committed) per chunk by the scheduler
+OUTBOUND_SCHEDULER_BATCH_SIZE = 1000
 
 class JtbdOutboundSequence(models.Model):
     _name = 'jtbd.outbound.sequence'
     _description = 'JTBD Outbound Engagement Sequence Template'
+    _inherit = ['jtbd.related.count.mixin']
     _order = 'name'
 
     name = fields.Char(string='Sequence Name', required=True, index=True)
@@ -15,13 +25,47 @@ class JtbdOutboundSequence(models.Model):
     target_job_category_ids = fields.Many2many('jtbd.job.category', string='Target Job Categories')
     target_account_tier = fields.Selection([('strategic', 'Strategic'), ('target', 'Target')], string='Target Account Tier')
 
+    enrollment_ids = fields.One2many('jtbd.outbound.enrollment', 'sequence_id', string='Enrollments')
+
     # Count leads currently using this sequence (for reporting)
     active_lead_count = fields.Integer(compute='_compute_active_lead_count')
 
     def _compute_active_lead_count(self):
-        # Placeholder: Real count might need linking lead back to sequence instance, not just template ID
-        for seq in self:
-            seq.active_lead_count = 0 # Update later if lead tracks active sequence
+        """ Running enrollments, counted with one grouped query (see jtbd.related.count.mixin). """
+        self._jtbd_assign_counts('active_lead_count', 'jtbd.outbound.enrollment', 'sequence_id', domain=[('state', '=', 'running')])
+
+    def _enroll_leads(self, leads):
+        """ Start the sequence for ``leads`` (leads already enrolled are skipped).
+
+        :return: the new jtbd.outbound.enrollment records
+        """
+        self.ensure_one()
+        first_step = self.step_ids[:1]
+        if not first_step or not leads:
+            return self.env['jtbd.outbound.enrollment']
+        enrolled = self.env['jtbd.outbound.enrollment'].search_fetch(
+            [('sequence_id', '=', self.id), ('lead_id', 'in', leads.ids)], ['lead_id'])
+        now = fields.Datetime.now()
+        return self.env['jtbd.outbound.enrollment'].create([{
+            'sequence_id': self.id,
+            'lead_id': lead_id,
+            'enrollment_date': now,
+            'next_step_id': first_step.id,
+            'next_due_date': now + timedelta(days=first_step.delay_days),
+        } for lead_id in set(leads.ids) - set(enrolled.lead_id.ids)])
+
+    def action_enroll_targeted_leads(self):
+        """ Enroll the open opportunities flagged for outbound that match the sequence targets. """
+        self.ensure_one()
+        domain = [('jtbd_is_outbound_targeted', '=', True), ('probability', '<', 100)]
+        if self.target_job_category_ids:
+            domain.append(('jtbd_job_category_id', 'in', self.target_job_category_ids.ids))
+        if self.target_account_tier:
+            domain.append(('jtbd_account_tier', '=', self.target_account_tier))
+        enrollments = self._enroll_leads(self.env['crm.lead'].search(domain))
+        return {'type': 'ir.actions.client', 'tag': 'display_notification',
+                'params': {'title': _('Outbound Sequence'), 'message': _("%s leads enrolled.", len(enrollments)),
+                           'sticky': False, 'type': 'success'}}
 
 class JtbdOutboundStep(models.Model):
     _name = 'jtbd.outbound.step'
@@ -35,4 +79,155 @@ class JtbdOutboundStep(models.Model):
     delay_days = fields.Integer(string='Delay (Days)', default=3, help="Delay in days after previous step (or sequence start).")
     template_subject = fields.Char(string='Subject/Headline Template')
     template_body = fields.Text(string='Body/Script Template')
-    notes = fields.Text(string='Internal Notes')
\ No newline at end of file
+    notes = fields.Text(string='Internal Notes')
+
+    def _prepare_mail_values(self, leads):
+        """ mail.mail values of this email step for ``leads``. Subject and body are
+        inline templates (e.g. ``{{ object.partner_name }}``) rendered in one batch.
+        Leads without email or whose email is blacklisted are skipped. """
+        self.ensure_one()
+        leads = leads.filtered(lambda lead: lead.email_from and not lead.is_blacklisted)
+        if not leads:
+            return []
+        render = self.env['mail.render.mixin']._render_template
+        subjects = render(self.template_subject or self.name, 'crm.lead', leads.ids, engine='inline_template')
+        bodies = render(self.template_body or '', 'crm.lead', leads.ids, engine='inline_template')
+        return [{
+            'subject': subjects[lead.id],
+            'body_html': tools.plaintext2html(bodies[lead.id]),
+            'email_from': lead.user_id.email_formatted or lead.company_id.email_formatted or self.env.company.email_formatted,
+            'email_to': lead.email_from,
+            'model': 'crm.lead',
+            'res_id': lead.id,
+            'auto_delete': True,
+        } for lead in leads]
+
+
+class JtbdOutboundEnrollment(models.Model):
+    _name = 'jtbd.outbound.enrollment'
+    _description = 'JTBD Outbound Sequence Enrollment'
+    _order = 'next_due_date, id'
+
+    sequence_id = fields.Many2one('jtbd.outbound.sequence', string='Sequence', required=True, ondelete='cascade', index=True)
+    lead_id = fields.Many2one('crm.lead', string='Opportunity/Lead', required=True, ondelete='cascade', index=True)
+    state = fields.Selection(
+        [('running', 'Running'), ('done', 'Completed'), ('stopped', 'Stopped')],
+        string='Status', default='running', required=True
+    )
+    enrollment_date = fields.Datetime(string='Enrolled On', default=fields.Datetime.now, required=True, readonly=True)
+    next_step_id = fields.Many2one('jtbd.outbound.step', string='Next Step', ondelete='set null')
+    next_due_date = fields.Datetime(string='Next Step Due')
+    last_step_date = fields.Datetime(string='Last Step Executed', readonly=True)
+    steps_done_count = fields.Integer(string='Steps Executed', readonly=True)
+    stop_reason = fields.Char(string='Stop Reason', readonly=True)
+
+    _sql_constraints = [
+        ('sequence_lead_uniq', 'unique(sequence_id, lead_id)', 'This lead is already enrolled in this sequence.'),
+    ]
+
+    def init(self):
+        super().init()
+        # Scheduler lookup: running enrollments by due date (ORDER BY next_due_date, id LIMIT n)
+        tools.create_index(self.env.cr, 'jtbd_outbound_enrollment_due_idx', self._table,
+                           ['next_due_date', 'id'], where="state = 'running'")
+
+    def action_stop(self):
+        self.filtered(lambda e: e.state == 'running').write({
+            'state': 'stopped', 'next_due_date': False, 'stop_reason': _("Stopped manually"),
+        })
+
+    # --- Scheduler ---
+    @api.model
+    def _cron_process_due_steps(self, batch_size=OUTBOUND_SCHEDULER_BATCH_SIZE):
+        """ Execute the due steps of running enrollments, chunk by chunk (committed outside tests).
+        Each chunk is an index range scan on the due date, so its cost does not depend
+        on the total number of enrollments. """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        now = fields.Datetime.now()
+        processed_count = 0
+        while True:
+            enrollments = self.search_fetch(
+                [('state', '=', 'running'), ('next_due_date', '<=', now)],
+                ['sequence_id', 'lead_id', 'next_step_id', 'steps_done_count'],
+                order='next_due_date, id', limit=batch_size,
+            )
+            if not enrollments:
+                break
+            enrollments._execute_due_steps(now)
+            processed_count += len(enrollments)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+            if len(enrollments) < batch_size:
+                break
+        if processed_count:
+            _logger.info(f"JTBD Outbound Scheduler: executed {processed_count} due step(s).")
+        return processed_count
+
+    def _execute_due_steps(self, now):
+        """ Execute the next step of every enrollment of ``self``, grouped per step
+        (see ``_execute_step``), each step in its own savepoint. """
+        closed_lead_ids = set(self.lead_id.filtered(lambda lead: not lead.active or lead.probability >= 100).ids)
+        closed = self.filtered(lambda e: e.lead_id.id in closed_lead_ids)
+        closed.write({'state': 'stopped', 'next_due_date': False, 'stop_reason': _("Opportunity closed")})
+        no_step = (self - closed).filtered(lambda e: not e.next_step_id)
+        no_step.write({'state': 'stopped', 'next_due_date': False, 'stop_reason': _("Sequence step removed")})
+        enrollments = self - closed - no_step
+
+        next_step_by_step = {}
+        for sequence in enrollments.sequence_id:
+            steps = sequence.step_ids
+            next_step_by_step.update(zip(steps, steps[1:]))
+        mail_queued = False
+        for step, step_enrollments in enrollments.grouped('next_step_id').items():
+            # One failing step (e.g. a template that does not render) must not block the scheduler:
+            # retry its enrollments one by one and stop only the failing ones
+            try:
+                with self.env.cr.savepoint():
+                    mail_queued |= step_enrollments._execute_step(step, next_step_by_step.get(step), now)
+                continue
+            except Exception:
+                _logger.warning(f"JTBD Outbound Scheduler: step {step.id} failed for {len(step_enrollments)} enrollment(s), retrying them one by one.", exc_info=True)
+            for enrollment in step_enrollments:
+                try:
+                    with self.env.cr.savepoint():
+                        mail_queued |= enrollment._execute_step(step, next_step_by_step.get(step), now)
+                except Exception as e:
+                    _logger.error(f"JTBD Outbound Scheduler: step {step.id} failed for enrollment {enrollment.id}: {e}")
+                    enrollment.write({
+                        'state': 'stopped', 'next_due_date': False,
+                        'stop_reason': _("Step '%(step)s' failed: %(error)s", step=step.name, error=str(e)[:200]),
+                    })
+        if mail_queued:
+            self.env.ref('mail.ir_cron_mail_scheduler_action')._trigger()
+
+    def _execute_step(self, step, next_step, now):
+        """ Execute ``step`` for the enrollments of ``self`` (all waiting on it): one engagement
+        create, one mail create (rendered per step, not per lead) and one write per progress count.
+
+        :return: whether emails were queued
+        """
+        self.env['jtbd.outbound.engagement'].create([{
+            'lead_id': enrollment.lead_id.id,
+            'sequence_id': enrollment.sequence_id.id,
+            'step_id': step.id,
+            'channel': step.channel,
+            'engagement_datetime': now,
+            'summary': step.name,
+            'response_type': 'none',
+        } for enrollment in self])
+        mail_vals_list = step._prepare_mail_values(self.lead_id) if step.channel == 'email' else []
+        if mail_vals_list:
+            self.env['mail.mail'].sudo().create(mail_vals_list)
+
+        # Advance: enrollments at the same point of the sequence share one write
+        for done_count, group in self.grouped('steps_done_count').items():
+            vals = {
+                'last_step_date': now, 'steps_done_count': done_count + 1,
+                'next_step_id': next_step.id if next_step else False,
+                'next_due_date': now + timedelta(days=next_step.delay_days) if next_step else False,
+            }
+            if not next_step:
+                vals['state'] = 'done'
+            group.write(vals)
+        return bool(mail_vals_list)
@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
 import logging
+import threading
 from datetime import timedelta
 
 _logger = logging.getLogger(__name__)
 
+# Outcome Maps updated (and committed) per chunk by _suggest_for_open_opportunities
+SUGGEST_BATCH_SIZE = 1000
+
 class JtbdOutcomeMapping(models.Model):
     _name = 'jtbd.outcome.mapping'
     _description = 'JTBD Outcome Mapping'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'jtbd.trace.link.mixin']
     _order = 'create_date desc'
 
     # Core Fields
@@ -105,6 +109,37 @@ class JtbdOutcomeMapping(models.Model):
         string="# Trace Links"
     )
 
+    def init(self):
+        # Serves the "newest map per lead" lookup that maintains crm.lead.jtbd_latest_outcome_mapping_id
+        tools.create_index(self._cr, 'jtbd_outcome_mapping_lead_latest_idx', self._table,
+                           ['lead_id', 'create_date DESC', 'id DESC'])
+
+    # --- CRUD Overrides (keep the lead's latest Outcome Map pointer up to date) ---
+    @api.model_create_multi
+    def create(self, vals_list):
+        mappings = super().create(vals_list)
+        mappings.lead_id._jtbd_refresh_latest_outcome_mapping()
+        self.env['jtbd.pipeline.analysis']._refresh_leads(mappings.lead_id.ids)
+        return mappings
+
+    def write(self, vals):
+        previous_leads = self.lead_id
+        res = super().write(vals)
+        leads = previous_leads | self.lead_id
+        if 'lead_id' in vals:
+            leads._jtbd_refresh_latest_outcome_mapping()
+        # Outcome metric/progress/status are shown in Pipeline Analysis (no-op in live view mode)
+        self.env['jtbd.pipeline.analysis']._refresh_leads(leads.ids)
+        return res
+
+    def unlink(self):
+        leads = self.lead_id
+        res = super().unlink()
+        leads = leads.exists()
+        leads._jtbd_refresh_latest_outcome_mapping()
+        self.env['jtbd.pipeline.analysis']._refresh_leads(leads.ids)
+        return res
+
     # --- Default Get Method ---
     @api.model
     def default_get(self, fields_list):
@@ -240,19 +275,8 @@ class JtbdOutcomeMapping(models.Model):
 
     # --- ADD Trace Link Counter and Action ---
     def _compute_trace_link_count(self):
-        """ Computes the number of trace links using search_count loop. """
-        TraceLink = self.env['jtbd.trace.link']
-        trace_link_model_id = self.env['ir.model']._get_id(self._name)
-        if not trace_link_model_id:
-            for record in self: record.jtbd_trace_link_count = 0
-            return
-        for record in self:
-            try:
-                count = TraceLink.search_count([ ('source_model_id', '=', trace_link_model_id), ('source_res_id', '=', record.id) ])
-                record.jtbd_trace_link_count = count
-            except Exception as e:
-                 _logger.error(f"Error counting trace links for Outcome Map {record.id}: {e}", exc_info=True)
-                 record.jtbd_trace_link_count = 0
+        """ Computes the number of trace links with one grouped query for the recordset. """
+        self._jtbd_assign_trace_link_counts('jtbd_trace_link_count')
 
     def action_open_trace_links(self):
         """ Opens a wizard to CREATE a new trace link for this Outcome Map. """
@@ -295,6 +319,97 @@ class JtbdOutcomeMapping(models.Model):
                      'res_model': 'jtbd.outcome.suggestion.wizard', 'res_id': wizard.id,
                      'target': 'new', }
 
+    def _apply_suggestions(self, suggestion_type, suggestions):
+        """ Add suggested items (list of {'name', 'description'} dicts) to the map:
+        additional outcomes, milestones (spaced 30 days apart) or white space lines. """
+        self.ensure_one()
+        vals_to_write = {}
+        if suggestion_type == 'outcomes':
+            existing_metrics = self.additional_outcome_ids.mapped('metric')
+            additional_outcome_vals_list = []
+            for i, item in enumerate(suggestions):
+                metric = (item['name'] or '').strip()
+                if metric and metric not in existing_metrics:
+                    is_percentage = '%' in metric or (item.get('description') and '%' in item['description'])
+                    additional_outcome_vals_list.append((0, 0, {
+                        'name': f"{metric} (Suggested)",
+                        'metric': metric,
+                        'is_percentage': is_percentage,
+                        'metric_unit': '%' if is_percentage else None,
+                        'priority': '2', # Medium
+                        'sequence': (len(self.additional_outcome_ids) + i + 1) * 10,
+                    }))
+            if additional_outcome_vals_list: vals_to_write['additional_outcome_ids'] = additional_outcome_vals_list
+        elif suggestion_type == 'milestones':
+            existing_milestones = self.milestone_ids.mapped('name')
+            today = fields.Date.context_today(self)
+            milestone_vals_list = []
+            for i, item in enumerate(suggestions):
+                name = (item['name'] or '').strip()
+                if name and name not in existing_milestones:
+                    milestone_vals_list.append((0, 0, {
+                        'name': name, 'notes': item.get('description') or '',
+                        'target_date': today + timedelta(days=(len(self.milestone_ids) + i + 1) * 30),
+                        'sequence': (len(self.milestone_ids) + i + 1) * 10,
+                    }))
+            if milestone_vals_list: vals_to_write['milestone_ids'] = milestone_vals_list
+        elif suggestion_type == 'white_space':
+            white_space_parts = [self.white_space] if self.white_space else []
+            for item in suggestions:
+                text_to_add = (item.get('description') or item['name'] or '').strip()
+                if text_to_add: white_space_parts.append(f"- {text_to_add}")
+            if len(white_space_parts) > (1 if self.white_space else 0):
+                vals_to_write['white_space'] = "\n".join(white_space_parts).strip()
+        if vals_to_write:
+            self.write(vals_to_write)
+        return bool(vals_to_write)
+
+    @api.model
+    def _suggest_for_open_opportunities(self, suggestion_types=('outcomes', 'milestones', 'white_space'), batch_size=SUGGEST_BATCH_SIZE):
+        """ Apply the pattern suggestions to the latest Outcome Map of every open opportunity,
+        chunk by chunk. Suggestions are resolved in one batch per type and chunk (see
+        jtbd.outcome.pattern). Each chunk is committed outside tests.
+
+        :return: number of maps updated
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        leads = self.env['crm.lead'].search([
+            ('type', '=', 'opportunity'), ('probability', '<', 100),
+            ('jtbd_latest_outcome_mapping_id', '!=', False),
+        ])
+        mapping_ids = leads.jtbd_latest_outcome_mapping_id.ids
+        updated_count = 0
+        for chunk_ids in tools.split_every(batch_size, mapping_ids):
+            mappings = self.browse(chunk_ids)
+            updated_ids = set()
+            for suggestion_type in suggestion_types:
+                suggestions = self.env['jtbd.outcome.pattern']._get_mapping_suggestions(mappings, suggestion_type)
+                for mapping in mappings:
+                    if suggestions[mapping.id] and mapping._apply_suggestions(suggestion_type, suggestions[mapping.id]):
+                        updated_ids.add(mapping.id)
+            updated_count += len(updated_ids)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info(f"JTBD Outcome Suggestions: updated {updated_count} of {len(mapping_ids)} open Outcome Maps.")
+        return updated_count
+
+    @api.model
+    def _cron_suggest_for_open_opportunities(self):
+        count = self._suggest_for_open_opportunities()
+        # One-shot job: the cron is enabled again by the next suggestion request
+        self.env['ir.cron']._notify_progress(done=count, remaining=0, deactivate=True)
+
+    @api.model
+    def action_suggest_for_open_opportunities(self):
+        """ Apply the pattern suggestions to every open opportunity in the background. """
+        cron = self.env.ref('jtbd_odoo_crm.ir_cron_jtbd_outcome_suggestions').sudo()
+        cron.try_write({'active': True}) # Already active (and locked) when a run is in progress
+        cron._trigger()
+        return { 'type': 'ir.actions.client', 'tag': 'display_notification',
+                 'params': {'title': _('Outcome Suggestions'), 'message': _("Outcome suggestions for all open opportunities scheduled: they run in the background."),
+                            'sticky': False, 'type': 'success'} }
+
     def action_update_opportunity(self):
         self.ensure_one()
         if not self.lead_id: raise UserError(_("No related opportunity found."))
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools, _
+
+HIGH_CONFIDENCE_THRESHOLD = 0.8 # Lead source confidence giving access to 'high_confidence' patterns
+WHITE_SPACE_NAME_LENGTH = 80
 
 class JtbdOutcomePattern(models.Model):
     _name = 'jtbd.outcome.pattern'
@@ -63,4 +66,84 @@ class JtbdOutcomePattern(models.Model):
     )
     # --- End PRD3 Enhanced Flow Field ---
 
-    notes = fields.Text(string='Notes')
\ No newline at end of file
+    notes = fields.Text(string='Notes')
+
+    # --- Cached Suggestion Resolver ---
+    @api.model
+    @tools.ormcache('job_category_id', 'source_label', 'high_confidence')
+    def _get_suggestion_templates(self, job_category_id, source_label, high_confidence):
+        """ Pre-parsed suggestion templates of the first pattern applicable to a job
+        category and lead source, cached in the registry until patterns change.
+
+        :param str source_label: lead data source label (False for unknown sources,
+            which only get 'all' patterns)
+        :param bool high_confidence: lead source confidence >= HIGH_CONFIDENCE_THRESHOLD
+        :return: dict {suggestion type: tuple of template strings}, or None
+        """
+        domain = [('job_category_id', '=', job_category_id)]
+        if source_label:
+            applicable_sources = ['all', source_label] + (['high_confidence'] if high_confidence else [])
+            domain.append(('jtbd_source_type_applicability', 'in', applicable_sources))
+        else:
+            domain.append(('jtbd_source_type_applicability', '=', 'all'))
+        pattern = self.sudo().search(domain, limit=1)
+        if not pattern:
+            return None
+        return {
+            'outcomes': tuple(line.strip() for line in (pattern.additional_metrics or '').splitlines() if line.strip()),
+            'milestones': tuple(name.strip() for name in (pattern.typical_milestone_1, pattern.typical_milestone_2,
+                                                          pattern.typical_milestone_3) if name and name.strip()),
+            'white_space': tuple(line.strip() for line in (pattern.white_space_suggestions or '').splitlines() if line.strip()),
+        }
+
+    @api.model
+    def _get_mapping_suggestions(self, mappings, suggestion_type):
+        """ Suggestions of ``suggestion_type`` for many outcome maps at once: maps of the
+        same category and lead source share one resolved (cached) pattern.
+
+        :return: dict {mapping id: list of {'name', 'description'} dicts}
+        """
+        descriptions = {'outcomes': _("Suggested metric."), 'milestones': _("Suggested milestone.")}
+        suggestions = {}
+        for mapping in mappings:
+            suggestions[mapping.id] = []
+            lead = mapping.lead_id
+            if not mapping.job_category_id or not lead:
+                continue
+            templates = self._get_suggestion_templates(
+                mapping.job_category_id.id, lead.jtbd_data_source_label or False,
+                (lead.jtbd_source_confidence_score or 0.0) >= HIGH_CONFIDENCE_THRESHOLD,
+            )
+            if not templates:
+                continue
+            if suggestion_type == 'outcomes':
+                existing = set(mapping.additional_outcome_ids.mapped('metric'))
+            elif suggestion_type == 'milestones':
+                existing = set(mapping.milestone_ids.mapped('name'))
+            elif mapping.white_space: # White space is only suggested while the field is empty
+                continue
+            else:
+                suggestions[mapping.id] = [{
+                    'name': idea[:WHITE_SPACE_NAME_LENGTH] + ('...' if len(idea) > WHITE_SPACE_NAME_LENGTH else ''),
+                    'description': idea,
+                } for idea in templates['white_space']]
+                continue
+            suggestions[mapping.id] = [{'name': name, 'description': descriptions[suggestion_type]}
+                                       for name in templates[suggestion_type] if name not in existing]
+        return suggestions
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        patterns = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return patterns
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+""" In-process job pattern matching.
+
+jtbd.job.pattern records (name, description, situation/motivation/outcome
+templates, applicable agency types and tech stacks) are indexed once in a
+TF-IDF inverted index; leads are then matched by looking up only the postings
+of their own terms, so matching cost depends on the lead text, not on the
+number of patterns. The index is built and cached by jtbd.job.pattern
+(see ``_get_match_index``) and rebuilt only when patterns change.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]{3,}")
+STOP_WORDS = frozenset("""
+    about after also and any are because been before being but can could does each for from had has have
+    how into its just more most not now our out over own same should some such than that the their them
+    then there these they this those through too under very was were what when where which while who why
+    will with would you your want wants need needs
+""".split())
+CATEGORY_BONUS = 0.3 # Added to patterns of the lead's job category (keeps category-only matches)
+MIN_MATCH_SCORE = 0.1
+MAX_PATTERN_MATCHES = 3
+
+
+def tokenize(*texts):
+    """ Lowercased terms of the given texts, without stop words and short tokens. """
+    return [token for text in texts if text
+            for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class JobPatternIndex:
+    """ Immutable TF-IDF inverted index of job patterns.
+
+    :param documents: iterable of (pattern_id, job_category_id, terms), in
+        pattern order (the order breaks score ties)
+    """
+    __slots__ = ('postings', 'idf', 'category_pattern_ids', 'rank')
+
+    def __init__(self, documents):
+        documents = list(documents)
+        doc_count = len(documents)
+        frequencies = {}
+        document_frequency = Counter()
+        category_pattern_ids = defaultdict(list)
+        self.rank = {}
+        for pattern_id, category_id, terms in documents:
+            self.rank[pattern_id] = len(self.rank)
+            frequencies[pattern_id] = Counter(terms)
+            document_frequency.update(frequencies[pattern_id].keys())
+            if category_id:
+                category_pattern_ids[category_id].append(pattern_id)
+        self.idf = {term: math.log(1 + doc_count / count) for term, count in document_frequency.items()}
+
+        # Postings hold L2-normalized weights, so a lookup sum is a cosine similarity
+        postings = defaultdict(list)
+        for pattern_id, counts in frequencies.items():
+            weights = {term: (1 + math.log(count)) * self.idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                postings[term].append((pattern_id, weight / norm))
+        self.postings = {term: tuple(entries) for term, entries in postings.items()}
+        self.category_pattern_ids = {category_id: tuple(ids) for category_id, ids in category_pattern_ids.items()}
+
+    def __len__(self):
+        return len(self.rank)
+
+    def match(self, terms, category_id=False, limit=MAX_PATTERN_MATCHES, min_score=MIN_MATCH_SCORE):
+        """ Best matching pattern ids for the given lead terms.
+
+        :return: list of at most ``limit`` pattern ids, best first
+        """
+        scores = defaultdict(float)
+        query = {term: (1 + math.log(count)) * self.idf[term]
+                 for term, count in Counter(terms).items() if term in self.idf}
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values()))
+        for term, query_weight in query.items():
+            for pattern_id, weight in self.postings[term]:
+                scores[pattern_id] += query_weight * weight / query_norm
+        for pattern_id in self.category_pattern_ids.get(category_id, ()):
+            scores[pattern_id] += CATEGORY_BONUS
+        best = heapq.nsmallest(
+            limit, (item for item in scores.items() if item[1] >= min_score),
+            key=lambda item: (-item[1], self.rank[item[0]]),
+        )
+        return [pattern_id for pattern_id, _score in best]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+
+class JtbdRelatedCountMixin(models.AbstractModel):
+    """ Shared engine for the ``*_count`` computes of the JTBD module.
+
+    Counting related records with one ``search_count`` per record fires one
+    query per row of a list/kanban view. The helpers below count the related
+    records of the WHOLE recordset with a single grouped ``_read_group`` per
+    related model, so the number of queries does not grow with ``self``.
+    """
+    _name = 'jtbd.related.count.mixin'
+    _description = 'JTBD Grouped Related-Record Counter'
+
+    def _jtbd_count_related(self, model_name, group_field, domain=None):
+        """ Count the records of ``model_name`` linked to ``self`` through ``group_field``.
+
+        :param str model_name: related model to count (e.g. 'jtbd.force.analysis')
+        :param str group_field: field of ``model_name`` holding the id of the
+            records of ``self`` (a Many2one, or an Integer for polymorphic links)
+        :param list domain: optional extra domain on ``model_name``
+        :return: dict {record id: count}; records without related rows are absent
+        """
+        record_ids = self._origin.ids # Skip NewIds (onchange/form records without origin)
+        if not record_ids:
+            return {}
+        count_domain = [(group_field, 'in', record_ids)] + list(domain or [])
+        groups = self.env[model_name]._read_group(count_domain, [group_field], ['__count'])
+        return {
+            (key.id if isinstance(key, models.BaseModel) else key): count
+            for key, count in groups
+        }
+
+    def _jtbd_assign_counts(self, field_name, model_name, group_field, domain=None):
+        """ Compute helper: set ``field_name`` on every record of ``self`` in one query. """
+        counts = self._jtbd_count_related(model_name, group_field, domain=domain)
+        for record in self:
+            record[field_name] = counts.get(record._origin.id, 0)
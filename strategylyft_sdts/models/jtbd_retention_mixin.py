@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class JtbdRetentionMixin(models.AbstractModel):
+    """ Retention engine of the append-only JTBD logs (integration logs, journey events).
+
+    Rows older than the configured retention are rolled up into per-day summary
+    rows of ``_jtbd_rollup_model`` and deleted, one whole day per statement:
+    ``DELETE ... RETURNING`` feeds the ``INSERT`` of the summary in the same
+    query, so a day is either fully summarized and purged, or untouched. This
+    keeps the hot table and its indexes bounded by the retention window.
+
+    Inheriting models define the class attributes below; the summary model
+    must have a ``day`` Date, an ``event_count`` Integer and one column per
+    ``_jtbd_rollup_group_columns`` entry.
+    """
+    _name = 'jtbd.retention.mixin'
+    _description = 'JTBD Log Retention and Daily Rollup'
+
+    _jtbd_retention_date_column = None # Datetime column the retention applies to
+    _jtbd_retention_param = None # ir.config_parameter holding the retention in days (0 = keep forever)
+    _jtbd_retention_default_days = 0 # Opt-in: nothing is purged until a retention is configured
+    _jtbd_rollup_model = None # Per-day summary model
+    _jtbd_rollup_group_columns = () # Columns copied (and grouped by) into the summary rows
+    _jtbd_compressed_columns = () # Large text payload columns, TOASTed with lz4 when available
+
+    def init(self):
+        super().init()
+        if self._abstract or not self._jtbd_compressed_columns or self.env.cr._cnx.server_version < 140000:
+            return
+        # lz4 (PostgreSQL 14+, if built with it) compresses payloads faster and smaller than the default pglz
+        for column in self._jtbd_compressed_columns:
+            try:
+                with self.env.cr.savepoint(flush=False):
+                    self.env.cr.execute(f'ALTER TABLE "{self._table}" ALTER COLUMN "{column}" SET COMPRESSION lz4')
+            except Exception as e:
+                _logger.info(f"{self._name}: lz4 compression not available for column {column} ({e}).")
+                return
+
+    @api.model
+    def _jtbd_get_retention_cutoff(self):
+        """ Start of the oldest day to keep, or None if rows are kept forever. """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            self._jtbd_retention_param, self._jtbd_retention_default_days) or 0)
+        if days <= 0:
+            return None
+        return fields.Datetime.to_datetime(fields.Date.context_today(self) - timedelta(days=days))
+
+    @api.model
+    def _cron_purge_expired(self):
+        """ Roll up and delete every expired day, oldest first (committed per day outside tests). """
+        cutoff = self._jtbd_get_retention_cutoff()
+        if not cutoff:
+            return 0
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.env.flush_all()
+        date_column = self._jtbd_retention_date_column
+        self.env.cr.execute(f"""
+            SELECT DISTINCT date_trunc('day', "{date_column}") FROM "{self._table}"
+             WHERE "{date_column}" < %s ORDER BY 1
+        """, [cutoff])
+        days = [row[0] for row in self.env.cr.fetchall()]
+        purged_count = 0
+        for day in days:
+            purged_count += self._jtbd_rollup_day(day)
+            if auto_commit:
+                self.env.cr.commit()
+        if days:
+            self.invalidate_model()
+            self.env[self._jtbd_rollup_model].invalidate_model()
+            _logger.info(f"{self._name}: rolled up and purged {purged_count} rows of {len(days)} day(s) before {cutoff}.")
+        return purged_count
+
+    @api.model
+    def _jtbd_rollup_day(self, day):
+        """ Summarize and delete the rows of one day with a single statement.
+
+        :return: number of deleted rows
+        """
+        rollup_table = self.env[self._jtbd_rollup_model]._table
+        date_column = self._jtbd_retention_date_column
+        columns = ', '.join(f'"{column}"' for column in self._jtbd_rollup_group_columns)
+        self.env.cr.execute(f"""
+            WITH expired AS (
+                DELETE FROM "{self._table}"
+                 WHERE "{date_column}" >= %(day)s AND "{date_column}" < %(day)s + interval '1 day'
+             RETURNING {columns}
+            ), summary AS (
+                INSERT INTO "{rollup_table}" (day, {columns}, event_count, create_uid, write_uid, create_date, write_date)
+                SELECT %(day)s::date, {columns}, count(*), %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+                  FROM expired
+              GROUP BY {columns}
+            )
+            SELECT count(*) FROM expired
+        """, {'day': day, 'uid': self.env.uid})
+        return self.env.cr.fetchone()[0]
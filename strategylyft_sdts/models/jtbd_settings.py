@@ -32,6 +32,19 @@ class ResConfigSettings(models.TransientModel):
          help="Placeholder: Default retention period in days for detailed JTBD analysis data (0=Indefinite). Requires Phase 4+ Automation."
     )
 
+    jtbd_integration_log_retention_days = fields.Integer(
+         string="Integration Log Retention (Days)",
+         config_parameter='jtbd_odoo_crm.integration_log_retention_days',
+         default=0,
+         help="Integration logs older than this are summarized per day and deleted by a daily job (0=Indefinite)."
+    )
+    jtbd_journey_event_retention_days = fields.Integer(
+         string="Journey Event Retention (Days)",
+         config_parameter='jtbd_odoo_crm.journey_event_retention_days',
+         default=0,
+         help="Journey events older than this are summarized per day and deleted by a daily job (0=Indefinite)."
+    )
+
     # --- JTBD Resilience Settings ---
     jtbd_resilience_ai_fallback_mode = fields.Selection(
          [('error', 'Error / Manual Intervention'),
@@ -47,4 +60,34 @@ class ResConfigSettings(models.TransientModel):
          config_parameter='jtbd_odoo_crm.resilience_integration_retry_count',
          default=3,
          help="Placeholder: Default number of retry attempts for failed external integrations."
-     )
\ No newline at end of file
+     )
+
+    # --- JTBD Webhook Settings ---
+    jtbd_webhook_secret_token = fields.Char(
+         string="Feedback Webhook Secret",
+         config_parameter='jtbd_odoo_crm.webhook_secret_token',
+         help="Shared secret used to verify the HMAC-SHA256 signature (X-JTBD-Signature header) of /jtbd/feedback_webhook calls."
+     )
+    jtbd_intake_token = fields.Char(
+         string="Bulk Intake Token",
+         config_parameter='jtbd_odoo_crm.intake_token',
+         help="Bearer token (Authorization header) required by the /jtbd/intake/<kind> bulk upload routes."
+     )
+
+    # --- JTBD Reporting Settings ---
+    jtbd_pipeline_analysis_mode = fields.Selection(
+         [('view', 'Live SQL View'),
+          ('materialized', 'Materialized Table (incremental refresh)')],
+         string="Pipeline Analysis Storage",
+         config_parameter='jtbd_odoo_crm.pipeline_analysis_mode',
+         default='view',
+         help="Live view: always current, but every pivot/graph read rescans all opportunities. "
+              "Materialized: rows are stored and refreshed when a lead or its outcome map changes, plus a nightly full refresh."
+     )
+
+    def set_values(self):
+        previous_mode = self.env['ir.config_parameter'].sudo().get_param('jtbd_odoo_crm.pipeline_analysis_mode', 'view')
+        super().set_values()
+        if self.jtbd_pipeline_analysis_mode != previous_mode:
+            # Rebuild the report relation in the new storage mode
+            self.env['jtbd.pipeline.analysis']._create_or_replace_view()
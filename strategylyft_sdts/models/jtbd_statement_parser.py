@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+""" Shared parsing and clarity scoring of JTBD job statements.
+
+"When <situation>, I want <motivation>, so I can <outcome>." statements are
+parsed by crm.lead (stored clarity score) and by the statement builder wizard
+(pre-fill and live score). Both go through this module so the grammar is
+compiled once and repeated statements (imports, recomputes) are parsed once.
+"""
+import functools
+import logging
+import re
+
+_logger = logging.getLogger(__name__)
+
+# Flexible separator between parts: optional comma, optional spaces
+JOB_STATEMENT_PATTERN = re.compile(
+    r"when\s+(.*?)(?:,|\s?)\s*i want\s+(.*?)(?:,|\s?)\s*so i can\s+(.*?)(?:\.?\s*$)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Stricter structure enforced by the crm.lead constraint (parts separated by spaces)
+JOB_STATEMENT_STRUCTURE_PATTERN = re.compile(r"^\s*when\s+.*?\s+i want\s+.*?\s+so i can\s+.*$", re.IGNORECASE | re.DOTALL)
+MIN_TEXT_LENGTH_SCORE = 10 # Minimum characters for a statement part to count in the score
+COMPONENT_WEIGHT = 25 # Situation / motivation / outcome
+SELECTION_WEIGHT = 12.5 # Job category / job quadrant
+MAX_CLARITY_SCORE = 100
+MAX_UNMATCHED_WARNINGS = 3 # Per bulk scoring call; the rest are only counted
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_job_statement(statement):
+    """ Split a job statement into its (situation, motivation, outcome) parts.
+
+    :param str statement: job statement text
+    :return: tuple of 3 stripped strings, or None if the statement does not follow the grammar
+    """
+    match = JOB_STATEMENT_PATTERN.match((statement or '').strip())
+    if not match:
+        return None
+    return tuple((part or '').strip() for part in match.groups())
+
+
+@functools.lru_cache(maxsize=8192)
+def is_valid_job_statement(statement):
+    """ True if the statement follows the 'When ..., I want ..., so I can ...' structure. """
+    return bool(JOB_STATEMENT_STRUCTURE_PATTERN.match((statement or '').strip()))
+
+
+def score_statement_parts(situation, motivation, outcome, has_category=False, has_quadrant=False):
+    """ Clarity score (0-100) of statement parts plus the category/quadrant selections. """
+    score = sum(COMPONENT_WEIGHT for part in (situation, motivation, outcome)
+                if part and len(part.strip()) >= MIN_TEXT_LENGTH_SCORE)
+    score += SELECTION_WEIGHT * (bool(has_category) + bool(has_quadrant))
+    return min(MAX_CLARITY_SCORE, int(round(score)))
+
+
+def score_job_statements(records, statement_fname, category_fname, quadrant_fname):
+    """ Bulk clarity scoring of a recordset.
+
+    Unmatched statements are reported with at most MAX_UNMATCHED_WARNINGS
+    warnings plus one summary line per call, instead of one warning each.
+
+    :return: dict {record id: score}
+    """
+    scores = {}
+    unmatched_ids = []
+    for record in records:
+        statement = record[statement_fname]
+        parts = parse_job_statement(statement) if statement else None
+        if statement and parts is None:
+            unmatched_ids.append(record.id)
+            if len(unmatched_ids) <= MAX_UNMATCHED_WARNINGS:
+                _logger.warning(f"Clarity Score: Statement of {record._name} {record.id} does not follow the job statement grammar: {statement[:200]}")
+        scores[record.id] = score_statement_parts(
+            *(parts or ('', '', '')), has_category=record[category_fname], has_quadrant=record[quadrant_fname])
+    if len(unmatched_ids) > MAX_UNMATCHED_WARNINGS:
+        _logger.warning(f"Clarity Score: {len(unmatched_ids)} of {len(records)} {records._name} statements do not follow the job statement grammar "
+                        f"({len(unmatched_ids) - MAX_UNMATCHED_WARNINGS} not shown).")
+    return scores
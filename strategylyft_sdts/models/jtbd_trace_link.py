@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from collections import defaultdict
+
+from odoo import models, fields, api, tools, _
 
 class JtbdTraceLink(models.Model):
     _name = 'jtbd.trace.link'
@@ -15,7 +17,8 @@ class JtbdTraceLink(models.Model):
     target_link_type = fields.Selection( [('url', 'URL / Web Link'), ('attachment', 'Odoo Attachment'), ('odoo_record', 'Odoo Record Reference'), ('document_repo', 'Document Repository (e.g., GDrive/Sharepoint ID)'), ('code_commit', 'Code Commit/Branch'), ('requirement', 'Requirement ID'), ('test_case', 'Test Case ID'), ('other', 'Other Reference')], string='Target Type', required=True, default='url')
     target_url = fields.Char(string='URL')
     target_attachment_id = fields.Many2one('ir.attachment', string='Odoo Attachment', ondelete='set null')
-    target_record_ref = fields.Reference( lambda self: [(m.model, m.name) for m in self.env['ir.model'].search([])], string="Target Odoo Record" )
+    target_record_ref = fields.Reference( lambda self: self.env['ir.model']._jtbd_reference_selection(), string="Target Odoo Record" )
+    target_display_name = fields.Char(compute='_compute_target_display_name', string="Target")
     target_external_ref = fields.Char( string='Target External/Text Reference', help="Identifier for targets not directly linkable (e.g., GDrive ID, Requirement ID, Commit SHA)." )
 
     # --- Link Metadata ---
@@ -31,6 +34,38 @@ class JtbdTraceLink(models.Model):
     )
     # --- End PRD3 Enhanced Flow Field ---
 
+    def init(self):
+        super().init()
+        # Holder lookups/counts (see jtbd.trace.link.mixin): source model + ids, active links only
+        tools.create_index(self.env.cr, 'jtbd_trace_link_source_idx', self._table,
+                           ['source_model_id', 'source_res_id', 'active'])
+
+    def _compute_target_display_name(self):
+        names = self._resolve_target_display_names()
+        for link in self:
+            link.target_display_name = names.get(link.id) or link.target_url or link.target_external_ref or link.target_attachment_id.name or False
+
+    def _resolve_target_display_names(self):
+        """ Display names of the ``target_record_ref`` of ``self``, fetched with one
+        exists() + display_name read per target model instead of one per link.
+
+        :return: dict {link id: display name}; links without (existing) target are absent
+        """
+        links_by_target = defaultdict(lambda: defaultdict(list))
+        for link in self:
+            target = link.target_record_ref
+            if target:
+                links_by_target[target._name][target.id].append(link.id)
+        names = {}
+        for model_name, link_ids_by_res_id in links_by_target.items():
+            if model_name not in self.env:
+                continue
+            targets = self.env[model_name].browse(link_ids_by_res_id).exists()
+            for target in targets:
+                for link_id in link_ids_by_res_id[target.id]:
+                    names[link_id] = target.display_name
+        return names
+
     # --- NEW: default_get method ---
     @api.model
     def default_get(self, fields_list):
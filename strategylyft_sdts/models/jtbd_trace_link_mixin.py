@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class JtbdTraceLinkMixin(models.AbstractModel):
+    """ Batch access to the polymorphic ``jtbd.trace.link`` records of a recordset.
+
+    Trace links identify their source by (source_model_id, source_res_id);
+    the helpers below load or count the links of the WHOLE recordset with one
+    query on the (source_model_id, source_res_id, active) index.
+    """
+    _name = 'jtbd.trace.link.mixin'
+    _description = 'JTBD Trace Link Holder'
+    _inherit = ['jtbd.related.count.mixin']
+
+    jtbd_trace_link_ids = fields.Many2many(
+        'jtbd.trace.link', compute='_compute_jtbd_trace_link_ids', string="Trace Links",
+        help="Active trace links whose source is this record."
+    )
+
+    def _compute_jtbd_trace_link_ids(self):
+        links_by_record = self._jtbd_get_trace_links()
+        for record in self:
+            record.jtbd_trace_link_ids = links_by_record.get(record._origin.id, self.env['jtbd.trace.link'])
+
+    def _jtbd_get_trace_links(self):
+        """ Trace links of ``self``, loaded with one query.
+
+        :return: dict {record id: jtbd.trace.link recordset}; records without links are absent
+        """
+        record_ids = self._origin.ids
+        source_model_id = self.env['ir.model']._get_id(self._name)
+        if not record_ids or not source_model_id:
+            return {}
+        links = self.env['jtbd.trace.link'].search_fetch(
+            [('source_model_id', '=', source_model_id), ('source_res_id', 'in', record_ids)],
+            ['source_res_id', 'name', 'target_link_type', 'link_relationship'],
+        )
+        return links.grouped('source_res_id')
+
+    def _jtbd_assign_trace_link_counts(self, field_name):
+        """ Compute helper for the trace link counters: one grouped count on
+        ``source_res_id`` restricted to the ir.model of ``self``. """
+        source_model_id = self.env['ir.model']._get_id(self._name)
+        if not source_model_id:
+            for record in self: record[field_name] = 0
+            return
+        self._jtbd_assign_counts(
+            field_name, 'jtbd.trace.link', 'source_res_id',
+            domain=[('source_model_id', '=', source_model_id)],
+        )
@@ -1,11 +1,24 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+import logging
+_logger = logging.getLogger(__name__)
+
+# Key of the per-transaction buffer of pending journey events (see _log_events)
+JOURNEY_EVENT_BUFFER_KEY = 'jtbd.unified.journey.event.buffer'
 
 class JtbdUnifiedJourneyEvent(models.Model):
     _name = 'jtbd.unified.journey.event'
     _description = 'Unified Customer Journey Event Log'
+    _inherit = ['jtbd.retention.mixin']
     _order = 'event_datetime desc, id desc'
 
+    # Events older than the retention are summarized into jtbd.journey.event.daily (see jtbd.retention.mixin)
+    _jtbd_retention_date_column = 'event_datetime'
+    _jtbd_retention_param = 'jtbd_odoo_crm.journey_event_retention_days'
+    _jtbd_rollup_model = 'jtbd.journey.event.daily'
+    _jtbd_rollup_group_columns = ('lead_id', 'partner_id', 'event_type', 'source_system', 'company_id')
+    _jtbd_compressed_columns = ('description', 'details_json')
+
     name = fields.Char(compute='_compute_name', store=True) # Auto-generated name
 
     lead_id = fields.Many2one(
@@ -59,7 +72,7 @@ class JtbdUnifiedJourneyEvent(models.Model):
     )
     # Link to related Odoo records if applicable
     related_record_ref = fields.Reference(
-         lambda self: [(m.model, m.name) for m in self.env['ir.model'].search([])],
+         lambda self: self.env['ir.model']._jtbd_reference_selection(),
          string="Related Odoo Record",
          help="Link to a specific Odoo record (e.g., Intent Signal, Outbound Engagement, Mail Message, Project Task)."
     )
@@ -69,11 +82,89 @@ class JtbdUnifiedJourneyEvent(models.Model):
 
     company_id = fields.Many2one('res.company', related='lead_id.company_id', store=True, readonly=True)
 
+    def init(self):
+        super().init()
+        # Lead journey timeline (crm.lead.get_jtbd_journey_timeline): newest events of one lead first
+        tools.create_index(self.env.cr, 'jtbd_unified_journey_event_lead_datetime_idx', self._table,
+                           ['lead_id', 'event_datetime DESC', 'id DESC'])
+
     @api.depends('lead_id.name', 'event_type', 'event_datetime')
     def _compute_name(self):
+        type_labels = dict(self._fields['event_type']._description_selection(self.env))
         for record in self:
-             type_display = dict(self._fields['event_type'].selection).get(record.event_type, record.event_type)
-             name = f"{type_display}"
+             name = f"{type_labels.get(record.event_type, record.event_type)}"
              if record.lead_id: name += f" - {record.lead_id.name}"
              if record.event_datetime: name += f" ({record.event_datetime.strftime('%Y-%m-%d %H:%M')})"
-             record.name = name
\ No newline at end of file
+             record.name = name
+
+    # --- Buffered Writer ---
+    @api.model
+    def _log_events(self, vals_list):
+        """ Queue journey events to be inserted at the end of the transaction.
+
+        Hooks of other models (lead stage changes, intent signals, outbound
+        engagements...) call this instead of ``create``: the events of the
+        whole transaction are inserted with one multi-row ``create`` right
+        before commit, and dropped on rollback.
+        """
+        if not vals_list:
+            return
+        buffer = self.env.cr.precommit.data.get(JOURNEY_EVENT_BUFFER_KEY)
+        if buffer is None:
+            buffer = self.env.cr.precommit.data[JOURNEY_EVENT_BUFFER_KEY] = []
+            self.env.cr.precommit.add(self._flush_event_buffer)
+        buffer.extend(vals_list)
+
+    @api.model
+    def _flush_event_buffer(self):
+        """ Insert the queued journey events. Can also be called directly by
+        readers that need the events of the current transaction. """
+        vals_list = self.env.cr.precommit.data.pop(JOURNEY_EVENT_BUFFER_KEY, None)
+        if not vals_list:
+            return self.browse()
+        # The buffer ignores savepoints: drop the events of leads rolled back (or deleted) since they were queued
+        lead_ids = {vals['lead_id'] for vals in vals_list if vals.get('lead_id')}
+        if lead_ids:
+            existing_lead_ids = set(self.env['crm.lead'].sudo().browse(lead_ids).exists().ids)
+            vals_list = [vals for vals in vals_list if not vals.get('lead_id') or vals['lead_id'] in existing_lead_ids]
+            if not vals_list:
+                return self.browse()
+        try:
+            with self.env.cr.savepoint():
+                events = self.sudo().create(vals_list)
+                events.flush_recordset()
+            return events.sudo(False)
+        except Exception as e:
+            # Journey logging must never block the business transaction that produced it:
+            # fall back to one insert per event so a bad row does not discard the others
+            _logger.warning(f"Failed to create {len(vals_list)} buffered Journey Event(s) at once, creating them one by one: {e}")
+        event_ids = []
+        for vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    event = self.sudo().create(vals)
+                    event.flush_recordset()
+                event_ids.append(event.id)
+            except Exception as e:
+                _logger.error(f"Failed to create buffered Journey Event {vals}: {e}")
+        return self.browse(event_ids)
+
+
+class JtbdJourneyEventDaily(models.Model):
+    _name = 'jtbd.journey.event.daily'
+    _description = 'Unified Customer Journey Daily Summary'
+    _order = 'day desc, id desc'
+
+    day = fields.Date(string='Day', required=True, readonly=True, index=True)
+    lead_id = fields.Many2one('crm.lead', string='Opportunity/Lead', readonly=True, index=True, ondelete='cascade')
+    partner_id = fields.Many2one('res.partner', string='Contact/Company', readonly=True, ondelete='set null')
+    event_type = fields.Selection(
+        selection=lambda self: self.env['jtbd.unified.journey.event']._fields['event_type'].selection,
+        string='Event Type', readonly=True
+    )
+    source_system = fields.Selection(
+        selection=lambda self: self.env['jtbd.unified.journey.event']._fields['source_system'].selection,
+        string='Source System', readonly=True
+    )
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    event_count = fields.Integer(string='Events', readonly=True, aggregator='sum')
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _ # Add api, _
+from odoo import models, fields, api, tools, _ # Add api, _
 import logging # Import logging
 from datetime import datetime # Import datetime
 
 _logger = logging.getLogger(__name__) # Add logger
 
+# Writing any of these fields can change which project is the JTBD template of a category
+JTBD_TEMPLATE_INDEX_FIELDS = {'name', 'jtbd_is_template', 'allow_billable', 'company_id', 'active'}
+
 class ProjectProject(models.Model):
-    _inherit = 'project.project'
+    _inherit = ['project.project', 'jtbd.related.count.mixin']
 
     # Field to mark project as a template
     jtbd_is_template = fields.Boolean(
@@ -79,16 +82,8 @@ class ProjectProject(models.Model):
 
     # --- Compute Methods ---
     def _compute_jtbd_knowledge_transfer_count(self):
-        """ Compute the number of related Knowledge Transfer records using search_count. """
-        knowledge_transfer_model = self.env['jtbd.knowledge.transfer']
-        for project in self:
-            try:
-                project.jtbd_knowledge_transfer_count = knowledge_transfer_model.search_count(
-                    [('project_id', '=', project.id)]
-                )
-            except Exception as e:
-                _logger.error(f"Error counting knowledge transfers for project {project.id}: {e}", exc_info=True)
-                project.jtbd_knowledge_transfer_count = 0
+        """ Compute the number of related Knowledge Transfer records (one grouped query). """
+        self._jtbd_assign_counts('jtbd_knowledge_transfer_count', 'jtbd.knowledge.transfer', 'project_id')
 
     @api.depends('jtbd_gap_detected_datetime', 'jtbd_gap_resolved_datetime')
     def _compute_jtbd_gap_resolution_time(self):
@@ -101,6 +96,48 @@ class ProjectProject(models.Model):
             else:
                 project.jtbd_gap_resolution_time = 0.0
 
+    # --- JTBD Template Index ---
+    @api.model
+    @tools.ormcache('company_id', 'self.env.lang')
+    def _jtbd_get_template_index(self, company_id):
+        """ Cached {lowercased project name: template project id} of the billable JTBD
+        templates usable by ``company_id`` (newest project wins on duplicate names). """
+        templates = self.sudo().search_fetch([
+            ('jtbd_is_template', '=', True),
+            ('allow_billable', '=', True),
+            '|', ('company_id', '=', False), ('company_id', '=', company_id),
+        ], ['name'], order='id')
+        return {(template.name or '').lower(): template.id for template in templates}
+
+    @api.model
+    def _jtbd_find_template(self, job_category, company):
+        """ The 'JTBD: <category>' template project of ``job_category`` (empty recordset if none). """
+        if not job_category.name:
+            return self.browse()
+        template_id = self._jtbd_get_template_index(company.id).get(f"JTBD: {job_category.name}".lower())
+        return self.browse(template_id)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        projects = super().create(vals_list)
+        if projects.filtered('jtbd_is_template'):
+            self.env.registry.clear_cache()
+        return projects
+
+    def write(self, vals):
+        was_template = any(self.mapped('jtbd_is_template'))
+        res = super().write(vals)
+        if JTBD_TEMPLATE_INDEX_FIELDS.intersection(vals) and (was_template or any(self.mapped('jtbd_is_template'))):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        was_template = any(self.mapped('jtbd_is_template'))
+        res = super().unlink()
+        if was_template:
+            self.env.registry.clear_cache()
+        return res
+
     # --- Action Methods ---
     def action_open_knowledge_transfers(self):
         self.ensure_one()
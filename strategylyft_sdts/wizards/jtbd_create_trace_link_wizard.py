@@ -32,7 +32,7 @@ class JtbdCreateTraceLinkWizard(models.TransientModel):
     target_url = fields.Char(string='URL')
     target_attachment_id = fields.Many2one('ir.attachment', string='Odoo Attachment', ondelete='set null')
     target_record_ref = fields.Reference(
-        lambda self: [(m.model, m.name) for m in self.env['ir.model'].search([])],
+        lambda self: self.env['ir.model']._jtbd_reference_selection(),
         string="Target Odoo Record"
     )
     target_external_ref = fields.Char(
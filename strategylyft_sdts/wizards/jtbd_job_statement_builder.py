@@ -4,7 +4,7 @@ from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 # Import selections from the models where they are defined
 from odoo.addons.jtbd_odoo_crm.models.crm_lead import JOB_QUADRANTS
-import re # Import regex
+from odoo.addons.jtbd_odoo_crm.models.jtbd_statement_parser import parse_job_statement, score_statement_parts
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -102,15 +102,8 @@ class JtbdJobStatementBuilder(models.TransientModel):
             if lead:
                 defaults['lead_id'] = lead.id # Ensure it's set
 
-                # Pre-fill statement parts from existing job statement using regex
-                situation, motivation, outcome = '', '', ''
-                if lead.jtbd_job_statement:
-                    pattern = re.compile(r"when\s+(.*?)(?:,\s*|\s+)i want\s+(.*?)(?:,\s*|\s+)so i can\s+(.*?)(?:\.?\s*$)", re.IGNORECASE | re.DOTALL)
-                    match = pattern.match(lead.jtbd_job_statement.strip())
-                    if match:
-                        situation = match.group(1).strip()
-                        motivation = match.group(2).strip()
-                        outcome = match.group(3).strip()
+                # Pre-fill statement parts from existing job statement (shared parser)
+                situation, motivation, outcome = parse_job_statement(lead.jtbd_job_statement) or ('', '', '')
 
                 # Pre-fill fields if they are in the requested fields_list
                 if 'job_situation' in fields_list and situation:
@@ -296,30 +289,13 @@ class JtbdJobStatementBuilder(models.TransientModel):
         self.suggested_patterns = [(6, 0, patterns.ids)] if patterns else [(5, 0, 0)]
 
     def _calculate_job_score(self):
-        """Calculate the job clarity score based on completeness and length (for wizard)."""
+        """Calculate the job clarity score based on completeness and length (for wizard).
+        Same rules as the stored crm.lead score (see jtbd_statement_parser)."""
         self.ensure_one()
-        score = 0
-        max_score = 100
-        component_weight = 25
-        selection_weight = 12.5
-
-        # Use the corrected pattern matching logic from crm_lead
-        # Although we have separate fields here, this calculation mirrors the final score
-        situation = self.job_situation or ''
-        motivation = self.job_motivation or ''
-        outcome = self.job_outcome or ''
-
-        # Score text components based on minimum length
-        if situation.strip() and len(situation.strip()) >= MIN_TEXT_LENGTH: score += component_weight
-        if motivation.strip() and len(motivation.strip()) >= MIN_TEXT_LENGTH: score += component_weight
-        if outcome.strip() and len(outcome.strip()) >= MIN_TEXT_LENGTH: score += component_weight
-
-        # Score selections
-        if self.job_category_id: score += selection_weight
-        if self.job_quadrant: score += selection_weight
-
-        # Normalize score to 0-100 and store on the wizard record
-        self.jtbd_job_clarity_score = min(max_score, int(round(score)))
+        self.jtbd_job_clarity_score = score_statement_parts(
+            self.job_situation, self.job_motivation, self.job_outcome,
+            has_category=self.job_category_id, has_quadrant=self.job_quadrant,
+        )
         _logger.debug(f"Wizard Clarity Score - Wiz {self.id}: Final Score = {self.jtbd_job_clarity_score}")
 
     def action_get_ai_suggestions(self):
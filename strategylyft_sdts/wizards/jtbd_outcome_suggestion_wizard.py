@@ -2,7 +2,6 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
-from datetime import timedelta
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -55,65 +54,13 @@ class JtbdOutcomeSuggestionWizard(models.TransientModel):
 
 
     def _get_suggestions(self, mapping, suggestion_type):
-        """ Get relevant suggestions based on outcome pattern, considering source applicability. """
-        suggestions = []
+        """ Get relevant suggestions based on outcome pattern, considering source applicability
+        (resolved and cached by jtbd.outcome.pattern._get_mapping_suggestions). """
         if not mapping or not mapping.job_category_id or not mapping.lead_id:
             _logger.warning(f"Outcome Suggestion Wiz: Missing mapping, category, or lead. Cannot get suggestions.")
-            return suggestions
-
-        job_category_id = mapping.job_category_id.id
-        lead_record = mapping.lead_id
-        lead_source_label = lead_record.jtbd_data_source_label if lead_record else None
-        _logger.debug(f"Outcome Suggestion Wiz: Getting suggestions for map {mapping.id}, category {job_category_id}, type '{suggestion_type}', lead source '{lead_source_label}'")
-
-        # --- Add Source Applicability Domain ---
-        pattern_domain = [('job_category_id', '=', job_category_id), ('active', '=', True)]
-        if lead_source_label:
-            applicable_sources = ['all', lead_source_label]
-            lead_confidence = lead_record.jtbd_source_confidence_score or 0.0
-            if lead_confidence >= 0.8: applicable_sources.append('high_confidence')
-            pattern_domain.append(('jtbd_source_type_applicability', 'in', applicable_sources))
-        else:
-            pattern_domain.append(('jtbd_source_type_applicability', '=', 'all'))
-        # --- End Source Applicability Domain ---
-
-        patterns = self.env['jtbd.outcome.pattern'].search(pattern_domain, limit=1) # Find first matching pattern
-
-        if not patterns:
-            _logger.warning(f"Outcome Suggestion Wiz: No outcome pattern found for domain: {pattern_domain}")
-            return suggestions
-
-        pattern = patterns[0]
-        _logger.debug(f"Outcome Suggestion Wiz: Using pattern '{pattern.name}' (ID: {pattern.id})")
-
-        # --- Rest of the suggestion logic remains the same ---
-        def _add_suggestion(name_val, desc_val):
-            name_str = str(name_val or '').strip()
-            if name_str: suggestions.append({'name': name_str, 'description': str(desc_val or '').strip()})
-        try:
-            if suggestion_type == 'outcomes':
-                existing_metrics = mapping.additional_outcome_ids.mapped('metric')
-                if pattern.additional_metrics and isinstance(pattern.additional_metrics, str):
-                    metrics = [m.strip() for m in pattern.additional_metrics.splitlines() if m.strip()]
-                    for metric in metrics:
-                        if metric and metric not in existing_metrics: _add_suggestion(metric, _("Suggested metric."))
-            elif suggestion_type == 'milestones':
-                existing_milestones = mapping.milestone_ids.mapped('name')
-                milestone_templates = filter(None, [pattern.typical_milestone_1, pattern.typical_milestone_2, pattern.typical_milestone_3])
-                for ms_name in milestone_templates:
-                    if isinstance(ms_name, str) and ms_name.strip() and ms_name not in existing_milestones: _add_suggestion(ms_name.strip(), _("Suggested milestone."))
-            elif suggestion_type == 'white_space':
-                if pattern.white_space_suggestions and isinstance(pattern.white_space_suggestions, str) and not mapping.white_space:
-                    ideas = [idea.strip() for idea in pattern.white_space_suggestions.splitlines() if idea.strip()]
-                    for idea in ideas:
-                        if idea:
-                            truncated_name = idea[:80] + ('...' if len(idea) > 80 else '')
-                            if truncated_name: _add_suggestion(truncated_name, idea)
-        except Exception as e:
-            _logger.error(f"Error occurred within _get_suggestions logic: {e}", exc_info=True)
             return []
-
-        _logger.debug(f"Outcome Suggestion Wiz: Generated {len(suggestions)} suggestions.")
+        suggestions = self.env['jtbd.outcome.pattern']._get_mapping_suggestions(mapping, suggestion_type)[mapping.id]
+        _logger.debug(f"Outcome Suggestion Wiz: Generated {len(suggestions)} suggestions for map {mapping.id}, type '{suggestion_type}'.")
         return suggestions
 
 
@@ -126,55 +73,9 @@ class JtbdOutcomeSuggestionWizard(models.TransientModel):
         if not selected_items: return {'type': 'ir.actions.act_window_close'}
 
         try:
-            vals_to_write = {}
-            additional_outcome_vals_list = []
-            milestone_vals_list = []
-            white_space_parts = [mapping.white_space] if mapping.white_space else []
-
-            if self.suggestion_type == 'outcomes':
-                existing_metrics = mapping.additional_outcome_ids.mapped('metric')
-                for i, item in enumerate(selected_items):
-                     item_name = item.name or ''
-                     if item_name.strip() and item_name not in existing_metrics:
-                        metric = item_name.strip()
-                        is_percentage = '%' in metric or '(%)' in metric.lower() or (item.description and '%' in item.description)
-                        metric_unit = '%' if is_percentage else None
-                        name_display = f"{metric} (Suggested)"
-                        vals = {
-                            'name': name_display,
-                            'metric': metric,
-                            'is_percentage': is_percentage,
-                            'metric_unit': metric_unit,
-                            # Set priority to Medium ('2')
-                            'priority': '2',
-                            'sequence': (len(mapping.additional_outcome_ids) + i + 1) * 10
-                        }
-                        additional_outcome_vals_list.append((0, 0, vals))
-                if additional_outcome_vals_list: vals_to_write['additional_outcome_ids'] = additional_outcome_vals_list
-            elif self.suggestion_type == 'milestones':
-                existing_milestones = mapping.milestone_ids.mapped('name')
-                today = fields.Date.context_today(self)
-                for i, item in enumerate(selected_items):
-                     item_name = item.name or ''
-                     if item_name.strip() and item_name not in existing_milestones:
-                         target_date = today + timedelta(days=(len(mapping.milestone_ids) + i + 1) * 30)
-                         vals = { 'name': item_name.strip(), 'notes': item.description or '',
-                                 'target_date': target_date,
-                                 'sequence': (len(mapping.milestone_ids) + i + 1) * 10 }
-                         milestone_vals_list.append((0, 0, vals))
-                if milestone_vals_list: vals_to_write['milestone_ids'] = milestone_vals_list
-
-            elif self.suggestion_type == 'white_space':
-                for item in selected_items:
-                     text_to_add = (item.description or item.name or '').strip()
-                     if text_to_add: white_space_parts.append(f"- {text_to_add}")
-                if len(white_space_parts) > (1 if mapping.white_space else 0):
-                     vals_to_write['white_space'] = "\n".join(white_space_parts).strip()
-
-
-            if vals_to_write:
-                 mapping.write(vals_to_write)
-
+            mapping._apply_suggestions(self.suggestion_type, [
+                {'name': item.name, 'description': item.description} for item in selected_items
+            ])
         except Exception as e:
             _logger.error(f"Error applying suggestions from wizard {self.id}: {e}", exc_info=True)
             error_msg = _("Failed to apply suggestions. Please check logs for details.")